@@ -1,12 +1,24 @@
 import argparse
-import json
 import os
 import sys
-from typing import Optional
+from pathlib import Path
+from typing import List, Optional
 
 from openai import OpenAI
 
+from utils.code_batch import (
+    chunked,
+    example_output_path,
+    load_rule_payloads,
+    run_groups,
+    split_batch_output,
+)
+from utils.example_prompts import build_batch_insecure_prompt, build_insecure_prompt
 from utils.gateway_rate_limit import wait_for_gateway_slot
+from utils.json_io import read_json
+from utils.openai_batch import run_chat_batch
+from utils.llm_clients import complete_chat_text, get_client
+from utils.response_cache import cached_completion, cached_streamed_completion
 from utils.llm_env import (
     get_gateway_base_url,
     get_gateway_chat_model,
@@ -21,6 +33,10 @@ from utils.llm_env import (
 # Load environment variables for API access.
 load_llm_env()
 
+# Default completion budget for one insecure example (--max-tokens); batched requests
+# scale it by rule count.
+MAX_COMPLETION_TOKENS = 900
+
 
 def _require_env(var_name: str) -> str:
     value = os.getenv(var_name, "").strip()
@@ -31,10 +47,10 @@ def _require_env(var_name: str) -> str:
 
 def _build_client(backend: str) -> OpenAI:
     if backend == "openai":
-        return OpenAI(api_key=_require_env("OPENAI_API_KEY"))
+        return get_client(_require_env("OPENAI_API_KEY"))
     api_key = _require_env("GATEWAY_API_KEY")
     base_url = get_gateway_base_url()
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return get_client(api_key, base_url)
 
 
 def _resolve_chat_model(backend: str, cli_model: Optional[str]) -> str:
@@ -47,7 +63,11 @@ def _resolve_chat_model(backend: str, cli_model: Optional[str]) -> str:
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Generate insecure Java examples from CrySL payloads.")
-    parser.add_argument("json_path", help="Path to the temp JSON produced by the Java pipeline.")
+    parser.add_argument(
+        "json_path",
+        nargs="?",
+        help="Path to the temp JSON produced by the Java pipeline (omit when using --batch).",
+    )
     parser.add_argument(
         "--rules-dir",
         default="",
@@ -67,57 +87,212 @@ def parse_args() -> argparse.Namespace:
             "GATEWAY_CHAT_MODEL in llm/.env (with built-in fallbacks)."
         ),
     )
-    return parser.parse_args()
-
-
-# Build a prompt that instructs the LLM to violate the CrySL rule intentionally.
-def build_insecure_prompt(rule: dict) -> str:
-    return f'''
-    You are a Java coding assistant.
-
-    Your task is to generate an **insecure** Java code example using the class `{rule['className']}`.
-    
-    The CrySL rule below defines correct and secure usage. However, your goal is to create a code snippet that violates this rule while still being syntactically valid:
-    
-    Objects: {rule['objects']}
-    Events: {rule['events']}
-    Order: {rule['order']}
-    Constraints: {rule['constraints']}
-    Requires: {rule['requires']}
-    Ensures: {rule['ensures']}
-    Forbidden Methods: {rule['forbidden']}
-    
-    Guidelines:
-    - Use parameter values that are *not* listed as valid (e.g., for RSA key size, use 1024 or 2048 instead of 3072 or 4096).
-    - Break the expected method call order (e.g., call `generateKeyPair()` before `initialize()`).
-    - Use any forbidden methods mentioned, if applicable.
-    - Do NOT satisfy the required conditions or methods in the rule.
-    
-    Output Style:
-    - The code must be valid Java and look realistic.
-    - Include inline comments using `//` to explain **why each choice is insecure**.
-      - Example: `// 2048-bit RSA is too weak for secure usage, even though valid Java`
-    - Output only the annotated Java code — no extra explanation or text.
-    
-    Your goal is to help demonstrate **what insecure code might look like** to compare with a secure version.
-    '''.strip()
+    parser.add_argument(
+        "--batch",
+        default=None,
+        help=(
+            "Directory of rule JSON payloads, or a JSON file holding a list of payloads. "
+            "Rules are sent together in one chat completion per --batch-size group."
+        ),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5,
+        help="Maximum number of rules per batched chat completion (default: 5).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of --batch-size groups generated concurrently in --batch mode (default: 4).",
+    )
+    parser.add_argument(
+        "--out-dir",
+        default=None,
+        help="Directory receiving <className>_insecure.txt files in --batch mode (e.g. the code_cache).",
+    )
+    parser.add_argument(
+        "--async-batch",
+        action="store_true",
+        help=(
+            "With --batch: submit one request per rule through the OpenAI Batch API instead of chat completions "
+            "(half price, separate rate limits, results may take up to 24h). OpenAI backend only."
+        ),
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between Batch API status checks for --async-batch (default: 30).",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=MAX_COMPLETION_TOKENS,
+        help=f"Completion token cap per insecure example (default: {MAX_COMPLETION_TOKENS}).",
+    )
+    args = parser.parse_args()
+    if bool(args.batch) == bool(args.json_path):
+        parser.error("pass exactly one of json_path or --batch")
+    if args.batch and not args.out_dir:
+        parser.error("--out-dir is required with --batch")
+    if args.async_batch and not args.batch:
+        parser.error("--async-batch requires --batch")
+    if args.async_batch and args.backend != "openai":
+        parser.error("--async-batch is only supported with --backend openai")
+    return args
 
 
-# CLI entrypoint: load rule JSON, build prompt, call LLM, print Java.
-def main():
-    args = parse_args()
-    with open(args.json_path, "r", encoding="utf-8") as f:
-        rule = json.load(f)
 
-    # Decide secure or insecure (this script expects insecure by default)
-    example_type = rule.get("exampleType", "insecure").lower()
-    label = "insecure" if "insecure" in example_type else "secure"
+def _is_insecure_payload(rule: dict) -> bool:
+    return "insecure" in str(rule.get("exampleType", "insecure")).lower()
 
-    if label != "insecure":
-        print("Error in Insecure Code Generation: expected insecure payload.", file=sys.stderr)
-        sys.exit(1)
 
-    prompt = build_insecure_prompt(rule)
+# Chat-completion arguments for one insecure-example prompt (shared by direct and Batch API calls).
+# temperature=0 keeps replies deterministic, which also makes response-cache hits meaningful.
+def _chat_kwargs(model: str, prompt: str, max_tokens: Optional[int] = None) -> dict:
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.0,
+        "max_tokens": max_tokens or MAX_COMPLETION_TOKENS,
+    }
+
+
+# Send one user prompt to the selected backend and return the raw completion text.
+# Identical requests are answered from the response cache.
+def _complete(client: OpenAI, backend: str, model: str, prompt: str, max_tokens: Optional[int] = None) -> str:
+    request = _chat_kwargs(model, prompt, max_tokens)
+
+    def _create(**kwargs):
+        if backend == "gateway":
+            wait_for_gateway_slot("chat.completions")
+        return client.chat.completions.create(**kwargs)
+
+    # Replies cut off by max_tokens are retried with a larger budget and never cached.
+    return cached_completion(request, lambda: complete_chat_text(_create, request))
+
+
+# Like _complete, but stream the reply to stdout as it is generated so the caller sees the
+# first tokens right away; the printed bytes match print(_complete(...)). A streamed reply
+# cut off by max_tokens cannot be retried once printed, so it is only kept out of the cache.
+def _complete_to_stdout(
+    client: OpenAI, backend: str, model: str, prompt: str, max_tokens: Optional[int] = None
+) -> str:
+    request = _chat_kwargs(model, prompt, max_tokens)
+    finish_reasons: List[str] = []
+
+    def _stream():
+        if backend == "gateway":
+            wait_for_gateway_slot("chat.completions")
+        for chunk in client.chat.completions.create(**request, stream=True):
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reasons.append(choice.finish_reason)
+                yield choice.delta.content or ""
+
+    def _write(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    text = cached_streamed_completion(request, _stream, _write, lambda: "length" not in finish_reasons)
+    _write("\n")
+    if "length" in finish_reasons:
+        print(f"[WARN] Insecure example was cut off at max_tokens={request['max_tokens']}.", file=sys.stderr)
+    return text
+
+
+# Generate insecure examples for many rules, one chat completion per --batch-size group.
+# Up to `workers` groups are in flight at once; they mostly wait on the chat endpoint.
+def run_batch(
+    client: OpenAI,
+    backend: str,
+    model: str,
+    rules: List[dict],
+    out_dir: Path,
+    batch_size: int,
+    workers: int = 1,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> int:
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    def run_group(group: List[dict]) -> int:
+        try:
+            if len(group) == 1:
+                outputs = [_complete(client, backend, model, build_insecure_prompt(group[0]), max_tokens)]
+            else:
+                reply = _complete(
+                    client,
+                    backend,
+                    model,
+                    build_batch_insecure_prompt(group),
+                    max_tokens=max_tokens * len(group),
+                )
+                outputs = split_batch_output(reply, len(group))
+        except Exception as exc:
+            if len(group) == 1:
+                print(f"[ERROR] Insecure generation failed for {group[0]['className']}: {exc}", file=sys.stderr)
+                return 1
+            # A failed batched request (rate limit, timeout, oversized budget) is retried rule by rule.
+            print(f"[WARN] Batched request for {len(group)} rules failed: {exc}", file=sys.stderr)
+            outputs = [None] * len(group)
+        failed = 0
+        for rule, output in zip(group, outputs):
+            if output is None:
+                # The batched reply missed this rule; fall back to a single-rule request.
+                print(f"[WARN] Batched reply had no output for {rule['className']}; retrying alone.", file=sys.stderr)
+                try:
+                    output = _complete(client, backend, model, build_insecure_prompt(rule), max_tokens)
+                except Exception as exc:
+                    print(f"[ERROR] Insecure generation failed for {rule['className']}: {exc}", file=sys.stderr)
+                    failed += 1
+                    continue
+            target = example_output_path(out_dir, rule["className"], "insecure")
+            target.write_text(output.strip(), encoding="utf-8")
+            print(f"{target.name} written.", file=sys.stderr)
+        return failed
+
+    return run_groups(chunked(rules, batch_size), run_group, workers)
+
+
+# Generate insecure examples through the OpenAI Batch API (one request per rule, polled to completion).
+def run_async_batch(
+    client: OpenAI,
+    model: str,
+    rules: List[dict],
+    out_dir: Path,
+    poll_seconds: float,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> int:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    unique = {rule["className"]: rule for rule in rules}
+    results = run_chat_batch(
+        client,
+        [
+            (class_name, _chat_kwargs(model, build_insecure_prompt(rule), max_tokens))
+            for class_name, rule in unique.items()
+        ],
+        poll_seconds=poll_seconds,
+    )
+    failures = 0
+    for class_name in unique:
+        output = results.get(class_name)
+        if not output:
+            print(f"[ERROR] Batch API returned no insecure example for {class_name}.", file=sys.stderr)
+            failures += 1
+            continue
+        target = example_output_path(out_dir, class_name, "insecure")
+        target.write_text(output.strip(), encoding="utf-8")
+        print(f"{target.name} written.", file=sys.stderr)
+    return failures
+
+
+# CLI entrypoint: load rule JSON, build prompt, call LLM, print Java.
+def main():
+    args = parse_args()
+    max_tokens = max(1, args.max_tokens)
     try:
         model = _resolve_chat_model(args.backend, args.model)
         client = _build_client(args.backend)
@@ -125,16 +300,28 @@ def main():
         print(f"Backend/model configuration error: {exc}", file=sys.stderr)
         sys.exit(1)
 
-    if args.backend == "gateway":
-        wait_for_gateway_slot("chat.completions")
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
+    if args.batch:
+        rules = [r for r in load_rule_payloads(Path(args.batch)) if _is_insecure_payload(r)]
+        if not rules:
+            print(f"No insecure rule payloads found in {args.batch}.", file=sys.stderr)
+            sys.exit(1)
+        if args.async_batch:
+            failures = run_async_batch(client, model, rules, Path(args.out_dir), args.poll_interval, max_tokens)
+        else:
+            failures = run_batch(
+                client, args.backend, model, rules, Path(args.out_dir), args.batch_size, args.workers, max_tokens
+            )
+        sys.exit(1 if failures else 0)
+
+    rule = read_json(args.json_path)
+
+    # Decide secure or insecure (this script expects insecure by default)
+    if not _is_insecure_payload(rule):
+        print("Error in Insecure Code Generation: expected insecure payload.", file=sys.stderr)
+        sys.exit(1)
 
-    # Output generated Java code
-    print(response.choices[0].message.content)
+    # Output generated Java code (streamed as it is generated)
+    _complete_to_stdout(client, args.backend, model, build_insecure_prompt(rule), max_tokens)
 
 
 # Standard entry guard for CLI usage.
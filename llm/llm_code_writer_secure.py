@@ -1,18 +1,38 @@
+from __future__ import annotations
+
 import argparse
-import json
+import functools
 import os
 import re
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import subprocess
+from collections import deque
 import tempfile
 from shutil import which
 
-import numpy as np
-from openai import OpenAI
 
+# numpy and openai are imported where they are used: the Java pipeline starts one process
+# per rule, and paths that never touch RAG or the API should not pay their import time.
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+from utils.code_batch import (
+    chunked,
+    example_output_path,
+    load_rule_payloads,
+    run_groups,
+    safe_class_name,
+    split_batch_output,
+)
+from utils.example_prompts import build_batch_secure_prompt, build_secure_prompt
 from utils.gateway_rate_limit import wait_for_gateway_slot
+from utils.openai_batch import run_chat_batch
+from utils.json_file_cache import mtime_cached, mtime_memoized
+from utils.json_io import list_files, read_json, write_json
+from utils.llm_clients import complete_chat_text, embedding_rows, get_client
+from utils.response_cache import CACHE_DIR, cached_completion
 from utils.llm_env import (
     get_gateway_base_url,
     get_gateway_chat_model,
@@ -35,9 +55,6 @@ PDF_PATH = PROJECT_ROOT / "tse19CrySL.pdf"
 FILENAME_TEMPLATE = "sanitized_rule_{fqcn}_{lang}.json"
 SANITIZED_DIR.mkdir(parents=True, exist_ok=True)
 
-# Cache for sanitized rules to avoid repeated disk IO.
-_SANITIZED_CACHE: Dict[Tuple[str, str], Optional[Dict]] = {}
-
 # Prompt sizing/limits to keep LLM context bounded.
 MAX_DEPENDENCIES = 3          # include at most 3 dependencies in the prompt
 MAX_ITEMS_PER_DEP = 6         # include at most 6 items per dependency
@@ -73,6 +90,32 @@ SECTION_NAMES = [
     "FORBIDDEN",
 ]
 
+# Regexes used per rule / per line, compiled once.
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_CONTRACT_HEADER_RE = re.compile(r"^([A-Z_]+):\s*$")
+_FENCED_JAVA_RE = re.compile(r"```java\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+_FENCED_ANY_RE = re.compile(r"```\s*(.*?)\s*```", re.DOTALL)
+_PUBLIC_CLASS_RE = re.compile(r"\bpublic\s+(?:final\s+|abstract\s+)?class\s+[A-Za-z_][A-Za-z0-9_]*\b")
+_IMPORT_LINE_RE = re.compile(r"^\s*import\s+[\w.]+\s*;\s*$")
+_PACKAGE_LINE_RE = re.compile(r"^\s*package\s+[\w.]+\s*;\s*$")
+_MODEL_TAG_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# Primer excerpt filtering/cleanup (applied to every retrieved paper chunk).
+_SECTION_REF_RE = re.compile(r"\bsection\s+\d")
+_FIGURE_REF_RE = re.compile(r"\bfig(ure)?s?\s+\d")
+_HYPHEN_BREAK_RE = re.compile(r"-\s*\n\s*")
+_NEWLINE_RUN_RE = re.compile(r"\s*\n\s*")
+_SPACE_RUN_RE = re.compile(r"[ \t]{2,}")
+_LINE_REF_PAREN_RE = re.compile(r"\(\s*line\s*\d+\s*\)", re.IGNORECASE)
+_LINE_REF_RE = re.compile(r"\bline\s*\d+\b", re.IGNORECASE)
+_WORD_FRAGMENT_RE = re.compile(r"^[a-z]{1,2}\s+")
+
+# Rule prompt contexts prepared ahead of time (--prepare-all) or on first use.
+CONTEXT_DIR = CACHE_DIR / "ctx"
+# Bump when build_rule_context, shape_crysl_contract or the dependency formatters change
+# what they produce, so prepared contexts written by older code are rebuilt.
+CONTEXT_FORMAT_VERSION = 1
+
 
 def _require_env(var_name: str) -> str:
     value = os.getenv(var_name, "").strip()
@@ -83,10 +126,10 @@ def _require_env(var_name: str) -> str:
 
 def _build_client_for_backend(backend: str) -> OpenAI:
     if backend == "openai":
-        return OpenAI(api_key=_require_env("OPENAI_API_KEY"))
+        return get_client(_require_env("OPENAI_API_KEY"))
     api_key = _require_env("GATEWAY_API_KEY")
     base_url = get_gateway_base_url()
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return get_client(api_key, base_url)
 
 
 def _resolve_models_for_backend(backend: str, chat_model_arg: Optional[str], emb_model_arg: Optional[str]) -> Tuple[str, str]:
@@ -119,10 +162,16 @@ def _resolve_pdf_index_builder(backend: str):
     return build_pdf_index_impl
 
 
+@functools.lru_cache(maxsize=4)
+def _get_pdf_index(pdf_path: str, emb_model: str, backend: str):
+    """Build (or load) the paper index once per (pdf, embedding model, backend) and reuse it within the process."""
+    return _resolve_pdf_index_builder(backend)(pdf_path, emb_model=emb_model)
+
+
 # Normalize whitespace in large text blocks.
 def _clean_text(s: str) -> str:
     s = (s or "").strip()
-    s = re.sub(r"\n{3,}", "\n\n", s)   # collapse huge blank blocks
+    s = _BLANK_RUN_RE.sub("\n\n", s)   # collapse huge blank blocks
     return s
 
 # Cap a text block by line count.
@@ -147,6 +196,9 @@ def _cap_chars(s: str, max_chars: int) -> str:
 def clean_item(value) -> str:
     if not isinstance(value, str):
         return str(value)
+    # Fast path: no surrounding whitespace and no leading comma means nothing to trim.
+    if value and value[0] != "," and not value[0].isspace() and not value[-1].isspace():
+        return value
     cleaned = value.strip()
     return cleaned.lstrip(",").strip() if cleaned.startswith(",") else cleaned
 
@@ -177,29 +229,35 @@ def _normalize_listish(value) -> List[str]:
     if value is None:
         return []
     if isinstance(value, list):
-        return [clean_item(v) for v in value if str(v).strip()]
+        # One clean_item pass per entry; entries that clean to nothing (blank, comma-only) are dropped.
+        out: List[str] = []
+        append = out.append
+        for entry in value:
+            item = clean_item(entry)
+            if item:
+                append(item)
+        return out
     if isinstance(value, str):
         val = value.strip()
         return [val] if val else []
     return [clean_item(value)]
 
-# Convert a FQCN into a filesystem-safe name.
-def safe_class_name(fqcn: str) -> str:
-    return re.sub(r"[^a-zA-Z0-9.\-]", "_", fqcn)
-
 
-# Compute the sanitized rule JSON path for a class/language.
+# Compute the sanitized rule JSON path for a class/language (memoized, so the template is formatted once per key).
+@functools.lru_cache(maxsize=4096)
 def rule_path(fqcn: str, lang: str) -> Path:
     return SANITIZED_DIR / FILENAME_TEMPLATE.format(fqcn=fqcn, lang=lang)
 
 
-# Load JSON quietly (returns None on error).
+# Load JSON quietly (returns None on error). Parsed files are cached by mtime across runs and
+# memoized per process by (path, mtime); the returned dict is shared between callers and must not be mutated.
+@mtime_memoized(maxsize=2048)
+@mtime_cached
 def load_json_quiet(path: Path) -> Optional[Dict]:
     if not path.exists():
         return None
     try:
-        with path.open(encoding="utf-8") as handle:
-            return json.load(handle)
+        return read_json(path)
     except Exception as exc:
         print(f"[WARN] Could not read {path}: {exc}", file=sys.stderr)
         return None
@@ -207,37 +265,47 @@ def load_json_quiet(path: Path) -> Optional[Dict]:
 # Load the first available sanitized rule for any language in preferred order.
 def load_sanitized_rule(fqcn: str, languages: List[str]) -> Optional[Dict]:
     for lang in languages:
-        key = (fqcn, lang)
-        if key in _SANITIZED_CACHE:
-            data = _SANITIZED_CACHE[key]
-            if data is not None:
-                return data
-            continue
         data = load_json_quiet(rule_path(fqcn, lang))
-        _SANITIZED_CACHE[key] = data
         if data is not None:
             return data
     return None
     
-# Parse a CrySL rule into section -> lines dict.
-def crysl_to_json_lines(crysl_text: str) -> Dict[str, List[str]]:
-    sections = ["SPEC", "OBJECTS", "EVENTS", "ORDER", "CONSTRAINTS", "REQUIRES", "ENSURES", "FORBIDDEN"]
+# Return (header, rest-of-line) when `line` starts with a CrySL section keyword, else None.
+def _section_header(line: str) -> Optional[Tuple[str, str]]:
+    for name in SECTION_NAMES:
+        if line.startswith(name):
+            nxt = line[len(name):len(name) + 1]
+            if nxt and (nxt.isalnum() or nxt == "_"):
+                continue
+            # Allow an optional ":" after the keyword; anything else on the line belongs to the section.
+            rest = line[len(name):].strip()
+            if rest.startswith(":"):
+                rest = rest[1:].strip()
+            return name, rest
+    return None
 
-    # Match headers at start of line, allow optional ":" and trailing whitespace
-    pattern = re.compile(r"(?m)^(%s)\b\s*:?\s*" % "|".join(sections))
 
-    matches = list(pattern.finditer(crysl_text))
+# Parse a CrySL rule into section -> lines dict.
+def crysl_to_json_lines(crysl_text: str) -> Dict[str, List[str]]:
+    # Single pass over the lines: headers are fixed keywords at line start, so no regex is needed.
     parsed: Dict[str, List[str]] = {}
-
-    for idx, match in enumerate(matches):
-        header = match.group(1)
-        start = match.end()
-        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(crysl_text)
-
-        chunk = crysl_text[start:end].strip()
-        lines = [line.strip() for line in chunk.splitlines() if line.strip()]
-        parsed[header] = lines
-
+    current: Optional[str] = None
+    buf: List[str] = []
+
+    for line in crysl_text.splitlines():
+        header = _section_header(line)
+        if header:
+            if current:
+                parsed[current] = buf
+            current, rest = header
+            buf = [rest] if rest else []
+        elif current:
+            stripped = line.strip()
+            if stripped:
+                buf.append(stripped)
+
+    if current:
+        parsed[current] = buf
     return parsed
 
 # Shape the CrySL contract to be stable, readable, and within size caps.
@@ -265,7 +333,7 @@ def shape_crysl_contract(crysl_summary: str) -> str:
         buf = []
 
     for line in s.splitlines():
-        m = re.match(r"^([A-Z_]+):\s*$", line.strip())
+        m = _CONTRACT_HEADER_RE.match(line.strip())
         if m and m.group(1) in SECTION_NAMES:
             flush()
             current = m.group(1)
@@ -303,30 +371,23 @@ def shape_crysl_contract(crysl_summary: str) -> str:
     return _cap_chars(out, MAX_CONTRACT_CHARS)
 
 # Collect dependency constraints for prompt context.
-def collect_dependency_constraints(target_fqcn: str, languages: List[str]) -> Tuple[List[str], Dict[str, List[str]]]:
-    dep_map: Dict[str, List[str]] = {}
-    order: List[str] = []
-    primary = load_sanitized_rule(target_fqcn, languages)
-    if not primary:
-        return order, dep_map
-    deps = primary.get("dependency") or []
-    seen = set()
-    for dep in deps:
-        if dep in seen or dep == target_fqcn:
-            continue
-        seen.add(dep)
-        order.append(dep)
-        data = load_sanitized_rule(dep, languages)
-        if not data:
-            dep_map[dep] = []
-            continue
-        constraints = data.get("constraints") or data.get("constraint") or []
-        if not isinstance(constraints, list):
-            constraints = [constraints]
-        dep_map[dep] = [clean_item(c) for c in constraints if str(c).strip()]
+def collect_dependency_constraints(
+    target_fqcn: str, languages: List[str], primary: Optional[Dict] = None
+) -> Tuple[List[str], Dict[str, List[str]]]:
+    order, dep_map, _ = collect_dependency_info(target_fqcn, languages, depth=1, primary=primary)
     return order, dep_map
 
 
+# Read a dependency rule's constraints (either key spelling), dropping blank entries.
+def _dependency_constraints(data: Optional[Dict]) -> List[str]:
+    if not data:
+        return []
+    constraints = data.get("constraints") or data.get("constraint") or []
+    if not isinstance(constraints, list):
+        constraints = [constraints]
+    return [clean_item(c) for c in constraints if str(c).strip()]
+
+
 # Format dependency constraints into a compact list string.
 def format_dependency_constraints(
     dep_order: list[str],
@@ -354,34 +415,45 @@ def format_dependency_constraints(
 
 
 # Collect dependency ENSURES for prompt context.
-def collect_dependency_ensures(target_fqcn: str, languages: List[str], depth: int = 1) -> Tuple[List[str], Dict[str, List[str]]]:
-    dep_map: Dict[str, List[str]] = {}
+def collect_dependency_ensures(
+    target_fqcn: str, languages: List[str], depth: int = 1, primary: Optional[Dict] = None
+) -> Tuple[List[str], Dict[str, List[str]]]:
+    order, _, dep_map = collect_dependency_info(target_fqcn, languages, depth=depth, primary=primary)
+    return order, dep_map
+
+
+# Collect dependency constraints and ENSURES in one walk, loading each dependency rule once.
+def collect_dependency_info(
+    target_fqcn: str, languages: List[str], depth: int = 1, primary: Optional[Dict] = None
+) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
+    constraints_map: Dict[str, List[str]] = {}
+    ensures_map: Dict[str, List[str]] = {}
     order: List[str] = []
-    primary = load_sanitized_rule(target_fqcn, languages)
+    if primary is None:
+        primary = load_sanitized_rule(target_fqcn, languages)
     if not primary:
-        return order, dep_map
-    roots = primary.get("dependency") or []
+        return order, constraints_map, ensures_map
     seen = {target_fqcn}
-
-    def visit(fqcn: str, current_depth: int):
-        if fqcn in seen:
-            return
-        seen.add(fqcn)
-        if fqcn not in order:
-            order.append(fqcn)
+    queue: deque = deque()
+
+    # Breadth-first, so nearer dependencies come first in `order` (the prompt keeps only the first few).
+    # Marking rules when queued keeps each shared dependency in the queue at most once.
+    def enqueue(fqcns, level_depth: int) -> None:
+        for fqcn in fqcns:
+            if isinstance(fqcn, str) and fqcn and fqcn not in seen:
+                seen.add(fqcn)
+                queue.append((fqcn, level_depth))
+
+    enqueue(primary.get("dependency") or [], 1)
+    while queue:
+        fqcn, current_depth = queue.popleft()
+        order.append(fqcn)
         data = load_sanitized_rule(fqcn, languages)
-        if not data:
-            dep_map[fqcn] = []
-            return
-        dep_map[fqcn] = _normalize_listish(data.get("ensures"))
-        if current_depth < depth:
-            for nxt in _normalize_listish(data.get("dependency")):
-                visit(nxt, current_depth + 1)
-
-    for dep in roots:
-        if isinstance(dep, str) and dep:
-            visit(dep, 1)
-    return order, dep_map
+        constraints_map[fqcn] = _dependency_constraints(data)
+        ensures_map[fqcn] = _normalize_listish(data.get("ensures")) if data else []
+        if data and current_depth < depth:
+            enqueue(_normalize_listish(data.get("dependency")), current_depth + 1)
+    return order, constraints_map, ensures_map
 
 
 # Format dependency ENSURES into a compact list string.
@@ -431,6 +503,8 @@ def retrieve_top_k(idx, chunks, query_embedding, k: int = 2, per_chunk_max: int
     if not idx or not chunks:
         return []
 
+    import numpy as np
+
     faiss_index = getattr(idx, "index", idx)
 
     q = np.asarray([query_embedding], dtype="float32")
@@ -467,7 +541,7 @@ def load_crysl_primer(
     """
     try:
         cache_dir.mkdir(parents=True, exist_ok=True)
-        model_tag = re.sub(r"[^A-Za-z0-9_.-]+", "_", emb_model).strip("._-") or "model"
+        model_tag = _MODEL_TAG_RE.sub("_", emb_model).strip("._-") or "model"
         cache_file = cache_dir / f"crysl_primer_{backend}_{model_tag}.txt"
         if cache_file.exists():
             return cache_file.read_text(encoding="utf-8").strip()
@@ -483,8 +557,7 @@ def load_crysl_primer(
             cache_file.write_text(primer, encoding="utf-8")
             return primer
 
-        build_pdf_index_fn = _resolve_pdf_index_builder(backend)
-        idx, chunks = build_pdf_index_fn(str(pdf_path), emb_model=emb_model)
+        idx, chunks = _get_pdf_index(str(pdf_path), emb_model, backend)
 
         topic_queries = [
             "CrySL overview for developers: what are SPEC, OBJECTS, EVENTS, ORDER, CONSTRAINTS, REQUIRES, ENSURES, FORBIDDEN?",
@@ -509,9 +582,9 @@ def load_crysl_primer(
                 return True
 
             # paper navigation / cross references
-            if re.search(r"\bsection\s+\d", t):
+            if _SECTION_REF_RE.search(t):
                 return True
-            if re.search(r"\bfig(ure)?s?\s+\d", t):
+            if _FIGURE_REF_RE.search(t):
                 return True
 
             # formal semantics sections (too research-y for codegen)
@@ -552,20 +625,20 @@ def load_crysl_primer(
             t = t.replace("\ufb01", "fi").replace("\ufb02", "fl").replace("\u00ad", "")
 
             # join hyphenated line breaks: "secu-\nrity" -> "security"
-            t = re.sub(r"-\s*\n\s*", "", t)
+            t = _HYPHEN_BREAK_RE.sub("", t)
 
             # normalize whitespace/newlines
-            t = re.sub(r"\s*\n\s*", " ", t)
-            t = re.sub(r"[ \t]{2,}", " ", t).strip()
+            t = _NEWLINE_RUN_RE.sub(" ", t)
+            t = _SPACE_RUN_RE.sub(" ", t).strip()
 
             # remove inline source references like "(Line 72)" or "Line 72"
-            t = re.sub(r"\(\s*line\s*\d+\s*\)", "", t, flags=re.IGNORECASE)
-            t = re.sub(r"\bline\s*\d+\b", "", t, flags=re.IGNORECASE)
-            t = re.sub(r"[ \t]{2,}", " ", t).strip()
+            t = _LINE_REF_PAREN_RE.sub("", t)
+            t = _LINE_REF_RE.sub("", t)
+            t = _SPACE_RUN_RE.sub(" ", t).strip()
 
             # strip leading punctuation/junk and fix mid-word chunk starts like "d not ..."
             t = t.lstrip("–—-•*,:;)]} ").strip()
-            t = re.sub(r"^[a-z]{1,2}\s+", "", t)
+            t = _WORD_FRAGMENT_RE.sub("", t)
 
             return t
 
@@ -583,9 +656,11 @@ def load_crysl_primer(
         collected: list[str] = []
         seen = set()
 
-        for q in topic_queries:
-            _maybe_throttle_gateway(backend, "embeddings")
-            q_emb = client.embeddings.create(model=emb_model, input=q).data[0].embedding
+        # One embeddings request for all topic queries.
+        _maybe_throttle_gateway(backend, "embeddings")
+        topic_embs = embedding_rows(client.embeddings.create(model=emb_model, input=topic_queries))
+
+        for q_emb in topic_embs:
             candidates = retrieve_top_k(idx, chunks, q_emb, k=8, per_chunk_max=900)
 
             best = None
@@ -637,106 +712,6 @@ def load_crysl_primer(
     except Exception:
         return FALLBACK_CRYSL_PRIMER
 
-# Build the secure-code prompt from the contract + primer + dependency context.
-def build_secure_prompt(context: Dict[str, str]) -> str:
-    dep_ensures = context.get("dep_ensures_text") or "(no dependency guarantees)"
-    dep_constraints = context.get("dep_constraints_text") or "(no dependency constraints)"
-
-    return f"""
-You are a senior Java security engineer specializing in JCA/JCE and secure API usage.
-
-Goal:
-Generate a single, self-contained, production-quality **secure** Java usage example for `{context['class_name']}`.
-
-Authority rules (very important):
-- The **CrySL contract** below is the SOURCE OF TRUTH for required calls, order, constraints, and forbidden usage.
-- The **CrySL primer** is only to help you understand CrySL semantics. It MUST NOT override the contract.
-- If general best practices conflict with the CrySL contract, FOLLOW THE CONTRACT.
-
-Compilation contract (non-negotiable):
-- Target Java: 17+. Standard library only. No external dependencies.
-- Output MUST be a single file with NO package declaration.
-- The public class MUST be named SecureUsageExample (so it compiles as SecureUsageExample.java).
-- Exactly ONE top-level public type: `public class SecureUsageExample`. No other public classes/interfaces/enums/records.
-- Any helper code MUST be `private static` methods inside `SecureUsageExample` (no extra top-level types).
-- Every referenced non-java.lang type MUST be either:
-  (a) imported explicitly, or
-  (b) used via fully-qualified name in code.
-- If unsure about an import, use the fully-qualified name (compile correctness > style).
-
-CRYSL PRIMER (GENERAL SEMANTICS — NOT AUTHORITATIVE):
-{context['crysl_primer']}
-
-CRYSL CONTRACT (AUTHORITATIVE — MUST FOLLOW EXACTLY):
-{context['crysl_summary']}
-
-SUPPORTING INFO (do not override the CrySL contract):
-- Dependency Guarantees:
-{dep_ensures}
-
-- Dependency Constraints:
-{dep_constraints}
-
-Hard requirements (must follow all):
-1) Follow ORDER exactly as implied by the contract (`ORDER: {context['order_txt']}`). Use real JCA/JCE calls (no invented APIs).
-2) Enforce every CONSTRAINT (algorithms, key sizes, modes/paddings, provider requirements, parameter domains). If multiple are allowed, choose the strongest allowed option.
-3) Implement REQUIRES as concrete setup/preconditions (correct initialization, SecureRandom usage, IV/nonce generation, parameter generation, key generation/loading).
-4) Ensure FORBIDDEN calls/usages never occur anywhere in the code (not even in comments).
-5) No placeholders like TODO/null. Generate real keys/IVs/nonces, and handle exceptions properly.
-6) Output **Java code only**, wrapped in a single ```java fenced block. No prose before/after.
-7) The code must be compilable (include imports + a minimal public class with a runnable `main`).
-8) Import pass (mandatory):
-    - No wildcard imports.
-    - Ensure every referenced non-java.lang type is imported OR fully-qualified.
-    - Remove unused imports.
-
-9) Do NOT declare `main` as `throws Exception` / `throws Throwable`. Handle errors inside `main` using try/catch and fail safely.
-
-General security guardrails (apply unless the CrySL contract explicitly implies otherwise):
-A) Never print, log, or expose secrets (passwords, keys, private key material, raw plaintext, nonces/IVs). Do not hex/Base64-print keys, IVs, nonces, ciphertext, or plaintext.
-B) Avoid converting secrets from `char[]` to `String`. If a secret is needed, keep it as `char[]` and clear it after use (`Arrays.fill(secret, '\\0')`).
-C) Secret input policy (no hardcoded secrets, ever):
-   - Prefer `System.console().readPassword()` when available (no echo).
-   - Else prefer reading from an environment variable (e.g., `APP_PASSWORD`).
-   - Else last resort: `Scanner` input (echoes; add a brief warning comment).
-   - If none are available, throw `IllegalStateException`.
-D) ABSOLUTE BAN — no secret literals:
-   - The code MUST NOT contain ANY hardcoded secret literal anywhere (even for “demo” or “fallback”).
-   - This bans: `new char[]{...}` for passwords, `'p','a','s'...`, `"password"`, `"secret"`, `"fallbackPassword"`, `"1234"`, or any literal credential/token/key material.
-   - If a secret is missing, do NOT fabricate one. Use Scanner or throw `IllegalStateException`.
-   - This ban applies ONLY to credentials/key material. Non-secret demo literals (e.g., plaintext "Example message") are allowed.
-
-E) Do not make false security/semantic claims in comments or output. Do NOT say “authenticated”, “verified”, “securely stored”, etc. unless the code truly performs that operation.
-F) Prefer no console output. If you print anything, it must be non-sensitive and strictly accurate (e.g., “Operation completed.”).
-G) Use `SecureRandom` for all randomness. Prefer `SecureRandom.getInstanceStrong()` when available; otherwise use `new SecureRandom()`.
-H) Prefer authenticated encryption (AEAD) like GCM if permitted by the contract constraints. If not permitted, follow the contract and still generate a correct IV/nonce.
-I) Always specify explicit charset when converting text to bytes. Prefer `StandardCharsets.UTF_8` over `"UTF-8"`.
-J) Use try-with-resources for streams/Closeables where relevant and close resources reliably.
-K) If comparing secret bytes is needed, use constant-time comparison (`MessageDigest.isEqual`) rather than `Arrays.equals`.
-L) Minimize secret lifetime:
-   - Do NOT store secrets in `static` fields or long-lived object fields.
-   - Keep secrets in local variables with the smallest scope possible.
-   - Clear secrets in a `finally` block or immediately after last use.
-M) Callback secrets rule (applies to any callback/lambda/handler that supplies credentials or other secrets):
-   - If the code uses any callback/handler/lambda that supplies credentials or other secrets, obtain the secret inside the callback on each invocation into local variables and clear them in a finally block; never store or reuse secrets from outer scope/fields.
-   - Never store secrets in fields (static or instance) of the callback/handler object.
-   - Obtain secrets inside the callback each time it is invoked (console/env/scanner as needed), store only in local variables, and clear them in a finally block.
-   - Do not clear a shared outer secret that might be reused on a later callback invocation.
-
-Final self-check before output (do this mentally, then output only code):
-- Compiles: no unresolved symbols; imports match all referenced types; no unused imports.
-- If `StandardCharsets` appears anywhere, confirm `import java.nio.charset.StandardCharsets;` is present.
-- No secret literals anywhere (no hardcoded fallback passwords, no `new char[]{...}` credentials, no `"password"`/`"secret"` literals).
-- No printing/logging/encoding of secrets/IVs/nonces/ciphertext/plaintext; if output exists, it is non-sensitive and strictly accurate.
-- No forbidden APIs; ORDER and constraints satisfied.
-- `main` does not throw; errors are handled with try/catch.
-
-
-Output rules:
-- Return exactly one Java file in one fenced block.
-- Put everything inside one public class.
-""".strip()
-
 IMPORT_WHITELIST = {
     "Arrays": "java.util.Arrays",
     "StandardCharsets": "java.nio.charset.StandardCharsets",
@@ -755,14 +730,63 @@ CANONICAL_IMPORT_REWRITES = {
         "import javax.crypto.spec.PSource;",
 }
 
+# One scan finds every whitelisted symbol used unqualified ("Arrays." but not "java.util.Arrays.");
+# longer names come first so no alternative shadows a longer one sharing its prefix.
+_WHITELIST_USE_RE = re.compile(
+    r"(?<![\w.])("
+    + "|".join(sorted(map(re.escape, IMPORT_WHITELIST), key=len, reverse=True))
+    + r")\s*\."
+)
+
+# Known model API mistakes: (substring that must be present, regex, replacement).
+# The substring check skips the regex scan for the (usual) outputs that cannot match.
+_API_MISTAKE_REWRITES = [
+    # Prefer singleton constant for PSource when model invents invalid constructor usage.
+    (
+        "PSource",
+        re.compile(r"(\bPSource\s+\w+\s*=\s*)new\s+PSource\s*\(\s*PSource\.PSpecified\.DEFAULT\s*\)"),
+        r"\1PSource.PSpecified.DEFAULT",
+    ),
+    (
+        "PSource",
+        re.compile(r"new\s+PSource\s*\(\s*PSource\.PSpecified\.DEFAULT\s*\)"),
+        "PSource.PSpecified.DEFAULT",
+    ),
+    # Common invalid TrustAnchor overload hallucination.
+    (
+        "TrustAnchor",
+        re.compile(r"new\s+TrustAnchor\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*,\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)"),
+        r"new TrustAnchor(\1, (byte[]) null)",
+    ),
+    # Frequent over-specific checked catches in constructor-only snippets.
+    (
+        "InvalidAlgorithmParameterException",
+        re.compile(
+            r"catch\s*\(\s*NoSuchAlgorithmException\s*\|\s*InvalidAlgorithmParameterException\s+([A-Za-z_][A-Za-z0-9_]*)\s*\)"
+        ),
+        r"catch (Exception \1)",
+    ),
+    (
+        "InvalidAlgorithmParameterException",
+        re.compile(
+            r"catch\s*\(\s*InvalidAlgorithmParameterException\s*\|\s*NoSuchAlgorithmException\s+([A-Za-z_][A-Za-z0-9_]*)\s*\)"
+        ),
+        r"catch (Exception \1)",
+    ),
+]
+_CERTIFICATE_TYPE_RE = re.compile(r"\bCertificate\b")
+
 # Extract fenced Java code if present.
 def _extract_fenced_java(text: str) -> tuple[str, bool]:
+    # Unfenced replies (and the repair loop's plain code) skip both regex scans.
+    if "```" not in text:
+        return text.strip(), False
     # Prefer ```java ... ```
-    m = re.search(r"```java\s*(.*?)\s*```", text, flags=re.DOTALL | re.IGNORECASE)
+    m = _FENCED_JAVA_RE.search(text)
     if m:
         return m.group(1).strip(), True
     # Fallback: ``` ... ```
-    m = re.search(r"```\s*(.*?)\s*```", text, flags=re.DOTALL)
+    m = _FENCED_ANY_RE.search(text)
     if m:
         return m.group(1).strip(), True
     return text.strip(), False
@@ -776,17 +800,12 @@ def _rewrap_fenced_java(java_code: str, had_fence: bool) -> str:
 # Normalize the public class name to the required name.
 def _normalize_public_class_name(java_code: str, desired: str = "SecureUsageExample") -> str:
     # Normalize any "public [final|abstract] class X" to "public class SecureUsageExample"
-    return re.sub(
-        r"\bpublic\s+(?:final\s+|abstract\s+)?class\s+[A-Za-z_][A-Za-z0-9_]*\b",
-        f"public class {desired}",
-        java_code,
-        count=1,
-    )
+    return _PUBLIC_CLASS_RE.sub(f"public class {desired}", java_code, count=1)
 
 
 def _dedupe_imports(java_code: str) -> str:
     lines = java_code.splitlines()
-    import_lines = [i for i, ln in enumerate(lines) if re.match(r"^\s*import\s+[\w.]+\s*;\s*$", ln)]
+    import_lines = [i for i, ln in enumerate(lines) if _IMPORT_LINE_RE.match(ln)]
     if not import_lines:
         return java_code
 
@@ -806,36 +825,9 @@ def normalize_known_api_mistakes(java_code: str) -> str:
     for bad, good in CANONICAL_IMPORT_REWRITES.items():
         java_code = java_code.replace(bad, good)
 
-    # Prefer singleton constant for PSource when model invents invalid constructor usage.
-    java_code = re.sub(
-        r"(\bPSource\s+\w+\s*=\s*)new\s+PSource\s*\(\s*PSource\.PSpecified\.DEFAULT\s*\)",
-        r"\1PSource.PSpecified.DEFAULT",
-        java_code,
-    )
-    java_code = re.sub(
-        r"new\s+PSource\s*\(\s*PSource\.PSpecified\.DEFAULT\s*\)",
-        "PSource.PSpecified.DEFAULT",
-        java_code,
-    )
-
-    # Common invalid TrustAnchor overload hallucination.
-    java_code = re.sub(
-        r"new\s+TrustAnchor\s*\(\s*([A-Za-z_][A-Za-z0-9_]*)\s*,\s*([A-Za-z_][A-Za-z0-9_]*)\s*\)",
-        r"new TrustAnchor(\1, (byte[]) null)",
-        java_code,
-    )
-
-    # Frequent over-specific checked catches in constructor-only snippets.
-    java_code = re.sub(
-        r"catch\s*\(\s*NoSuchAlgorithmException\s*\|\s*InvalidAlgorithmParameterException\s+([A-Za-z_][A-Za-z0-9_]*)\s*\)",
-        r"catch (Exception \1)",
-        java_code,
-    )
-    java_code = re.sub(
-        r"catch\s*\(\s*InvalidAlgorithmParameterException\s*\|\s*NoSuchAlgorithmException\s+([A-Za-z_][A-Za-z0-9_]*)\s*\)",
-        r"catch (Exception \1)",
-        java_code,
-    )
+    for needle, pattern, replacement in _API_MISTAKE_REWRITES:
+        if needle in java_code:
+            java_code = pattern.sub(replacement, java_code)
 
     # If code calls getSubjectX500Principal() on Certificate, force X509Certificate typing.
     if "getSubjectX500Principal()" in java_code:
@@ -844,7 +836,7 @@ def normalize_known_api_mistakes(java_code: str) -> str:
             "import java.security.cert.X509Certificate;",
         )
         # Replace raw Certificate type usage with X509Certificate (covers params, locals, fields).
-        java_code = re.sub(r"\bCertificate\b", "X509Certificate", java_code)
+        java_code = _CERTIFICATE_TYPE_RE.sub("X509Certificate", java_code)
 
     return _dedupe_imports(java_code)
 
@@ -855,19 +847,16 @@ def auto_import_patch(llm_text: str) -> str:
     java_code = _normalize_public_class_name(java_code, "SecureUsageExample")
     java_code = normalize_known_api_mistakes(java_code)
 
-    needed = []
-    for sym, fq in IMPORT_WHITELIST.items():
-        # Match "Arrays." but not "java.util.Arrays."
-        if re.search(rf"(?<![\w.]){re.escape(sym)}\s*\.", java_code):
-            needed.append(f"import {fq};")
+    used = set(_WHITELIST_USE_RE.findall(java_code))
+    needed = [f"import {fq};" for sym, fq in IMPORT_WHITELIST.items() if sym in used]
 
     if not needed:
         return _rewrap_fenced_java(java_code, had_fence)
 
     lines = java_code.splitlines()
-    import_lines = [i for i, ln in enumerate(lines) if re.match(r"^\s*import\s+[\w.]+\s*;\s*$", ln)]
+    import_lines = [i for i, ln in enumerate(lines) if _IMPORT_LINE_RE.match(ln)]
     existing = set(
-        ln.strip() for ln in lines if re.match(r"^\s*import\s+[\w.]+\s*;\s*$", ln)
+        ln.strip() for ln in lines if _IMPORT_LINE_RE.match(ln)
     )
     missing = [imp for imp in needed if imp not in existing]
     if not missing:
@@ -880,7 +869,7 @@ def auto_import_patch(llm_text: str) -> str:
         lines[start:end + 1] = merged
     else:
         pkg_idx = next((i for i, ln in enumerate(lines)
-                        if re.match(r"^\s*package\s+[\w.]+\s*;\s*$", ln)), None)
+                        if _PACKAGE_LINE_RE.match(ln)), None)
         insert_at = (pkg_idx + 1) if pkg_idx is not None else 0
 
         to_insert = missing[:]
@@ -929,43 +918,125 @@ def compile_java(java_code: str, compile_classpath: Optional[str], java_release:
         return False, (proc.stderr or proc.stdout or "").strip()
 
 
-# End-to-end secure example generation with compile/repair loop.
-def process_rule(
-    json_path: Path,
-    language: str,
-    backend: str,
-    model: Optional[str],
-    pdf_path: Optional[Path],
-    emb_model: Optional[str],
-    rules_dir: Path,
-    compile_classpath: Optional[str],
-    java_release: str,
-) -> Optional[str]:
-    """
-    Primer-only mode:
-    - NO rule-specific PDF RAG
-    - Use CrySL primer (semantics-only, cached) + shaped CrySL contract (authoritative)
-    - Keep dependency constraints/ensures (bounded) to help cross-class contracts
-    """
+SYSTEM_MESSAGES = [
+    {
+        "role": "system",
+        "content": (
+            "You are a meticulous secure Java cryptography assistant. Produce production-quality code, "
+            "prefer constant-time primitives, and never invent APIs outside the official JCA/JCE surface."
+        ),
+    }
+]
+
+# Completion budget for one secure example (a compact Java class fits in 400-800 tokens);
+# batched requests scale it by rule count. Default for --max-tokens.
+MAX_COMPLETION_TOKENS = 900
+# Repair replies re-emit the whole corrected class after a prompt that also carries the
+# previous code and compiler output, so they get a larger budget of their own.
+REPAIR_COMPLETION_TOKENS = 2000
+
+
+# Chat-completion arguments for one secure-example prompt (shared by direct and Batch API calls).
+# temperature=0 keeps replies deterministic, which also makes response-cache hits meaningful.
+def _chat_kwargs(model: str, prompt: str, max_tokens: Optional[int] = None) -> Dict:
+    return {
+        "model": model,
+        "messages": SYSTEM_MESSAGES + [{"role": "user", "content": prompt}],
+        "temperature": 0.0,
+        "max_tokens": max_tokens or MAX_COMPLETION_TOKENS,
+    }
+
+
+# Send one user prompt (after the shared system message) and return the stripped reply text.
+# Identical requests (same model, messages and settings) are answered from the response cache.
+# Replies cut off by max_tokens are retried with a larger budget and never cached.
+def _chat(client: OpenAI, backend: str, model: str, prompt: str, max_tokens: Optional[int] = None) -> str:
+    request = _chat_kwargs(model, prompt, max_tokens)
+
+    def _create(**kwargs):
+        _maybe_throttle_gateway(backend, "chat.completions")
+        return client.chat.completions.create(**kwargs)
+
+    return cached_completion(request, lambda: complete_chat_text(_create, request).strip())
+
+
+def _print_contract(crysl_summary: str) -> None:
+    print("\n[debug] ===== SHAPED CRYSL CONTRACT START =====", file=sys.stderr)
+    print(crysl_summary, file=sys.stderr)
+    print("[debug] ===== SHAPED CRYSL CONTRACT END =====\n", file=sys.stderr)
+
+
+def context_cache_path(class_name: str, language: str) -> Path:
+    return CONTEXT_DIR / f"{safe_class_name(class_name)}_{language}.json"
+
+
+# Map every sanitized rule file a context may read (primary and dependencies, in each preferred
+# language) to its st_mtime_ns, or -1 when missing, so a file Java writes later invalidates it.
+def _sanitized_mtimes(fqcns: List[str], languages: List[str]) -> Dict[str, int]:
+    mtimes: Dict[str, int] = {}
+    for fqcn in fqcns:
+        for lang in languages:
+            path = rule_path(fqcn, lang)
+            try:
+                mtimes[str(path)] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[str(path)] = -1
+    return mtimes
+
+
+def _current_mtime(path: str) -> int:
     try:
-        with json_path.open(encoding="utf-8") as handle:
-            rule_payload = json.load(handle)
-    except Exception as exc:
-        print(f"Failed to read rule JSON {json_path}: {exc}", file=sys.stderr)
-        return None
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
 
-    class_name = rule_payload.get("className")
-    if not class_name:
-        print("rule JSON missing className", file=sys.stderr)
-        return None
 
+# Return a prepared prompt context if it is still current, else None.
+# Entries are invalidated by the format version, the CrySL file's mtime, the mtimes of the
+# sanitized rule files they were built from, and any payload fallback values they used.
+def _load_prepared_context(crysl_path: Path, class_name: str, language: str, rule_payload: Dict) -> Optional[Dict[str, str]]:
     try:
-        client = _build_client_for_backend(backend)
-        resolved_model, resolved_emb_model = _resolve_models_for_backend(backend, model, emb_model)
-    except Exception as exc:
-        print(f"Backend/model configuration error: {exc}", file=sys.stderr)
+        entry = read_json(context_cache_path(class_name, language))
+        if entry["version"] != CONTEXT_FORMAT_VERSION:
+            return None
+        if entry["crysl_mtime_ns"] != os.stat(crysl_path).st_mtime_ns:
+            return None
+        if any(_current_mtime(path) != mtime for path, mtime in entry["sanitized_mtimes"].items()):
+            return None
+        if any(rule_payload.get(key, "N/A") != value for key, value in entry["fallbacks"].items()):
+            return None
+        return entry["ctx"]
+    except Exception:
         return None
 
+
+def _save_prepared_context(
+    crysl_path: Path,
+    class_name: str,
+    language: str,
+    ctx: Dict[str, str],
+    fallbacks: Dict[str, str],
+    sanitized_mtimes: Dict[str, int],
+) -> None:
+    entry = {
+        "version": CONTEXT_FORMAT_VERSION,
+        "crysl_mtime_ns": os.stat(crysl_path).st_mtime_ns,
+        "sanitized_mtimes": sanitized_mtimes,
+        "fallbacks": fallbacks,
+        "ctx": ctx,
+    }
+    try:
+        target = context_cache_path(class_name, language)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_json(target, entry)
+    except OSError as exc:
+        print(f"[WARN] Could not write prepared context for {class_name}: {exc}", file=sys.stderr)
+
+
+# Build the authoritative CrySL contract and bounded dependency context for one rule payload.
+def build_rule_context(rule_payload: Dict, language: str, rules_dir: Path) -> Dict[str, str]:
+    class_name = rule_payload["className"]
+
     preferred_langs = [language]
     if language.lower() != "english":
         preferred_langs.append("English")
@@ -973,13 +1044,20 @@ def process_rule(
     # --- Build CrySL contract (authoritative) ---
     simple_name = class_name.rsplit(".", 1)[-1] # CrySL rule files are named by simple class name convention, e.g., "Cipher.crysl"
     crysl_path = rules_dir / f"{simple_name}.crysl"
+    prepared = _load_prepared_context(crysl_path, class_name, language, rule_payload)
+    if prepared is not None:
+        _print_contract(prepared["crysl_summary"])
+        return prepared
+
     raw_crysl = crysl_path.read_text(encoding="utf-8") if crysl_path.exists() else ""
     crysl_sections = crysl_to_json_lines(raw_crysl) if raw_crysl else {}
+    fallbacks: Dict[str, str] = {}
 
     def prefer(section: str, fallback_key: str) -> str:
         if section in crysl_sections and crysl_sections[section]:
             return lines_to_text(crysl_sections[section])
-        return rule_payload.get(fallback_key, "N/A")
+        fallbacks[fallback_key] = rule_payload.get(fallback_key, "N/A")
+        return fallbacks[fallback_key]
 
     objects_txt = prefer("OBJECTS", "objects")
     events_txt = prefer("EVENTS", "events")
@@ -1002,58 +1080,63 @@ def process_rule(
 
     crysl_summary = shape_crysl_contract(crysl_summary)
 
-    print("\n[debug] ===== SHAPED CRYSL CONTRACT START =====", file=sys.stderr)
-    print(crysl_summary, file=sys.stderr)
-    print("[debug] ===== SHAPED CRYSL CONTRACT END =====\n", file=sys.stderr)
+    _print_contract(crysl_summary)
 
     # --- Dependency context (bounded) ---
-    dep_order_constraints, dep_map_constraints = collect_dependency_constraints(class_name, preferred_langs)
-    dep_constraints_text = format_dependency_constraints(dep_order_constraints, dep_map_constraints)
-
-    dep_order_ensures, dep_map_ensures = collect_dependency_ensures(class_name, preferred_langs, depth=1)
-    dep_ensures_text = format_dependency_ensures(dep_order_ensures, dep_map_ensures)
-
-    # --- Primer (semantics-only; cached) ---
-    effective_pdf_path = pdf_path if (pdf_path and pdf_path.exists()) else PDF_PATH
-    crysl_primer = load_crysl_primer(
-        pdf_path=effective_pdf_path,
-        emb_model=resolved_emb_model,
-        cache_dir=PROJECT_ROOT / "rag_cache",
-        backend=backend,
-        client=client,
+    # The primary sanitized rule is resolved once (language fallback included) and shared.
+    # One walk loads each dependency rule once for both its constraints and its ENSURES.
+    # Java writes sanitized files lazily, so the mtimes of the primary and its direct dependencies
+    # (all that depth=1 reads) are taken before reading them: a file created or rewritten while
+    # this runs then leaves the saved entry stale, never wrongly current.
+    sanitized_mtimes = _sanitized_mtimes([class_name], preferred_langs)
+    primary = load_sanitized_rule(class_name, preferred_langs)
+    direct_deps = [d for d in (primary or {}).get("dependency") or [] if isinstance(d, str) and d]
+    sanitized_mtimes.update(_sanitized_mtimes(direct_deps, preferred_langs))
+    dep_order, dep_map_constraints, dep_map_ensures = collect_dependency_info(
+        class_name, preferred_langs, depth=1, primary=primary
     )
+    dep_constraints_text = format_dependency_constraints(dep_order, dep_map_constraints)
+    dep_ensures_text = format_dependency_ensures(dep_order, dep_map_ensures)
 
-    prompt_ctx = {
+    ctx = {
         "class_name": class_name,
-        "crysl_primer": crysl_primer,
         "crysl_summary": crysl_summary,
         "dep_ensures_text": dep_ensures_text,
         "dep_constraints_text": dep_constraints_text,
         "order_txt": order_txt,
     }
+    if raw_crysl:
+        _save_prepared_context(crysl_path, class_name, language, ctx, fallbacks, sanitized_mtimes)
+    return ctx
 
-    prompt = build_secure_prompt(prompt_ctx)
 
-    system_messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a meticulous secure Java cryptography assistant. Produce production-quality code, "
-                "prefer constant-time primitives, and never invent APIs outside the official JCA/JCE surface."
-            ),
-        }
-    ]
-
-    _maybe_throttle_gateway(backend, "chat.completions")
-    response = client.chat.completions.create(
-        model=resolved_model,
-        messages=system_messages + [{"role": "user", "content": prompt}],
-        temperature=0.0,
-        max_tokens=2000,
+# Prepare (and cache) the prompt context of one rule without a Java payload.
+def prepare_context(fqcn: str, language: str, rules_dir: Path = RULES_DIR) -> Dict[str, str]:
+    return build_rule_context({"className": fqcn}, language, rules_dir)
+
+
+# Load the semantics-only primer (cached on disk) for the selected backend.
+def _load_primer(pdf_path: Optional[Path], emb_model: str, backend: str, client: OpenAI) -> str:
+    effective_pdf_path = pdf_path if (pdf_path and pdf_path.exists()) else PDF_PATH
+    return load_crysl_primer(
+        pdf_path=effective_pdf_path,
+        emb_model=emb_model,
+        cache_dir=PROJECT_ROOT / "rag_cache",
+        backend=backend,
+        client=client,
     )
 
-    raw = response.choices[0].message.content.strip()
 
+# Patch a raw model reply and run the compile gate + repair loop; returns fenced Java.
+def finalize_secure_example(
+    raw: str,
+    prompt: str,
+    client: OpenAI,
+    backend: str,
+    model: str,
+    compile_classpath: Optional[str],
+    java_release: str,
+) -> str:
     # 1) deterministic post-pass (imports + class-name normalize)
     patched = auto_import_patch(raw)
     java_only, _ = _extract_fenced_java(patched)
@@ -1096,15 +1179,7 @@ def process_rule(
                 + "\n```"
             )
 
-            _maybe_throttle_gateway(backend, "chat.completions")
-            repair_resp = client.chat.completions.create(
-                model=resolved_model,
-                messages=system_messages + [{"role": "user", "content": repair_prompt}],
-                temperature=0.0,
-                max_tokens=2000,
-            )
-
-            repaired_raw = repair_resp.choices[0].message.content.strip()
+            repaired_raw = _chat(client, backend, model, repair_prompt, REPAIR_COMPLETION_TOKENS)
             repaired_patched = auto_import_patch(repaired_raw)
             repaired_java, _ = _extract_fenced_java(repaired_patched)
             repaired_java = normalize_known_api_mistakes(repaired_java)
@@ -1130,13 +1205,223 @@ def process_rule(
         # Compile passed: ALWAYS return fenced
         patched = _rewrap_fenced_java(java_only, True)
 
-    
     final_java, _ = _extract_fenced_java(patched)
-    patched = _rewrap_fenced_java(final_java, True)
+    return _rewrap_fenced_java(final_java, True)
+
+
+# End-to-end secure example generation with compile/repair loop.
+def process_rule(
+    json_path: Path,
+    language: str,
+    backend: str,
+    model: Optional[str],
+    pdf_path: Optional[Path],
+    emb_model: Optional[str],
+    rules_dir: Path,
+    compile_classpath: Optional[str],
+    java_release: str,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> Optional[str]:
+    """
+    Primer-only mode:
+    - NO rule-specific PDF RAG
+    - Use CrySL primer (semantics-only, cached) + shaped CrySL contract (authoritative)
+    - Keep dependency constraints/ensures (bounded) to help cross-class contracts
+    """
+    try:
+        rule_payload = read_json(json_path)
+    except Exception as exc:
+        print(f"Failed to read rule JSON {json_path}: {exc}", file=sys.stderr)
+        return None
+
+    if not rule_payload.get("className"):
+        print("rule JSON missing className", file=sys.stderr)
+        return None
+
+    try:
+        client = _build_client_for_backend(backend)
+        resolved_model, resolved_emb_model = _resolve_models_for_backend(backend, model, emb_model)
+    except Exception as exc:
+        print(f"Backend/model configuration error: {exc}", file=sys.stderr)
+        return None
+
+    prompt_ctx = build_rule_context(rule_payload, language, rules_dir)
+    prompt_ctx["crysl_primer"] = _load_primer(pdf_path, resolved_emb_model, backend, client)
+    prompt = build_secure_prompt(prompt_ctx)
+
+    raw = _chat(client, backend, resolved_model, prompt, max_tokens)
+    patched = finalize_secure_example(
+        raw, prompt, client, backend, resolved_model, compile_classpath, java_release
+    )
     print(patched)
     return patched
 
 
+# Compile-gate one generated example (falling back to a fresh request when missing) and write it to out_dir.
+def _finalize_and_write(
+    ctx: Dict[str, str],
+    raw: Optional[str],
+    client: OpenAI,
+    backend: str,
+    model: str,
+    compile_classpath: Optional[str],
+    java_release: str,
+    out_dir: Path,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> bool:
+    class_name = ctx["class_name"]
+    # Repairs (and the fallback) use the single-rule prompt so the model sees one contract.
+    prompt = build_secure_prompt(ctx)
+    try:
+        if not raw:
+            print(f"[WARN] No batched output for {class_name}; retrying alone.", file=sys.stderr)
+            raw = _chat(client, backend, model, prompt, max_tokens)
+        patched = finalize_secure_example(raw, prompt, client, backend, model, compile_classpath, java_release)
+    except Exception as exc:
+        print(f"[ERROR] Secure generation failed for {class_name}: {exc}", file=sys.stderr)
+        return False
+    target = example_output_path(out_dir, class_name, "secure")
+    target.write_text(patched, encoding="utf-8")
+    print(f"{target.name} written.", file=sys.stderr)
+    return True
+
+
+# Generate secure examples for many rules with one chat completion per --batch-size group.
+def process_rules_batch(
+    rule_payloads: List[Dict],
+    language: str,
+    backend: str,
+    model: Optional[str],
+    pdf_path: Optional[Path],
+    emb_model: Optional[str],
+    rules_dir: Path,
+    compile_classpath: Optional[str],
+    java_release: str,
+    out_dir: Path,
+    batch_size: int,
+    workers: int = 1,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> int:
+    """
+    Batched variant of process_rule.
+
+    The primer and the static guidance are sent once per group; the reply is split on
+    `### OUTPUT i` markers and every example still passes the per-rule compile gate.
+    Rules the batched reply misses fall back to a single-rule request. Up to `workers`
+    groups are in flight at once. Results are written to `out_dir` as
+    `<className>_secure.txt`; returns the number of rules that failed.
+    """
+    try:
+        client = _build_client_for_backend(backend)
+        resolved_model, resolved_emb_model = _resolve_models_for_backend(backend, model, emb_model)
+    except Exception as exc:
+        print(f"Backend/model configuration error: {exc}", file=sys.stderr)
+        return len(rule_payloads)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    crysl_primer = _load_primer(pdf_path, resolved_emb_model, backend, client)
+
+    def run_group(group: List[Dict]) -> int:
+        contexts = [dict(build_rule_context(rule, language, rules_dir), crysl_primer=crysl_primer) for rule in group]
+        try:
+            if len(contexts) == 1:
+                replies = [_chat(client, backend, resolved_model, build_secure_prompt(contexts[0]), max_tokens)]
+            else:
+                reply = _chat(
+                    client,
+                    backend,
+                    resolved_model,
+                    build_batch_secure_prompt(contexts, crysl_primer),
+                    max_tokens=max_tokens * len(contexts),
+                )
+                replies = split_batch_output(reply, len(contexts))
+        except Exception as exc:
+            if len(contexts) == 1:
+                print(f"[ERROR] Secure generation failed for {contexts[0]['class_name']}: {exc}", file=sys.stderr)
+                return 1
+            # A failed batched request (rate limit, timeout, oversized budget) is retried rule by
+            # rule: _finalize_and_write sends the single-rule prompt for every missing reply.
+            print(f"[WARN] Batched request for {len(contexts)} rules failed: {exc}", file=sys.stderr)
+            replies = [None] * len(contexts)
+
+        failed = 0
+        for ctx, raw in zip(contexts, replies):
+            if not _finalize_and_write(
+                ctx, raw, client, backend, resolved_model, compile_classpath, java_release, out_dir, max_tokens
+            ):
+                failed += 1
+        return failed
+
+    # Groups spend most of their time waiting on the chat endpoint and javac, so a small
+    # thread pool overlaps them; the shared client, caches and gateway limiter are thread-safe.
+    return run_groups(chunked(rule_payloads, batch_size), run_group, workers)
+
+
+# Generate secure examples through the OpenAI Batch API; repairs still run as direct requests.
+def process_rules_async_batch(
+    rule_payloads: List[Dict],
+    language: str,
+    model: Optional[str],
+    pdf_path: Optional[Path],
+    emb_model: Optional[str],
+    rules_dir: Path,
+    compile_classpath: Optional[str],
+    java_release: str,
+    out_dir: Path,
+    poll_seconds: float,
+    max_tokens: int = MAX_COMPLETION_TOKENS,
+) -> int:
+    """
+    Submit one single-rule prompt per rule as an OpenAI Batch API job (custom_id = className),
+    wait for it, then run every reply through the usual compile gate before writing
+    `<className>_secure.txt` to `out_dir`. Returns the number of rules that failed.
+    """
+    backend = "openai"
+    try:
+        client = _build_client_for_backend(backend)
+        resolved_model, resolved_emb_model = _resolve_models_for_backend(backend, model, emb_model)
+    except Exception as exc:
+        print(f"Backend/model configuration error: {exc}", file=sys.stderr)
+        return len(rule_payloads)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    crysl_primer = _load_primer(pdf_path, resolved_emb_model, backend, client)
+    contexts: Dict[str, Dict[str, str]] = {}
+    for rule in rule_payloads:
+        ctx = build_rule_context(rule, language, rules_dir)
+        ctx["crysl_primer"] = crysl_primer
+        contexts[ctx["class_name"]] = ctx
+
+    try:
+        replies = run_chat_batch(
+            client,
+            [
+                (name, _chat_kwargs(resolved_model, build_secure_prompt(ctx), max_tokens))
+                for name, ctx in contexts.items()
+            ],
+            poll_seconds=poll_seconds,
+        )
+    except Exception as exc:
+        print(f"[ERROR] Batch API submission failed: {exc}", file=sys.stderr)
+        return len(contexts)
+
+    failures = 0
+    for name, ctx in contexts.items():
+        if not _finalize_and_write(
+            ctx,
+            replies.get(name),
+            client,
+            backend,
+            resolved_model,
+            compile_classpath,
+            java_release,
+            out_dir,
+            max_tokens,
+        ):
+            failures += 1
+    return failures
+
+
 # Parse CLI arguments for code generation.
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -1151,7 +1436,11 @@ def parse_args() -> argparse.Namespace:
         help="Path to the CrySLRules directory containing *.crysl files.",
     )
 
-    parser.add_argument("json_path", help="Path to the temp JSON produced by the Java pipeline.")
+    parser.add_argument(
+        "json_path",
+        nargs="?",
+        help="Path to the temp JSON produced by the Java pipeline (omit when using --batch).",
+    )
     parser.add_argument(
         "--backend",
         choices=["openai", "gateway"],
@@ -1194,14 +1483,80 @@ def parse_args() -> argparse.Namespace:
         default="21",
         help="Java release flag for javac compile validation (e.g., 21).",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--batch",
+        default=None,
+        help=(
+            "Directory of rule JSON payloads, or a JSON file holding a list of payloads. "
+            "Rules are sent together in one chat completion per --batch-size group."
+        ),
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=5,
+        help="Maximum number of rules per batched chat completion (default: 5).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of --batch-size groups generated concurrently in --batch mode (default: 4).",
+    )
+    parser.add_argument(
+        "--out-dir",
+        default=None,
+        help="Directory receiving <className>_secure.txt files in --batch mode (e.g. the code_cache).",
+    )
+    parser.add_argument(
+        "--async-batch",
+        action="store_true",
+        help=(
+            "With --batch: submit one request per rule through the OpenAI Batch API instead of chat completions "
+            "(half price, separate rate limits, results may take up to 24h). OpenAI backend only."
+        ),
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between Batch API status checks for --async-batch (default: 30).",
+    )
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=MAX_COMPLETION_TOKENS,
+        help=f"Completion token cap per secure example (default: {MAX_COMPLETION_TOKENS}).",
+    )
+    parser.add_argument(
+        "--prepare-all",
+        action="store_true",
+        help=(
+            "Prepare the prompt context of every rule in --rules-dir for --language under rag_cache/ctx "
+            "and exit (no LLM calls)."
+        ),
+    )
+    args = parser.parse_args()
+    if args.prepare_all:
+        if args.batch or args.json_path:
+            parser.error("--prepare-all takes neither json_path nor --batch")
+        return args
+    if bool(args.batch) == bool(args.json_path):
+        parser.error("pass exactly one of json_path or --batch")
+    if args.batch and not args.out_dir:
+        parser.error("--out-dir is required with --batch")
+    if args.async_batch and not args.batch:
+        parser.error("--async-batch requires --batch")
+    if args.async_batch and args.backend != "openai":
+        parser.error("--async-batch is only supported with --backend openai")
+    return args
 
 
 
 # CLI entry point: wire arguments into process_rule.
 def main() -> None:
     args = parse_args()
-    json_path = Path(args.json_path)
+    max_tokens = max(1, args.max_tokens)
     language = args.language
     pdf_path = Path(args.pdf) if args.pdf else None
 
@@ -1209,6 +1564,55 @@ def main() -> None:
     compile_classpath = args.compile_classpath
     java_release = str(args.java_release)
 
+    if args.prepare_all:
+        crysl_files = list_files(rules_dir, ".crysl")
+        for crysl_path in crysl_files:
+            spec = crysl_to_json_lines(crysl_path.read_text(encoding="utf-8")).get("SPEC") or [crysl_path.stem]
+            prepare_context(spec[0], language, rules_dir)
+        print(f"[INFO] Prepared {len(crysl_files)} rule contexts for {language} in {CONTEXT_DIR}.", file=sys.stderr)
+        return
+
+    if args.batch:
+        rule_payloads = [
+            payload for payload in load_rule_payloads(Path(args.batch))
+            if "insecure" not in str(payload.get("exampleType", "secure")).lower()
+        ]
+        if not rule_payloads:
+            print(f"No secure rule payloads found in {args.batch}.", file=sys.stderr)
+            sys.exit(1)
+        if args.async_batch:
+            failures = process_rules_async_batch(
+                rule_payloads=rule_payloads,
+                language=language,
+                model=args.model,
+                pdf_path=pdf_path,
+                emb_model=args.emb_model,
+                rules_dir=rules_dir,
+                compile_classpath=compile_classpath,
+                java_release=java_release,
+                out_dir=Path(args.out_dir),
+                poll_seconds=args.poll_interval,
+                max_tokens=max_tokens,
+            )
+            sys.exit(1 if failures else 0)
+        failures = process_rules_batch(
+            rule_payloads=rule_payloads,
+            language=language,
+            backend=args.backend,
+            model=args.model,
+            pdf_path=pdf_path,
+            emb_model=args.emb_model,
+            rules_dir=rules_dir,
+            compile_classpath=compile_classpath,
+            java_release=java_release,
+            out_dir=Path(args.out_dir),
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_tokens=max_tokens,
+        )
+        sys.exit(1 if failures else 0)
+
+    json_path = Path(args.json_path)
     result = process_rule(
         json_path=json_path,
         language=language,
@@ -1219,6 +1623,7 @@ def main() -> None:
         rules_dir=rules_dir,
         compile_classpath=compile_classpath,
         java_release=java_release,
+        max_tokens=max_tokens,
     )
     if result is None:
         sys.exit(1)
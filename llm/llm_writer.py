@@ -1,26 +1,31 @@
+from __future__ import annotations
+
 import os
 import sys
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
 import numpy as np
-from openai import OpenAI
 
-from paper_index import build_pdf_index
+from utils.embedding_cache import cached_embed, cached_embed_async
+from utils.llm_clients import TruncatedReplyError, complete_chat_text, embedding_rows, get_async_client, get_client
+from utils.response_cache import cached_completion, cached_completion_async, cached_streamed_completion
 from utils.writer_core import (
     WriterCLIConfig,
     build_explanation_prompt,
+    build_rag_query,
     build_system_messages,
+    format_rag_snippets,
     process_rule_core,
+    process_rule_core_async,
+    rag_query_has_signal,
     run_writer_main,
 )
 
-try:
-    # ensure Python stdout uses UTF-8 (Python 3.7+)
-    sys.stdout.reconfigure(encoding="utf-8")
-except Exception:
-    # fallback: rely on caller to set PYTHONIOENCODING
-    pass
+if TYPE_CHECKING:
+    # openai (and the faiss-backed paper index) load only once main() needs them,
+    # so importing this module stays cheap and free of side effects.
+    from openai import AsyncOpenAI, OpenAI
 
 
 # Resolve project root and important folders
@@ -33,7 +38,7 @@ PDF_PATH = PROJECT_ROOT / "tse19CrySL.pdf"
 def _embed_texts(client: OpenAI, texts: List[str], model: str = "text-embedding-3-small") -> np.ndarray:
     """Return float32 embeddings for a list of strings using an OpenAI embedding model."""
     resp = client.embeddings.create(model=model, input=texts)
-    return np.asarray([d.embedding for d in resp.data], dtype="float32")
+    return np.asarray(embedding_rows(resp), dtype="float32")
 
 
 # Build RAG context using the CrySL paper index and this rule's sections.
@@ -57,63 +62,65 @@ def make_rag_context(
     - rag_block: concatenated snippets tagged [C1], [C2], ...
     """
 
-    # 1) Bias retrieval toward CrySL grammar/semantics (so we explain the SYNTAX)
-    syntax_boost = """
-    CRYSL language syntax and semantics:
-    - Sections: SPEC, OBJECTS, EVENTS, ORDER, CONSTRAINTS, REQUIRES, ENSURES, FORBIDDEN
-    - Typestate / usage protocols: ORDER as a regex over EVENTS; use of aggregates
-    - Predicates: REQUIRES / ENSURES; NEGATES; 'after' placement for predicate generation
-    - Helper functions: alg(), mode(), padding(), length(), neverTypeOf(), callTo(), noCallTo()
-    - Examples to retrieve: KeyGenerator (Fig. 2), Cipher (Fig. 3), PBEKeySpec (Fig. 4)
-    - EBNF grammar and formal semantics
-    """.strip()
-
-    # 2) Build the query using BOTH the syntax boost and this rule's actual sections
-    query_text = "\n".join(
-        [
-            syntax_boost,
-            "THIS RULE:",
-            "SPEC: " + (rule_sections_txt.get("SPEC") or ""),
-            "OBJECTS: " + (rule_sections_txt.get("OBJECTS") or ""),
-            "EVENTS: " + (rule_sections_txt.get("EVENTS") or ""),
-            "ORDER: " + (rule_sections_txt.get("ORDER") or ""),
-            "CONSTRAINTS: " + (rule_sections_txt.get("CONSTRAINTS") or ""),
-            "REQUIRES: " + (rule_sections_txt.get("REQUIRES") or ""),
-            "ENSURES: " + (rule_sections_txt.get("ENSURES") or ""),
-        ]
-    ).strip()
-
     if not hasattr(idx, "index") or idx.index is None or not chunks:
         return ""
+    if not rag_query_has_signal(rule_sections_txt):
+        return ""
 
-    # 3) Embed and search through the shared abstraction.
+    # Embed the query (syntax boost + this rule's sections) and search through the shared abstraction.
     # Using `idx.search(...)` aligns OpenAI and gateway adapters on one retrieval contract:
     # both receive ordered `(chunk_id, score)` hits from EmbeddingIndex.
-    qvec = _embed_texts(client, [query_text], model=emb_model)[0]
+    # The query is deterministic per rule, so its embedding is cached on disk across runs.
+    qvec = cached_embed(
+        lambda text: _embed_texts(client, [text], model=emb_model)[0],
+        build_rag_query(rule_sections_txt),
+        emb_model,
+    )
     hits = idx.search(qvec, k)
+    return format_rag_snippets(hits, chunks, per_chunk_max)
 
-    # 4) Build tagged snippets; normalize common PDF ligatures for safer display
-    def _normalize_pdf_text(s: str) -> str:
-        """Normalize common PDF ligatures and soft hyphens for cleaner markdown output."""
-        return s.replace("\ufb01", "fi").replace("\ufb02", "fl").replace("\u00ad", "").strip()
 
-    # Resolve FAISS hit ids to chunk objects via a dictionary instead of positional indexing.
-    # This avoids accidental coupling to list order and keeps mapping stable by chunk id.
-    chunk_by_id = {getattr(c, "id", None): c for c in chunks}
-    rag_snippets: List[str] = []
+# Async twin of _embed_texts; run_many also uses it to embed all rules' queries in one request.
+async def _embed_texts_async(client: AsyncOpenAI, texts: List[str], model: str) -> np.ndarray:
+    """Return float32 embeddings for a list of strings, awaiting one embeddings request."""
+    resp = await client.embeddings.create(model=model, input=texts)
+    return np.asarray(embedding_rows(resp), dtype="float32")
+
+
+# Async variant of make_rag_context for the multi-rule driver.
+async def make_rag_context_async(
+    client: AsyncOpenAI,
+    idx,
+    chunks,
+    emb_model: str,
+    rule_sections_txt: Dict[str, str],
+    k: int = 6,
+    per_chunk_max: int = 900,
+) -> str:
+    """Same retrieval as make_rag_context, awaiting the query embedding on an AsyncOpenAI client."""
+    if not hasattr(idx, "index") or idx.index is None or not chunks:
+        return ""
+    if not rag_query_has_signal(rule_sections_txt):
+        return ""
 
-    for rank, (hid, _score) in enumerate(hits, start=1):
-        c = chunk_by_id.get(hid)
-        if not c:
-            continue
-        tag = f"[C{rank}]"
-        text = _normalize_pdf_text(getattr(c, "text", ""))
-        if per_chunk_max and len(text) > per_chunk_max:
-            text = text[:per_chunk_max].rsplit(" ", 1)[0] + " ..."
-        rag_snippets.append(f"{tag} {text}")
+    async def _embed(text: str) -> np.ndarray:
+        return (await _embed_texts_async(client, [text], model=emb_model))[0]
 
-    rag_block = "\n\n".join(rag_snippets) if rag_snippets else ""
-    return rag_block
+    qvec = await cached_embed_async(_embed, build_rag_query(rule_sections_txt), emb_model)
+    return format_rag_snippets(idx.search(qvec, k), chunks, per_chunk_max)
+
+
+# Chat-completion arguments shared by the sync and async explanation calls.
+def _explanation_request(model: str, rag_block: str, **prompt_fields) -> Dict:
+    """Build the strict user prompt plus system guidance (and optional hidden RAG material)."""
+    prompt = build_explanation_prompt(include_utf8_line=True, **prompt_fields)
+    return {
+        "model": model,
+        "messages": build_system_messages(rag_block) + [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": 4000,
+        # No stop sequence to avoid accidental truncation on ``` blocks
+    }
 
 
 # Build the LLM prompt and request a structured explanation.
@@ -134,10 +141,12 @@ def generate_explanation(
     raw_crysl_text: str,
     explanation_language: str,
     rag_block: str = "",
+    on_delta: Optional[Callable[[str], None]] = None,
 ) -> str:
-    """Generate a full natural-language rule explanation via OpenAI chat completion."""
-    # Build the strict user prompt that includes CrySL-derived fields and section requirements.
-    prompt = build_explanation_prompt(
+    """Generate a full natural-language rule explanation via OpenAI chat completion (streamed to on_delta when given)."""
+    request = _explanation_request(
+        model,
+        rag_block,
         class_name=class_name,
         objects=objects,
         events=events,
@@ -151,21 +160,49 @@ def generate_explanation(
         sanitized_summary=sanitized_summary,
         raw_crysl_text=raw_crysl_text,
         explanation_language=explanation_language,
-        include_utf8_line=True,
     )
 
-    # Add base system guidance and optional hidden RAG reference material.
-    sys_msgs = build_system_messages(rag_block)
+    # Single completion call for the final explanation text (served from the response cache on re-runs).
+    # A reply cut off by max_tokens is retried with a larger budget and never cached.
+    if on_delta is None:
+        return cached_completion(request, lambda: complete_chat_text(client.chat.completions.create, request))
 
-    # Single completion call for the final explanation text.
-    resp = client.chat.completions.create(
-        model=model,
-        messages=sys_msgs + [{"role": "user", "content": prompt}],
-        temperature=0.3,
-        max_tokens=4000,
-        # No stop sequence to avoid accidental truncation on ``` blocks
-    )
-    return resp.choices[0].message.content
+    # Streamed variant: hand each text delta to on_delta as it arrives.
+    finish_reasons: List[str] = []
+
+    def _stream():
+        for chunk in client.chat.completions.create(**request, stream=True):
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reasons.append(choice.finish_reason)
+                yield choice.delta.content or ""
+
+    # A printed reply cannot be retried, but one cut off by max_tokens is kept out of the cache.
+    return cached_streamed_completion(request, _stream, on_delta, lambda: "length" not in finish_reasons)
+
+
+# Async variant of generate_explanation for the multi-rule driver.
+async def generate_explanation_async(client: AsyncOpenAI, model: str, rag_block: str = "", **prompt_fields) -> str:
+    """Generate an explanation by awaiting an AsyncOpenAI chat completion (same prompt and settings)."""
+    request = _explanation_request(model, rag_block, **prompt_fields)
+
+    # Streamed and joined: the client's --timeout then bounds a stall between tokens
+    # rather than the whole generation of a long explanation.
+    async def _call() -> str:
+        parts = []
+        finish_reason = None
+        async for chunk in await client.chat.completions.create(**request, stream=True):
+            if chunk.choices:
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                parts.append(choice.delta.content or "")
+        if finish_reason == "length":
+            # Raising keeps the cut-off explanation out of the response cache.
+            raise TruncatedReplyError(f"Explanation was cut off at max_tokens={request['max_tokens']}.")
+        return "".join(parts)
+
+    return await cached_completion_async(request, _call)
 
 
 # Orchestrate a single rule's explanation generation pipeline.
@@ -179,6 +216,8 @@ def process_rule(
     chunks=None,
     k: int = 6,
     emb_model: str = "text-embedding-3-small",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
 ):
     """Run the shared single-rule pipeline with OpenAI-specific callbacks."""
     return process_rule_core(
@@ -193,12 +232,59 @@ def process_rule(
         chunks=chunks,
         k=k,
         emb_model=emb_model,
+        use_prebuilt=use_prebuilt,
+        include_raw=include_raw,
+    )
+
+
+# Async single-rule pipeline used when several class names are explained in one run.
+async def process_rule_async(
+    crysl_path: str,
+    language: str,
+    client: AsyncOpenAI,
+    model: str,
+    target_fqcn: str,
+    idx=None,
+    chunks=None,
+    k: int = 6,
+    emb_model: str = "text-embedding-3-small",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
+    rag_block=None,
+    inputs=None,
+):
+    """Run the shared async single-rule pipeline with OpenAI-specific callbacks."""
+    return await process_rule_core_async(
+        crysl_path=crysl_path,
+        language=language,
+        client=client,
+        model=model,
+        target_fqcn=target_fqcn,
+        make_rag_context_fn=make_rag_context_async,
+        generate_explanation_fn=generate_explanation_async,
+        idx=idx,
+        chunks=chunks,
+        k=k,
+        emb_model=emb_model,
+        use_prebuilt=use_prebuilt,
+        include_raw=include_raw,
+        rag_block=rag_block,
+        inputs=inputs,
     )
 
 
 # CLI entrypoint: parse args, init OpenAI client, optional RAG index, and run.
 def main():
     """CLI entrypoint for OpenAI-backed explanation generation."""
+    try:
+        # ensure Python stdout uses UTF-8 (Python 3.7+)
+        sys.stdout.reconfigure(encoding="utf-8")
+    except Exception:
+        # fallback: rely on caller to set PYTHONIOENCODING
+        pass
+
+    from paper_index import build_pdf_index
+
     # Provider-specific defaults are injected into the shared CLI/runtime orchestrator.
     cli_config = WriterCLIConfig(
         description="Generate CrySL rule explanations via LLM (with dependency ENSURES + constraints, optional RAG)",
@@ -213,9 +299,16 @@ def main():
     run_writer_main(
         rules_dir=RULES_DIR,
         cli_config=cli_config,
-        init_client_fn=lambda: OpenAI(api_key=os.getenv("OPENAI_API_KEY")),
+        init_client_fn=lambda: get_client(os.getenv("OPENAI_API_KEY")),
         build_pdf_index_fn=build_pdf_index,
         process_rule_fn=process_rule,
+        init_async_client_fn=lambda max_connections: get_async_client(
+            os.getenv("OPENAI_API_KEY"), max_connections=max_connections
+        ),
+        process_rule_async_fn=process_rule_async,
+        embed_texts_async_fn=_embed_texts_async,
+        explanation_request_fn=_explanation_request,
+        make_rag_context_fn=make_rag_context,
     )
 
 
@@ -1,26 +1,34 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
+import asyncio
 import os
 import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
 import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
 
+from utils.embedding_cache import cached_embed, cached_embed_async
 from utils.gateway_rate_limit import wait_for_gateway_slot
+from utils.llm_clients import TruncatedReplyError, complete_chat_text, embedding_rows, get_async_client, get_client
+from utils.response_cache import cached_completion, cached_completion_async, cached_streamed_completion
 from utils.writer_core import (
     WriterCLIConfig,
     build_explanation_prompt,
+    build_rag_query,
     build_system_messages,
+    format_rag_snippets,
     process_rule_core,
+    process_rule_core_async,
+    rag_query_has_signal,
     run_writer_main,
 )
 
-try:
-    sys.stdout.reconfigure(encoding="utf-8")
-except Exception:
-    pass
+if TYPE_CHECKING:
+    # openai loads only when a client is built, so importing this module stays cheap.
+    from openai import AsyncOpenAI, OpenAI
 
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -29,20 +37,31 @@ PDF_PATH = PROJECT_ROOT / "tse19CrySL.pdf"
 DEFAULT_GATEWAY_BASE_URL = "https://ai-gateway.uni-paderborn.de/v1/"
 
 
-def get_gateway_client() -> OpenAI:
-    """Return an OpenAI-compatible client configured for the UPB gateway."""
+def _gateway_credentials() -> tuple[str, str]:
+    """Return (api_key, base_url) for the UPB gateway."""
     api_key = os.getenv("GATEWAY_API_KEY")
     if not api_key:
         raise RuntimeError("GATEWAY_API_KEY is not set.")
-    base_url = os.getenv("GATEWAY_BASE_URL", DEFAULT_GATEWAY_BASE_URL)
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return api_key, os.getenv("GATEWAY_BASE_URL", DEFAULT_GATEWAY_BASE_URL)
+
+
+def get_gateway_client() -> OpenAI:
+    """Return an OpenAI-compatible client configured for the UPB gateway."""
+    api_key, base_url = _gateway_credentials()
+    return get_client(api_key, base_url)
+
+
+def get_async_gateway_client(max_connections: int = 10) -> AsyncOpenAI:
+    """Return an async OpenAI-compatible client for the UPB gateway, pooling `max_connections` connections."""
+    api_key, base_url = _gateway_credentials()
+    return get_async_client(api_key, base_url, max_connections=max_connections)
 
 
 def _embed_texts(client: OpenAI, texts: List[str], model: str = "YOUR_EMBEDDING_MODEL") -> np.ndarray:
     """Return float32 embeddings for a list of strings using a gateway embedding model."""
     wait_for_gateway_slot("embeddings")
     resp = client.embeddings.create(model=model, input=texts)
-    return np.asarray([d.embedding for d in resp.data], dtype="float32")
+    return np.asarray(embedding_rows(resp), dtype="float32")
 
 
 def make_rag_context(
@@ -55,53 +74,59 @@ def make_rag_context(
     per_chunk_max: int = 900,
 ) -> str:
     """Build a retrieval context block from top-k CrySL-paper chunks."""
-    syntax_boost = """
-    CRYSL language syntax and semantics:
-    - Sections: SPEC, OBJECTS, EVENTS, ORDER, CONSTRAINTS, REQUIRES, ENSURES, FORBIDDEN
-    - Typestate / usage protocols: ORDER as a regex over EVENTS; use of aggregates
-    - Predicates: REQUIRES / ENSURES; NEGATES; 'after' placement for predicate generation
-    - Helper functions: alg(), mode(), padding(), length(), neverTypeOf(), callTo(), noCallTo()
-    - Examples to retrieve: KeyGenerator (Fig. 2), Cipher (Fig. 3), PBEKeySpec (Fig. 4)
-    - EBNF grammar and formal semantics
-    """.strip()
-
-    query_text = "\n".join(
-        [
-            syntax_boost,
-            "THIS RULE:",
-            "SPEC: " + (rule_sections_txt.get("SPEC") or ""),
-            "OBJECTS: " + (rule_sections_txt.get("OBJECTS") or ""),
-            "EVENTS: " + (rule_sections_txt.get("EVENTS") or ""),
-            "ORDER: " + (rule_sections_txt.get("ORDER") or ""),
-            "CONSTRAINTS: " + (rule_sections_txt.get("CONSTRAINTS") or ""),
-            "REQUIRES: " + (rule_sections_txt.get("REQUIRES") or ""),
-            "ENSURES: " + (rule_sections_txt.get("ENSURES") or ""),
-        ]
-    ).strip()
-
     if not hasattr(idx, "index") or idx.index is None or not chunks:
         return ""
+    if not rag_query_has_signal(rule_sections_txt):
+        return ""
 
-    qvec = _embed_texts(client, [query_text], model=emb_model)[0]
+    qvec = cached_embed(
+        lambda text: _embed_texts(client, [text], model=emb_model)[0],
+        build_rag_query(rule_sections_txt),
+        emb_model,
+    )
     hits = idx.search(qvec, k)
+    return format_rag_snippets(hits, chunks, per_chunk_max)
+
+
+# Async twin of _embed_texts; run_many also uses it to embed all rules' queries in one request.
+async def _embed_texts_async(client: AsyncOpenAI, texts: List[str], model: str) -> np.ndarray:
+    """Return float32 embeddings for a list of strings, awaiting one throttled gateway request."""
+    await asyncio.to_thread(wait_for_gateway_slot, "embeddings")
+    resp = await client.embeddings.create(model=model, input=texts)
+    return np.asarray(embedding_rows(resp), dtype="float32")
+
+
+async def make_rag_context_async(
+    client: AsyncOpenAI,
+    idx,
+    chunks,
+    emb_model: str,
+    rule_sections_txt: Dict[str, str],
+    k: int = 6,
+    per_chunk_max: int = 900,
+) -> str:
+    """Same retrieval as make_rag_context, awaiting the query embedding on an async gateway client."""
+    if not hasattr(idx, "index") or idx.index is None or not chunks:
+        return ""
+    if not rag_query_has_signal(rule_sections_txt):
+        return ""
 
-    def _normalize_pdf_text(s: str) -> str:
-        return s.replace("\ufb01", "fi").replace("\ufb02", "fl").replace("\u00ad", "").strip()
+    async def _embed(text: str) -> np.ndarray:
+        return (await _embed_texts_async(client, [text], model=emb_model))[0]
 
-    chunk_by_id = {getattr(c, "id", None): c for c in chunks}
-    rag_snippets: List[str] = []
+    qvec = await cached_embed_async(_embed, build_rag_query(rule_sections_txt), emb_model)
+    return format_rag_snippets(idx.search(qvec, k), chunks, per_chunk_max)
 
-    for rank, (hid, _score) in enumerate(hits, start=1):
-        c = chunk_by_id.get(hid)
-        if not c:
-            continue
-        tag = f"[C{rank}]"
-        text = _normalize_pdf_text(getattr(c, "text", ""))
-        if per_chunk_max and len(text) > per_chunk_max:
-            text = text[:per_chunk_max].rsplit(" ", 1)[0] + " ..."
-        rag_snippets.append(f"{tag} {text}")
 
-    return "\n\n".join(rag_snippets) if rag_snippets else ""
+def _explanation_request(model: str, rag_block: str, **prompt_fields) -> Dict:
+    """Chat-completion arguments shared by the sync and async explanation calls."""
+    prompt = build_explanation_prompt(include_utf8_line=True, **prompt_fields)
+    return {
+        "model": model,
+        "messages": build_system_messages(rag_block) + [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": 4000,
+    }
 
 
 def generate_explanation(
@@ -121,9 +146,12 @@ def generate_explanation(
     raw_crysl_text: str,
     explanation_language: str,
     rag_block: str = "",
+    on_delta: Optional[Callable[[str], None]] = None,
 ) -> str:
-    """Generate a full natural-language rule explanation via gateway chat completion."""
-    prompt = build_explanation_prompt(
+    """Generate a full natural-language rule explanation via gateway chat completion (streamed to on_delta when given)."""
+    request = _explanation_request(
+        model,
+        rag_block,
         class_name=class_name,
         objects=objects,
         events=events,
@@ -137,18 +165,54 @@ def generate_explanation(
         sanitized_summary=sanitized_summary,
         raw_crysl_text=raw_crysl_text,
         explanation_language=explanation_language,
-        include_utf8_line=True,
     )
 
-    sys_msgs = build_system_messages(rag_block)
-    wait_for_gateway_slot("chat.completions")
-    resp = client.chat.completions.create(
-        model=model,
-        messages=sys_msgs + [{"role": "user", "content": prompt}],
-        temperature=0.3,
-        max_tokens=4000,
-    )
-    return resp.choices[0].message.content
+    def _create(**kwargs):
+        wait_for_gateway_slot("chat.completions")
+        return client.chat.completions.create(**kwargs)
+
+    # A reply cut off by max_tokens is retried with a larger budget and never cached.
+    if on_delta is None:
+        return cached_completion(request, lambda: complete_chat_text(_create, request))
+
+    # Streamed variant: hand each text delta to on_delta as it arrives.
+    finish_reasons: List[str] = []
+
+    def _stream():
+        wait_for_gateway_slot("chat.completions")
+        for chunk in client.chat.completions.create(**request, stream=True):
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reasons.append(choice.finish_reason)
+                yield choice.delta.content or ""
+
+    # A printed reply cannot be retried, but one cut off by max_tokens is kept out of the cache.
+    return cached_streamed_completion(request, _stream, on_delta, lambda: "length" not in finish_reasons)
+
+
+async def generate_explanation_async(client: AsyncOpenAI, model: str, rag_block: str = "", **prompt_fields) -> str:
+    """Generate an explanation by awaiting a gateway chat completion (same prompt and settings)."""
+    request = _explanation_request(model, rag_block, **prompt_fields)
+
+    async def _call() -> str:
+        # The limiter blocks on a cross-process file lock, so keep it off the event loop.
+        await asyncio.to_thread(wait_for_gateway_slot, "chat.completions")
+        # Streamed and joined: the client's --timeout then bounds a stall between tokens
+        # rather than the whole generation of a long explanation.
+        parts = []
+        finish_reason = None
+        async for chunk in await client.chat.completions.create(**request, stream=True):
+            if chunk.choices:
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                parts.append(choice.delta.content or "")
+        if finish_reason == "length":
+            # Raising keeps the cut-off explanation out of the response cache.
+            raise TruncatedReplyError(f"Explanation was cut off at max_tokens={request['max_tokens']}.")
+        return "".join(parts)
+
+    return await cached_completion_async(request, _call)
 
 
 def process_rule(
@@ -161,6 +225,8 @@ def process_rule(
     chunks=None,
     k: int = 6,
     emb_model: str = "YOUR_EMBEDDING_MODEL",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
 ):
     """Run the shared single-rule pipeline with gateway-specific callbacks."""
     return process_rule_core(
@@ -175,6 +241,43 @@ def process_rule(
         chunks=chunks,
         k=k,
         emb_model=emb_model,
+        use_prebuilt=use_prebuilt,
+        include_raw=include_raw,
+    )
+
+
+async def process_rule_async(
+    crysl_path: str,
+    language: str,
+    client: AsyncOpenAI,
+    model: str,
+    target_fqcn: str,
+    idx=None,
+    chunks=None,
+    k: int = 6,
+    emb_model: str = "YOUR_EMBEDDING_MODEL",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
+    rag_block=None,
+    inputs=None,
+):
+    """Run the shared async single-rule pipeline with gateway-specific callbacks."""
+    return await process_rule_core_async(
+        crysl_path=crysl_path,
+        language=language,
+        client=client,
+        model=model,
+        target_fqcn=target_fqcn,
+        make_rag_context_fn=make_rag_context_async,
+        generate_explanation_fn=generate_explanation_async,
+        idx=idx,
+        chunks=chunks,
+        k=k,
+        emb_model=emb_model,
+        use_prebuilt=use_prebuilt,
+        include_raw=include_raw,
+        rag_block=rag_block,
+        inputs=inputs,
     )
 
 
@@ -202,6 +305,11 @@ def list_gateway_models() -> int:
 
 def main():
     """CLI entrypoint for gateway-backed explanation generation."""
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except Exception:
+        pass
+
     if "--list-models" in sys.argv[1:]:
         extra_args = [arg for arg in sys.argv[1:] if arg != "--list-models"]
         if extra_args:
@@ -229,6 +337,9 @@ def main():
         init_client_fn=get_gateway_client,
         build_pdf_index_fn=build_pdf_index,
         process_rule_fn=process_rule,
+        init_async_client_fn=get_async_gateway_client,
+        process_rule_async_fn=process_rule_async,
+        embed_texts_async_fn=_embed_texts_async,
     )
 
 
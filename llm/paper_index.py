@@ -2,11 +2,13 @@ import os
 from typing import List
 import numpy as np
 from openai import OpenAI
+from utils.llm_clients import embedding_rows, get_client
 from utils.rag_index_common import (
     DocChunk,
     EmbeddingIndex,
-    _chunk_text,
-    _extract_pdf_text,
+    embed_chunks,
+    embed_in_batches,
+    extract_pdf_chunks,
     get_cache_paths,
     load_cached_index,
     save_cached_index,
@@ -14,11 +16,13 @@ from utils.rag_index_common import (
 
 # Embed text with OpenAI embeddings and return a float32 matrix.
 def _embed_texts(client: OpenAI, texts: List[str], model="text-embedding-3-small") -> np.ndarray:
-    """Return a float32 embedding matrix for `texts` using a single batched OpenAI call."""
-    if not texts:
-        return np.empty((0, 0), dtype="float32")
-    resp = client.embeddings.create(model=model, input=texts)
-    return np.asarray([d.embedding for d in resp.data], dtype="float32")
+    """Return a float32 embedding matrix for `texts`, one OpenAI call per EMBED_BATCH_SIZE texts."""
+
+    def _batch(batch: List[str]) -> List[List[float]]:
+        resp = client.embeddings.create(model=model, input=batch)
+        return embedding_rows(resp)
+
+    return embed_in_batches(_batch, texts)
 
 # Build (or load) a cached FAISS index over the CrySL paper PDF.
 def build_pdf_index(pdf_path: str, cache_dir="rag_cache", emb_model="text-embedding-3-small"):
@@ -41,9 +45,9 @@ def build_pdf_index(pdf_path: str, cache_dir="rag_cache", emb_model="text-embedd
     cached = load_cached_index(vec_p, ids_p, chunks_p)
     if cached is not None:
         return cached
-    # Cache miss: extract text and create paragraph-overlap chunks from the PDF.
-    raw_text = _extract_pdf_text(pdf_path)
-    raw_chunks = _chunk_text(raw_text)
+    # Cache miss: extract text and create paragraph-overlap chunks from the PDF
+    # (itself cached by PDF content, so other providers/models reuse the extraction).
+    raw_chunks = extract_pdf_chunks(pdf_path, cache_dir)
     chunks = [DocChunk(id=f"C{i}", text=t) for i, t in enumerate(raw_chunks)]
     if not chunks:
         # Empty-text PDFs still produce a stable empty cache entry so repeated runs
@@ -53,10 +57,15 @@ def build_pdf_index(pdf_path: str, cache_dir="rag_cache", emb_model="text-embedd
         idx.build(empty_embeddings, [])
         save_cached_index(vec_p, ids_p, chunks_p, empty_embeddings, chunks)
         return idx, chunks
-    # Build embeddings and FAISS index, then persist artifacts for later reuse.
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    embeddings = _embed_texts(client, [c.text for c in chunks], emb_model)
+    # Build embeddings (only for chunks not embedded before) and the index, then persist artifacts.
+    embeddings = embed_chunks(
+        lambda texts: _embed_texts(get_client(os.getenv("OPENAI_API_KEY")), texts, emb_model),
+        chunks,
+        cache_dir,
+        "openai",
+        emb_model,
+    )
     idx = EmbeddingIndex()
     idx.build(embeddings, [c.id for c in chunks])
-    save_cached_index(vec_p, ids_p, chunks_p, embeddings, chunks)
+    save_cached_index(vec_p, ids_p, chunks_p, embeddings, chunks, idx)
     return idx, chunks
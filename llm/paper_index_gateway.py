@@ -5,11 +5,13 @@ import numpy as np
 from openai import OpenAI
 
 from utils.gateway_rate_limit import wait_for_gateway_slot
+from utils.llm_clients import embedding_rows, get_client
 from utils.rag_index_common import (
     DocChunk,
     EmbeddingIndex,
-    _chunk_text,
-    _extract_pdf_text,
+    embed_chunks,
+    embed_in_batches,
+    extract_pdf_chunks,
     get_cache_paths,
     load_cached_index,
     save_cached_index,
@@ -25,16 +27,18 @@ def get_gateway_client() -> OpenAI:
     if not api_key:
         raise RuntimeError("GATEWAY_API_KEY is not set.")
     base_url = os.getenv("GATEWAY_BASE_URL", DEFAULT_GATEWAY_BASE_URL)
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return get_client(api_key, base_url)
 
 
 def _embed_texts(client: OpenAI, texts: List[str], model: str) -> np.ndarray:
-    """Return a float32 embedding matrix for `texts` using one batched request."""
-    if not texts:
-        return np.empty((0, 0), dtype="float32")
-    wait_for_gateway_slot("embeddings")
-    resp = client.embeddings.create(model=model, input=texts)
-    return np.asarray([d.embedding for d in resp.data], dtype="float32")
+    """Return a float32 embedding matrix for `texts`, one throttled request per EMBED_BATCH_SIZE texts."""
+
+    def _batch(batch: List[str]) -> List[List[float]]:
+        wait_for_gateway_slot("embeddings")
+        resp = client.embeddings.create(model=model, input=batch)
+        return embedding_rows(resp)
+
+    return embed_in_batches(_batch, texts)
 
 
 def build_pdf_index(pdf_path: str, cache_dir: str = "rag_cache", emb_model: str = "YOUR_EMBEDDING_MODEL"):
@@ -54,8 +58,7 @@ def build_pdf_index(pdf_path: str, cache_dir: str = "rag_cache", emb_model: str
     if cached is not None:
         return cached
 
-    raw_text = _extract_pdf_text(pdf_path)
-    raw_chunks = _chunk_text(raw_text)
+    raw_chunks = extract_pdf_chunks(pdf_path, cache_dir)
     chunks = [DocChunk(id=f"C{i}", text=t) for i, t in enumerate(raw_chunks)]
 
     if not chunks:
@@ -65,9 +68,14 @@ def build_pdf_index(pdf_path: str, cache_dir: str = "rag_cache", emb_model: str
         save_cached_index(vec_p, ids_p, chunks_p, empty_embeddings, chunks)
         return idx, chunks
 
-    client = get_gateway_client()
-    embeddings = _embed_texts(client, [c.text for c in chunks], emb_model)
+    embeddings = embed_chunks(
+        lambda texts: _embed_texts(get_gateway_client(), texts, emb_model),
+        chunks,
+        cache_dir,
+        "gateway",
+        emb_model,
+    )
     idx = EmbeddingIndex()
     idx.build(embeddings, [c.id for c in chunks])
-    save_cached_index(vec_p, ids_p, chunks_p, embeddings, chunks)
+    save_cached_index(vec_p, ids_p, chunks_p, embeddings, chunks, idx)
     return idx, chunks
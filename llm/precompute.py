@@ -0,0 +1,72 @@
+import argparse
+import sys
+from pathlib import Path
+
+from utils.json_io import list_files
+from utils.llm_env import get_openai_emb_model, load_llm_env
+from utils.writer_core import save_prebuilt_inputs, spec_fqcn
+
+
+# Resolve project root and important folders (same layout as llm_writer.py).
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+RULES_DIR = PROJECT_ROOT / "src" / "main" / "resources" / "CrySLRules"
+PDF_PATH = PROJECT_ROOT / "tse19CrySL.pdf"
+LANGUAGES = ["English", "Portuguese", "German", "French"]
+
+
+# Build (or load) the paper index once so later writer runs find it on disk.
+def warm_pdf_index(backend: str, pdf_path: str, emb_model: str) -> None:
+    """Build or load the CrySL paper index for `backend`; failures only disable the warm-up."""
+    if not Path(pdf_path).exists():
+        print(f"[INFO] Skipping PDF index: not found at {pdf_path}", file=sys.stderr)
+        return
+    try:
+        if backend == "gateway":
+            from paper_index_gateway import build_pdf_index
+        else:
+            from paper_index import build_pdf_index
+        _, chunks = build_pdf_index(pdf_path, emb_model=emb_model)
+        print(f"[INFO] PDF index ready ({len(chunks)} chunks).", file=sys.stderr)
+    except Exception as e:
+        print(f"[WARN] PDF index build/load failed: {e}", file=sys.stderr)
+
+
+def main() -> None:
+    """
+    Precompute writer inputs for every CrySL rule and language.
+
+    Stores each rule's parsed sections, dependency text and sanitized summary under
+    rag_cache/prebuilt/ so `llm_writer*.py --use-prebuilt` skips that work per call,
+    and optionally warms the paper index used for RAG.
+    """
+    load_llm_env()
+    parser = argparse.ArgumentParser(description="Precompute per-rule prompt inputs for the explanation writers.")
+    parser.add_argument("--rules-dir", default=str(RULES_DIR), help="Directory containing .crysl rules.")
+    parser.add_argument("--languages", nargs="+", default=LANGUAGES, help="Languages to precompute.")
+    parser.add_argument("--backend", choices=["openai", "gateway"], default="openai", help="Paper index provider.")
+    parser.add_argument("--emb-model", default=get_openai_emb_model(), help="Embedding model for the paper index.")
+    parser.add_argument("--pdf", default=str(PDF_PATH), help="Path to the CrySL paper PDF.")
+    parser.add_argument("--skip-pdf", action="store_true", help="Do not build or load the paper index.")
+    args = parser.parse_args()
+
+    if not args.skip_pdf:
+        warm_pdf_index(args.backend, args.pdf, args.emb_model)
+
+    written = failed = 0
+    for crysl_path in list_files(args.rules_dir, ".crysl"):
+        fqcn = spec_fqcn(crysl_path)
+        for language in args.languages:
+            try:
+                if save_prebuilt_inputs(str(crysl_path), language, fqcn) is None:
+                    failed += 1
+                else:
+                    written += 1
+            except Exception as e:
+                print(f"[WARN] {crysl_path.name} / {language}: {e}", file=sys.stderr)
+                failed += 1
+
+    print(f"[INFO] Precomputed {written} rule inputs ({failed} failed).", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+
+# The llm scripts import their helpers as top-level modules (`from utils...`).
+LLM_DIR = Path(__file__).resolve().parents[1]
+if str(LLM_DIR) not in sys.path:
+    sys.path.insert(0, str(LLM_DIR))
+
+import pytest  # noqa: E402
+
+from utils import embedding_cache, json_file_cache, llm_utils, response_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_caches(tmp_path, monkeypatch):
+    """Keep the on-disk LLM/JSON caches inside the test's tmp dir."""
+    monkeypatch.setattr(response_cache, "RESPONSES_DIR", tmp_path / "responses")
+    monkeypatch.setattr(embedding_cache, "EMBEDDINGS_DIR", tmp_path / "embeddings")
+    monkeypatch.setattr(embedding_cache, "_memory", {})
+    monkeypatch.setattr(json_file_cache, "CACHE_FILE", tmp_path / "sanitized_cache.pkl")
+    monkeypatch.setattr(json_file_cache, "_entries", None)
+    monkeypatch.setattr(json_file_cache, "_dirty", False)
+    llm_utils.load_json.cache_clear()
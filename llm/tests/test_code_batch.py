@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+from utils.code_batch import example_output_path, load_rule_payloads, split_batch_output
+
+
+def test_split_batch_output_maps_markers_to_rules() -> None:
+    reply = (
+        "### OUTPUT 1\n```java\nclass A {}\n```\n\n"
+        "### OUTPUT 3\n```java\nclass C {}\n```\n"
+    )
+
+    outputs = split_batch_output(reply, 3)
+
+    assert outputs[0] == "```java\nclass A {}\n```"
+    assert outputs[1] is None
+    assert outputs[2] == "```java\nclass C {}\n```"
+
+
+def test_split_batch_output_ignores_out_of_range_and_duplicate_markers() -> None:
+    reply = "### OUTPUT 1\nfirst\n### OUTPUT 1\nsecond\n### OUTPUT 9\nextra\n"
+
+    assert split_batch_output(reply, 2) == ["first", None]
+
+
+def test_load_rule_payloads_accepts_directory_and_list(tmp_path: Path) -> None:
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    (rules_dir / "b.json").write_text(json.dumps({"className": "b.B"}), encoding="utf-8")
+    (rules_dir / "a.json").write_text(json.dumps({"className": "a.A"}), encoding="utf-8")
+    list_file = tmp_path / "rules.json"
+    list_file.write_text(json.dumps([{"className": "x.X"}, {"objects": "no class"}]), encoding="utf-8")
+
+    assert [r["className"] for r in load_rule_payloads(rules_dir)] == ["a.A", "b.B"]
+    assert [r["className"] for r in load_rule_payloads(list_file)] == ["x.X"]
+
+
+def test_example_output_path_matches_java_code_cache_naming(tmp_path: Path) -> None:
+    path = example_output_path(tmp_path, "javax.crypto.Cipher$Inner", "secure")
+
+    assert path == tmp_path / "javax.crypto.Cipher_Inner_secure.txt"
+
+
+def test_run_batch_overlaps_groups_and_writes_every_rule(tmp_path: Path, monkeypatch) -> None:
+    import threading
+
+    import llm_code_writer_insecure as writer
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_complete(client, backend, model, prompt, max_tokens=None):
+        barrier.wait()  # both groups must be in flight at once
+        count = prompt.count("### RULE")
+        return "\n".join(f"### OUTPUT {i}\nclass X{i} {{}}" for i in range(1, count + 1))
+
+    monkeypatch.setattr(writer, "_complete", fake_complete)
+    fields = ("objects", "events", "order", "constraints", "requires", "ensures", "forbidden")
+    rules = [dict(dict.fromkeys(fields, "-"), className=f"p.R{i}") for i in range(4)]
+
+    failures = writer.run_batch(None, "openai", "m", rules, tmp_path, batch_size=2, workers=2)
+
+    assert failures == 0
+    for rule in rules:
+        assert example_output_path(tmp_path, rule["className"], "insecure").exists()
+
+
+def test_run_batch_retries_a_failed_group_rule_by_rule(tmp_path: Path, monkeypatch) -> None:
+    import llm_code_writer_insecure as writer
+
+    def fake_complete(client, backend, model, prompt, max_tokens=None):
+        if "### RULE" in prompt:
+            raise RuntimeError("429 Too Many Requests")
+        if "p.R1" in prompt:
+            raise TimeoutError("read timed out")
+        return "class X {}"
+
+    monkeypatch.setattr(writer, "_complete", fake_complete)
+    fields = ("objects", "events", "order", "constraints", "requires", "ensures", "forbidden")
+    rules = [dict(dict.fromkeys(fields, "-"), className=f"p.R{i}") for i in range(3)]
+
+    failures = writer.run_batch(None, "openai", "m", rules, tmp_path, batch_size=2)
+
+    assert failures == 1
+    assert example_output_path(tmp_path, "p.R0", "insecure").exists()
+    assert not example_output_path(tmp_path, "p.R1", "insecure").exists()
+    assert example_output_path(tmp_path, "p.R2", "insecure").exists()
+
+
+def test_run_groups_counts_a_crashed_group_and_finishes_the_rest() -> None:
+    from utils.code_batch import run_groups
+
+    def run_group(group):
+        if "bad" in group:
+            raise OSError("disk full")
+        return 0
+
+    assert run_groups([["a", "b"], ["bad", "c"], ["d"]], run_group, workers=2) == 2
@@ -0,0 +1,56 @@
+from llm_code_writer_secure import _normalize_listish, auto_import_patch, clean_item, crysl_to_json_lines
+
+
+def test_crysl_to_json_lines_keeps_header_line_content():
+    text = (
+        "SPEC java.security.SecureRandom\n"
+        "OBJECTS\n"
+        "    byte[] seed;\n"
+        "\n"
+        "EVENTS:\n"
+        "    c1: SecureRandom();\n"
+        "ORDERING_NOTE not a header\n"
+        "ORDER\n"
+        "    c1\n"
+    )
+    assert crysl_to_json_lines(text) == {
+        "SPEC": ["java.security.SecureRandom"],
+        "OBJECTS": ["byte[] seed;"],
+        "EVENTS": ["c1: SecureRandom();", "ORDERING_NOTE not a header"],
+        "ORDER": ["c1"],
+    }
+
+
+def test_clean_item_trims_only_when_needed():
+    item = "alg in {AES}"
+    assert clean_item(item) is item
+    ensured = "generatedKey[key];"
+    assert clean_item(ensured) is ensured
+    assert clean_item(",x") == "x"
+    assert clean_item("  ,alg in {AES}; ") == "alg in {AES};"
+    assert clean_item(", x") == "x"
+    assert clean_item(3) == "3"
+
+
+def test_normalize_listish_drops_entries_that_clean_to_nothing():
+    assert _normalize_listish(["  a ", ",", " , ", "", ", b", 3]) == ["a", "b", "3"]
+
+
+def test_auto_import_patch_adds_only_unqualified_whitelisted_symbols():
+    java = (
+        "import javax.crypto.Cipher;\n"
+        "public class SecureUsageExample {\n"
+        "    byte[] b = \"x\".getBytes(StandardCharsets.UTF_8);\n"
+        "    String s = Base64 .getEncoder().encodeToString(b);\n"
+        "    void f() { java.util.Arrays.fill(b, (byte) 0); }\n"
+        "}\n"
+    )
+
+    imports = [line for line in auto_import_patch(java).splitlines() if line.startswith("import ")]
+
+    assert imports == [
+        "import java.nio.charset.StandardCharsets;",
+        "import java.util.Base64;",
+        "import javax.crypto.Cipher;",
+    ]
+
@@ -0,0 +1,51 @@
+import json
+
+from utils.llm_utils import collect_dependency_ensures, collect_dependency_info, load_json, prefetch_json, rule_path
+
+
+def _write(tmp_path, fqcn, dependency, ensures):
+    payload = {"dependency": dependency, "ensures": ensures}
+    (tmp_path / f"sanitized_rule_{fqcn}_English.json").write_text(json.dumps(payload), encoding="utf-8")
+
+
+def test_collect_dependency_ensures_is_breadth_first_and_cycle_safe(tmp_path):
+    _write(tmp_path, "p.Main", ["p.A", "p.B"], [])
+    _write(tmp_path, "p.A", ["p.C", "p.Main"], ["a ok"])
+    _write(tmp_path, "p.B", ["p.A"], "b ok")
+    _write(tmp_path, "p.C", ["p.D"], ["c ok"])
+
+    order, ensures = collect_dependency_ensures("p.Main", "English", depth=2, sanitized_dir=tmp_path)
+
+    assert order == ["p.A", "p.B", "p.C"]
+    assert ensures == {"p.A": ["a ok"], "p.B": ["b ok"], "p.C": ["c ok"]}
+
+    order, _ = collect_dependency_ensures("p.Main", "English", depth=1, sanitized_dir=tmp_path)
+    assert order == ["p.A", "p.B"]
+
+
+def test_collect_dependency_info_loads_each_rule_once_for_both_fields(tmp_path):
+    _write(tmp_path, "p.Main", ["p.A", "p.B", "p.A"], [])
+    _write(tmp_path, "p.A", [], ["a ok"])
+    payload = {"dependency": [], "constraint": " , k in {128}", "ensures": []}
+    (tmp_path / "sanitized_rule_p.B_English.json").write_text(json.dumps(payload), encoding="utf-8")
+    load_json.cache_clear()
+
+    order, constraints, ensures = collect_dependency_info("p.Main", "English", sanitized_dir=tmp_path)
+
+    assert order == ["p.A", "p.B"]
+    assert constraints == {"p.A": [], "p.B": ["k in {128}"]}
+    assert ensures == {"p.A": ["a ok"], "p.B": []}
+    assert load_json.cache_info().misses == 3
+
+
+def test_prefetch_json_fills_the_load_json_cache(tmp_path):
+    _write(tmp_path, "p.A", [], ["a ok"])
+    _write(tmp_path, "p.B", [], ["b ok"])
+    paths = [rule_path(fqcn, "English", sanitized_dir=tmp_path) for fqcn in ("p.A", "p.B", "p.A")]
+
+    prefetch_json(paths)
+    hits = load_json.cache_info().hits
+
+    assert load_json(paths[0])["ensures"] == ["a ok"]
+    assert load_json(paths[1])["ensures"] == ["b ok"]
+    assert load_json.cache_info().hits == hits + 2
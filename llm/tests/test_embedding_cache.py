@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+
+from utils import embedding_cache
+
+
+def test_cached_embed_normalizes_and_reuses_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDINGS_DIR", tmp_path)
+    seen = []
+
+    def embed(text):
+        seen.append(text)
+        return np.array([1.0, 2.0])
+
+    first = embedding_cache.cached_embed(embed, "  SPEC:  a.B\n\nORDER: c ", "emb")
+    second = embedding_cache.cached_embed(embed, "SPEC: a.B ORDER: c", "emb")
+
+    assert seen == ["SPEC: a.B ORDER: c"]
+    assert first.dtype == np.float32
+    np.testing.assert_array_equal(first, second)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+
+def test_cached_embed_many_sends_only_distinct_misses_in_one_call(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDINGS_DIR", tmp_path)
+    embedding_cache.cached_embed(lambda text: np.array([0.0, 1.0]), "cached", "emb")
+    calls = []
+
+    async def embed_many(texts):
+        calls.append(list(texts))
+        return np.array([[float(i), 0.0] for i in range(len(texts))])
+
+    vectors = asyncio.run(embedding_cache.cached_embed_many_async(embed_many, ["a", "cached", " a ", "b"], "emb"))
+
+    assert calls == [["a", "b"]]
+    assert [v.tolist() for v in vectors] == [[0.0, 0.0], [0.0, 1.0], [0.0, 0.0], [1.0, 0.0]]
+    assert embedding_cache.cached_embed(lambda text: 1 / 0, "b", "emb").tolist() == [1.0, 0.0]
+
+
+def test_cached_vectors_are_written_atomically_and_kept_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDINGS_DIR", tmp_path)
+    embedding_cache.cached_embed(lambda text: np.array([3.0, 4.0]), "query", "emb")
+
+    assert [p.suffix for p in tmp_path.iterdir()] == [".npy"]
+    for path in tmp_path.iterdir():
+        path.unlink()
+    assert embedding_cache.cached_embed(lambda text: 1 / 0, "query", "emb").tolist() == [3.0, 4.0]
+
+
+def test_cached_embed_texts_embeds_only_new_texts_verbatim(tmp_path):
+    calls = []
+
+    def embed_texts(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0] for t in texts])
+
+    first = embedding_cache.cached_embed_texts(embed_texts, ["a  b", "c"], "emb", tmp_path)
+    second = embedding_cache.cached_embed_texts(embed_texts, ["c", "a  b", "dd", "c"], "emb", tmp_path)
+
+    assert calls == [["a  b", "c"], ["dd"]]
+    assert first.tolist() == [[4.0, 1.0], [1.0, 1.0]]
+    assert second[:, 0].tolist() == [1.0, 4.0, 2.0, 1.0]
+    assert embedding_cache._memory == {}
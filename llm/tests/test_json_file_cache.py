@@ -0,0 +1,75 @@
+import json
+import os
+
+from utils import json_file_cache
+
+
+def test_mtime_cached_reuses_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_file_cache, "CACHE_FILE", tmp_path / "cache.pkl")
+    monkeypatch.setattr(json_file_cache, "_entries", None)
+    reads = []
+
+    @json_file_cache.mtime_cached
+    def load(path):
+        reads.append(path)
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    target = tmp_path / "rule.json"
+    target.write_text('{"ensures": ["a"]}', encoding="utf-8")
+    first = load(target)
+    first["ensures"].append("mutated")
+    assert load(target) == {"ensures": ["a"]}
+    assert len(reads) == 1
+
+    target.write_text('{"ensures": ["b"]}', encoding="utf-8")
+    stat = target.stat()
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load(target) == {"ensures": ["b"]}
+    assert len(reads) == 2
+
+    json_file_cache.flush()
+    monkeypatch.setattr(json_file_cache, "_entries", None)
+    assert load(target) == {"ensures": ["b"]}
+    assert len(reads) == 2
+
+
+def test_mtime_memoized_rereads_edited_and_caches_missing(tmp_path):
+    reads = []
+
+    @json_file_cache.mtime_memoized(maxsize=8)
+    def load(path):
+        reads.append(path)
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    target = tmp_path / "rule.json"
+    assert load(target) is None and load(target) is None
+    target.write_text("a", encoding="utf-8")
+    assert load(target) == "a" and load(target) == "a"
+    stat = target.stat()
+    target.write_text("b", encoding="utf-8")
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load(target) == "b"
+    assert len(reads) == 3
+
+    load.cache_clear()
+    load(target)
+    assert len(reads) == 4
+
+
+def test_stacked_caches_stat_each_lookup_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_file_cache, "CACHE_FILE", tmp_path / "cache.pkl")
+    monkeypatch.setattr(json_file_cache, "_entries", None)
+    stats = []
+    real_stat = os.stat
+    monkeypatch.setattr(json_file_cache.os, "stat", lambda path: stats.append(path) or real_stat(path))
+
+    @json_file_cache.mtime_memoized()
+    @json_file_cache.mtime_cached
+    def load(path):
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    target = tmp_path / "rule.json"
+    target.write_text('{"ensures": ["a"]}', encoding="utf-8")
+    assert load(target) == {"ensures": ["a"]}
+    assert load(target) == {"ensures": ["a"]}
+    assert len(stats) == 2
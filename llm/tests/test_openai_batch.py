@@ -0,0 +1,29 @@
+import json
+
+from utils.openai_batch import batch_request_line, parse_batch_output
+
+
+def _line(custom_id, content=None, status=200, error=None, finish_reason="stop"):
+    choice = {"message": {"content": content}, "finish_reason": finish_reason}
+    body = {"choices": [choice]} if content is not None else {}
+    return json.dumps({
+        "custom_id": custom_id,
+        "response": {"status_code": status, "body": body},
+        "error": error,
+    })
+
+
+def test_batch_request_line_targets_chat_completions():
+    line = batch_request_line("a.B", {"model": "m"})
+    assert line == {"custom_id": "a.B", "method": "POST", "url": "/v1/chat/completions", "body": {"model": "m"}}
+
+
+def test_parse_batch_output_skips_failed_requests():
+    text = "\n".join([
+        _line("a.B", "class B {}"),
+        _line("c.D", status=500),
+        _line("e.F", error={"message": "boom"}),
+        _line("g.H", "class H {", finish_reason="length"),
+        "",
+    ])
+    assert parse_batch_output(text) == {"a.B": "class B {}"}
@@ -0,0 +1,28 @@
+import os
+
+from utils import writer_core
+
+
+def test_prebuilt_inputs_are_reused_until_the_rule_changes(tmp_path, monkeypatch):
+    crysl = tmp_path / "Cipher.crysl"
+    crysl.write_text("SPEC javax.crypto.Cipher\n", encoding="utf-8")
+    calls = []
+
+    def fake_load(crysl_path, language, target_fqcn):
+        calls.append(target_fqcn)
+        return {"class_name": target_fqcn, "language": language, "raw_crysl_text": "SPEC javax.crypto.Cipher"}
+
+    monkeypatch.setattr(writer_core, "PREBUILT_DIR", tmp_path / "prebuilt")
+    monkeypatch.setattr(writer_core, "load_rule_inputs", fake_load)
+
+    assert writer_core.save_prebuilt_inputs(str(crysl), "German", "javax.crypto.Cipher").is_file()
+    inputs = writer_core.load_prebuilt_inputs(str(crysl), "German", "javax.crypto.Cipher")
+    assert inputs["class_name"] == "javax.crypto.Cipher"
+    assert writer_core._resolve_rule_inputs(str(crysl), "German", "javax.crypto.Cipher", True, include_raw=True) == inputs
+    # Without include_raw the prompt gets no raw CrySL text.
+    assert writer_core._resolve_rule_inputs(str(crysl), "German", "javax.crypto.Cipher", True)["raw_crysl_text"] == ""
+    assert len(calls) == 1
+
+    stat = crysl.stat()
+    os.utime(crysl, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert writer_core.load_prebuilt_inputs(str(crysl), "German", "javax.crypto.Cipher") is None
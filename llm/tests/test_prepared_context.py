@@ -0,0 +1,51 @@
+import llm_code_writer_secure as secure
+
+
+def test_rule_context_is_reused_until_crysl_or_payload_fallback_changes(tmp_path, monkeypatch):
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    crysl = rules_dir / "Cipher.crysl"
+    crysl.write_text("SPEC javax.crypto.Cipher\nORDER\n    c1\n", encoding="utf-8")
+    monkeypatch.setattr(secure, "CONTEXT_DIR", tmp_path / "ctx")
+    calls = []
+
+    def fake_dependency_info(class_name, langs, depth=1, primary=None):
+        calls.append(class_name)
+        return [], {}, {}
+
+    monkeypatch.setattr(secure, "collect_dependency_info", fake_dependency_info)
+
+    first = secure.prepare_context("javax.crypto.Cipher", "English", rules_dir)
+    payload = {"className": "javax.crypto.Cipher"}
+    assert secure.build_rule_context(payload, "English", rules_dir) == first
+    assert len(calls) == 1
+
+    # A payload supplying a different fallback for a section missing from the rule file.
+    secure.build_rule_context(dict(payload, forbidden="f()"), "English", rules_dir)
+    assert len(calls) == 2
+
+
+def test_rule_context_is_rebuilt_when_a_dependency_rule_appears(tmp_path, monkeypatch):
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    (rules_dir / "Cipher.crysl").write_text("SPEC javax.crypto.Cipher\nORDER\n    c1\n", encoding="utf-8")
+    sanitized = tmp_path / "sanitized"
+    sanitized.mkdir()
+    monkeypatch.setattr(secure, "CONTEXT_DIR", tmp_path / "ctx")
+    monkeypatch.setattr(secure, "SANITIZED_DIR", sanitized)
+    secure.rule_path.cache_clear()
+    (sanitized / "sanitized_rule_javax.crypto.Cipher_English.json").write_text(
+        '{"dependency": ["javax.crypto.spec.IvParameterSpec"]}', encoding="utf-8"
+    )
+    try:
+        first = secure.prepare_context("javax.crypto.Cipher", "English", rules_dir)
+        assert first["dep_ensures_text"] == "(none)"
+
+        # Java sanitizes the dependency later; the prepared context must pick it up.
+        (sanitized / "sanitized_rule_javax.crypto.spec.IvParameterSpec_English.json").write_text(
+            '{"ensures": ["generatedIV[this]"]}', encoding="utf-8"
+        )
+        second = secure.prepare_context("javax.crypto.Cipher", "English", rules_dir)
+        assert "generatedIV[this]" in second["dep_ensures_text"]
+    finally:
+        secure.rule_path.cache_clear()
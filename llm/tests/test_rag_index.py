@@ -0,0 +1,118 @@
+import faiss
+import numpy as np
+
+from utils import rag_index_common
+from utils.rag_index_common import (
+    DocChunk,
+    EmbeddingIndex,
+    FlatIPIndex,
+    embed_in_batches,
+    extract_pdf_chunks,
+    load_cached_index,
+    save_cached_index,
+)
+
+
+def test_search_many_matches_per_query_search_without_mutating_queries():
+    index = EmbeddingIndex()
+    index.build(np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], dtype="float32"), ["x", "y", "xy"])
+    queries = np.array([[2.0, 0.1], [0.1, 3.0]], dtype="float32")
+    before = queries.copy()
+
+    batched = index.search_many(queries, 2)
+
+    assert [[cid for cid, _ in hits] for hits in batched] == [["x", "xy"], ["y", "xy"]]
+    assert np.isclose(batched[0][0][1], 2.0 / np.hypot(2.0, 0.1))  # cosine, not the raw inner product
+    assert batched == [index.search(q, 2) for q in queries]
+    np.testing.assert_array_equal(queries, before)
+
+
+def test_embed_in_batches_fills_rows_in_order():
+    calls = []
+
+    def embed_batch(batch):
+        calls.append(list(batch))
+        return [[float(len(text)), 1.0] for text in batch]
+
+    vectors = embed_in_batches(embed_batch, ["a", "bb", "ccc", "dddd", "eeeee"], batch_size=2)
+
+    assert calls == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+    assert vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert embed_in_batches(embed_batch, []).shape == (0, 0)
+
+
+def test_large_indexes_use_a_persisted_hnsw_graph(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_index_common, "HNSW_MIN_VECTORS", 50)
+    vectors = np.random.default_rng(0).standard_normal((60, 8)).astype("float32")
+    chunks = [DocChunk(id=f"C{i}", text=f"chunk {i}") for i in range(60)]
+    paths = (tmp_path / "vectors.npy", tmp_path / "ids.json", tmp_path / "chunks.json")
+
+    index = EmbeddingIndex()
+    index.build(vectors, [c.id for c in chunks])
+    save_cached_index(*paths, vectors, chunks, index)
+    loaded, _ = load_cached_index(*paths)
+
+    assert isinstance(loaded.index, faiss.IndexHNSWSQ)
+    assert index.vectors is None and loaded.vectors is None
+    assert (tmp_path / rag_index_common.HNSW_INDEX_FILE).is_file()
+    assert loaded.search(vectors[7], 1)[0][0] == "C7"
+
+
+def test_pdf_chunks_are_cached_by_content(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(rag_index_common, "_extract_pdf_text", lambda p: calls.append(p) or "para one\n\npara two")
+    pdf = tmp_path / "paper.pdf"
+    pdf.write_bytes(b"%PDF-1 fake")
+
+    first = extract_pdf_chunks(str(pdf), str(tmp_path / "cache"))
+    second = extract_pdf_chunks(str(pdf), str(tmp_path / "cache"))
+    pdf.write_bytes(b"%PDF-1 edited")
+    extract_pdf_chunks(str(pdf), str(tmp_path / "cache"))
+
+    assert first == second and first
+    assert len(calls) == 2
+
+
+def test_format_rag_snippets_resolves_ids_and_sees_new_chunks():
+    from utils.writer_core import format_rag_snippets
+
+    chunks = [DocChunk(id="C1", text="first"), DocChunk(id="C2", text="second")]
+    assert format_rag_snippets([("C2", 0.9), ("C9", 0.5)], chunks) == "[C1] second"
+
+    chunks.append(DocChunk(id="C3", text="third"))
+    assert format_rag_snippets([("C3", 0.9), ("C1", 0.5)], chunks) == "[C1] third\n\n[C2] first"
+
+
+def test_numpy_flat_index_matches_faiss_flat_ip():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((40, 16)).astype("float32")
+    queries = rng.standard_normal((3, 16)).astype("float32")
+    reference = faiss.IndexFlatIP(16)
+    reference.add(vectors)
+
+    for k in (5, 43):
+        D, I = FlatIPIndex(vectors).search(queries, k)
+        ref_D, ref_I = reference.search(queries, k)
+        assert (I == ref_I).all()
+        np.testing.assert_allclose(D[:, :40], ref_D[:, :40], atol=1e-5)
+
+
+def test_chunk_text_packs_paragraphs_without_overlap_or_loss():
+    paragraphs = [f"paragraph {i} " + "x" * 40 for i in range(30)]
+    chunks = rag_index_common._chunk_text("\n\n".join(paragraphs), max_chars=200)
+
+    assert all(len(c) <= 200 for c in chunks)
+    assert "\n".join(chunks) == "\n".join(paragraphs)
+
+
+def test_embedding_rows_follow_the_input_index():
+    from types import SimpleNamespace
+
+    from utils.llm_clients import embedding_rows
+
+    response = SimpleNamespace(
+        data=[SimpleNamespace(index=1, embedding=[0.0, 1.0]), SimpleNamespace(index=0, embedding=[1.0, 0.0])]
+    )
+
+    assert embedding_rows(response) == [[1.0, 0.0], [0.0, 1.0]]
@@ -0,0 +1,164 @@
+import json
+
+from utils import response_cache
+
+
+def test_put_then_get_round_trips_and_writes_meta(tmp_path):
+    key = response_cache.request_key({"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+    response_cache.put(key, "hello", model="m", root=tmp_path)
+
+    assert response_cache.get(key, root=tmp_path) == "hello"
+    meta = json.loads((tmp_path / key[:2] / f"{key}.meta.json").read_text(encoding="utf-8"))
+    assert meta["model"] == "m"
+    assert meta["prompt_version"] == response_cache.PROMPT_VERSION
+
+
+def test_expired_entries_are_misses(tmp_path):
+    response_cache.put("ab" * 32, "old", ttl=-1, root=tmp_path)
+    assert response_cache.get("ab" * 32, root=tmp_path) is None
+
+
+def test_key_depends_on_every_request_field():
+    base = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.0}
+    assert response_cache.request_key(base) == response_cache.request_key(dict(base))
+    assert response_cache.request_key(base) != response_cache.request_key({**base, "model": "other"})
+    assert response_cache.request_key(base) != response_cache.request_key({**base, "temperature": 0.3})
+
+
+def test_cached_completion_calls_api_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "RESPONSES_DIR", tmp_path)
+    calls = []
+
+    def call():
+        calls.append(1)
+        return "reply"
+
+    request = {"model": "m", "messages": []}
+    assert response_cache.cached_completion(request, call) == "reply"
+    assert response_cache.cached_completion(request, call) == "reply"
+    assert len(calls) == 1
+
+
+def test_cached_streamed_completion_writes_deltas_then_serves_cache():
+    request = {"model": "m", "messages": [{"role": "user", "content": "stream me"}]}
+    written = []
+
+    text = response_cache.cached_streamed_completion(request, lambda: iter(["pub", "", "lic"]), written.append)
+    again = response_cache.cached_streamed_completion(request, lambda: iter(["other"]), written.append)
+
+    assert text == again == "public"
+    assert written == ["pub", "lic", "public"]
+
+
+def test_put_replaces_entries_without_leaving_temp_files(tmp_path):
+    response_cache.put("cd" * 32, "first", root=tmp_path)
+    response_cache.put("cd" * 32, "second", root=tmp_path)
+
+    assert response_cache.get("cd" * 32, root=tmp_path) == "second"
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_cached_batch_completions_submits_only_misses():
+    requests = {
+        "a.B": {"model": "m", "messages": [{"role": "user", "content": "b"}]},
+        "c.D": {"model": "m", "messages": [{"role": "user", "content": "d"}]},
+    }
+    submitted = []
+
+    def call_batch(pending):
+        submitted.append([custom_id for custom_id, _ in pending])
+        return {custom_id: f"reply {custom_id}" for custom_id, _ in pending if custom_id != "c.D"}
+
+    first = response_cache.cached_batch_completions(requests, call_batch)
+    second = response_cache.cached_batch_completions(requests, call_batch)
+
+    assert first == second == {"a.B": "reply a.B"}
+    assert submitted == [["a.B", "c.D"], ["c.D"]]
+
+
+def test_truncated_replies_are_retried_with_a_larger_budget_and_never_cached(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    import pytest
+
+    from utils.llm_clients import TruncatedReplyError, complete_chat_text
+
+    monkeypatch.setattr(response_cache, "RESPONSES_DIR", tmp_path)
+    budgets = []
+
+    def create(limit):
+        def _create(**request):
+            budgets.append(request["max_tokens"])
+            reason = "length" if request["max_tokens"] < limit else "stop"
+            message = SimpleNamespace(content=f"class A {{}} // {request['max_tokens']}")
+            return SimpleNamespace(choices=[SimpleNamespace(finish_reason=reason, message=message)])
+        return _create
+
+    request = {"model": "m", "messages": [], "max_tokens": 900}
+    with pytest.raises(TruncatedReplyError):
+        response_cache.cached_completion(request, lambda: complete_chat_text(create(10_000), request))
+    assert budgets == [900, 1800]
+
+    # Nothing was cached, so the next run asks again; the larger-budget retry completes.
+    text = response_cache.cached_completion(request, lambda: complete_chat_text(create(1800), request))
+    assert text == "class A {} // 1800"
+    assert budgets == [900, 1800, 900, 1800]
+
+
+def test_explanations_cut_off_by_max_tokens_are_not_cached(tmp_path, monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    import pytest
+
+    import llm_writer
+    from utils.llm_clients import TruncatedReplyError
+
+    monkeypatch.setattr(response_cache, "RESPONSES_DIR", tmp_path)
+    calls = []
+
+    def chunks(reason):
+        return [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="## Overview"), finish_reason=None)]),
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=" cut"), finish_reason=reason)]),
+        ]
+
+    class _AsyncStream:
+        def __init__(self, items):
+            self._items = iter(items)
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self._items)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    async def acreate(**request):
+        calls.append("async")
+        return _AsyncStream(chunks("length"))
+
+    def create(**request):
+        calls.append("sync")
+        return iter(chunks("length"))
+
+    fields = dict.fromkeys(
+        ("class_name", "objects", "events", "order", "constraints", "requires", "ensures", "forbidden",
+         "dep_constraints_text", "dep_ensures_text", "sanitized_summary", "raw_crysl_text"),
+        "-",
+    )
+    sync_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate)))
+
+    for _ in range(2):
+        text = llm_writer.generate_explanation(
+            sync_client, "m", explanation_language="English", on_delta=lambda delta: None, **fields
+        )
+        assert text == "## Overview cut"
+        with pytest.raises(TruncatedReplyError):
+            asyncio.run(llm_writer.generate_explanation_async(async_client, "m", explanation_language="German", **fields))
+
+    # Neither truncated reply was cached, so both reruns asked the API again.
+    assert calls == ["sync", "async", "sync", "async"]
@@ -0,0 +1,205 @@
+import asyncio
+
+from openai import RateLimitError
+
+from utils import writer_core
+from utils.writer_core import run_many
+
+
+def _rate_limit_error():
+    # Skip APIStatusError.__init__, which needs a real HTTP response object.
+    return RateLimitError.__new__(RateLimitError)
+
+
+def test_run_many_retries_rate_limits_and_writes_cache_files(tmp_path, monkeypatch):
+    async def no_sleep(_delay):
+        return None
+
+    monkeypatch.setattr(writer_core.asyncio, "sleep", no_sleep)
+    calls = {}
+
+    async def fake_process(crysl_path, language, client, model, fqcn, **kwargs):
+        calls[fqcn] = calls.get(fqcn, 0) + 1
+        if fqcn == "a.Flaky" and calls[fqcn] == 1:
+            raise _rate_limit_error()
+        if fqcn == "a.Broken":
+            raise ValueError("bad rule")
+        return f"explained {fqcn}"
+
+    rules = [("Flaky.crysl", "a.Flaky"), ("Fine.crysl", "a.Fine"), ("Broken.crysl", "a.Broken")]
+    failures = asyncio.run(run_many(rules, "English", None, "m", fake_process, tmp_path, concurrency=2))
+
+    assert failures == 1
+    assert calls == {"a.Flaky": 2, "a.Fine": 1, "a.Broken": 1}
+    assert (tmp_path / "a.Flaky_English.txt").read_text(encoding="utf-8") == "explained a.Flaky"
+    assert (tmp_path / "a.Fine_English.txt").exists()
+    assert not (tmp_path / "a.Broken_English.txt").exists()
+
+
+def test_retry_delay_prefers_retry_after_and_jitters_otherwise():
+    class _Response:
+        headers = {"retry-after": "3"}
+
+    error = _rate_limit_error()
+    assert 2 <= writer_core.retry_delay(error, 1) < 3
+
+    error.response = _Response()
+    assert writer_core.retry_delay(error, 1) == 3.0
+
+
+def test_run_many_batch_submits_one_job_and_writes_cache_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        writer_core, "_resolve_rule_inputs",
+        lambda crysl_path, language, fqcn, use_prebuilt, include_raw: None if fqcn == "a.Missing" else {"class_name": fqcn},
+    )
+    jobs = []
+
+    def fake_run_chat_batch(client, requests, poll_seconds):
+        jobs.append([custom_id for custom_id, _ in requests])
+        return {custom_id: f"explained {body['fqcn']} with [{body['rag']}]" for custom_id, body in requests}
+
+    monkeypatch.setattr(writer_core, "run_chat_batch", fake_run_chat_batch)
+
+    def request_fn(model, rag_block, explanation_language, class_name):
+        return {"model": model, "fqcn": class_name, "rag": rag_block, "language": explanation_language}
+
+    rules = [("A.crysl", "a.A"), ("B.crysl", "a.B"), ("Missing.crysl", "a.Missing")]
+    failures = writer_core.run_many_batch(
+        rules, "English", None, "m", request_fn, tmp_path, rag_blocks={"a.A": "ctx"}
+    )
+
+    assert failures == 1
+    assert jobs == [["a.A", "a.B"]]
+    assert (tmp_path / "a.A_English.txt").read_text(encoding="utf-8") == "explained a.A with [ctx]"
+    assert (tmp_path / "a.B_English.txt").read_text(encoding="utf-8") == "explained a.B with []"
+
+
+def test_run_many_reuses_the_inputs_loaded_for_rag(tmp_path, monkeypatch):
+    loads = []
+
+    def fake_resolve(crysl_path, language, fqcn, use_prebuilt, include_raw):
+        loads.append(fqcn)
+        return {key: fqcn for key in ("class_name", "objects", "events", "order", "constraints", "requires", "ensures")}
+
+    monkeypatch.setattr(writer_core, "_resolve_rule_inputs", fake_resolve)
+
+    class _Index:
+        index = object()
+
+        def search_many(self, vectors, k):
+            return [[] for _ in vectors]
+
+    async def embed(client, texts, model):
+        return [[1.0, 0.0] for _ in texts]
+
+    seen = {}
+
+    async def fake_process(crysl_path, language, client, model, fqcn, inputs=None, **kwargs):
+        seen[fqcn] = inputs
+        return f"explained {fqcn}"
+
+    rules = [("A.crysl", "a.A"), ("B.crysl", "a.B")]
+    failures = asyncio.run(
+        run_many(rules, "English", None, "m", fake_process, tmp_path, idx=_Index(), chunks=[], embed_texts_async_fn=embed)
+    )
+
+    assert failures == 0
+    assert sorted(loads) == ["a.A", "a.B"]
+    assert seen["a.A"]["class_name"] == "a.A" and seen["a.B"]["class_name"] == "a.B"
+
+
+def test_prepare_rag_blocks_skips_retrieval_for_empty_rules(monkeypatch, capsys):
+    def fake_resolve(crysl_path, language, fqcn, use_prebuilt, include_raw):
+        body = "_no entries_" if fqcn == "a.Empty" else "javax.crypto.Cipher c; c.init(Cipher.ENCRYPT_MODE, key);"
+        return {"class_name": fqcn, **dict.fromkeys(("objects", "events", "order", "constraints", "requires", "ensures"), body)}
+
+    monkeypatch.setattr(writer_core, "_resolve_rule_inputs", fake_resolve)
+    embedded = []
+
+    class _Index:
+        index = object()
+
+        def search_many(self, vectors, k):
+            return [[] for _ in vectors]
+
+    async def embed(client, texts, model):
+        embedded.extend(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+    rules = [("Empty.crysl", "a.Empty"), ("Cipher.crysl", "a.Cipher")]
+    blocks = asyncio.run(
+        writer_core.prepare_rag_blocks(rules, "English", None, embed, _Index(), [], k=6, emb_model="m")
+    )
+
+    assert blocks == {"a.Cipher": "", "a.Empty": ""}
+    assert len(embedded) == 1 and "a.Cipher" in embedded[0]
+    assert capsys.readouterr().err == ""  # Java publishes stderr with the explanation
+
+
+def test_process_rule_core_overlaps_retrieval_with_dependency_loading(monkeypatch, capsys):
+    import threading
+
+    retrieval_started = threading.Event()
+
+    def slow_dependencies(fqcn, language):
+        # Only returns promptly if retrieval is already running in another thread.
+        assert retrieval_started.wait(5)
+        return {"dep_constraints_text": "", "dep_ensures_text": "", "sanitized_summary": ""}
+
+    def rag(client, idx, chunks, emb_model, rule_sections_txt, k):
+        retrieval_started.set()
+        return "ctx for " + rule_sections_txt["SPEC"]
+
+    def sections(path, language, fqcn):
+        fields = ("objects", "events", "order", "constraints", "requires", "ensures", "forbidden")
+        return {"class_name": fqcn, "raw_crysl_text": "SPEC a.B", **{name: "" for name in fields}}
+
+    monkeypatch.setattr(writer_core, "_load_rule_sections", sections)
+    monkeypatch.setattr(writer_core, "_load_dependency_fields", slow_dependencies)
+
+    class _Index:
+        index = object()
+
+    def generate(rag_block, on_delta, raw_crysl_text, **kwargs):
+        assert raw_crysl_text == ""
+        on_delta(rag_block)
+        return rag_block
+
+    out = writer_core.process_rule_core("B.crysl", "English", None, "m", "a.B", rag, generate, idx=_Index(), chunks=[])
+
+    assert out == "ctx for a.B"
+    assert capsys.readouterr().out == "ctx for a.B\n"
+
+
+def test_run_many_batch_retrieves_per_rule_when_batched_rag_failed(tmp_path, monkeypatch):
+    sections = ("objects", "events", "order", "constraints", "requires", "ensures", "forbidden")
+    monkeypatch.setattr(
+        writer_core, "_resolve_rule_inputs",
+        lambda crysl_path, language, fqcn, use_prebuilt, include_raw: {"class_name": fqcn, **dict.fromkeys(sections, "-")},
+    )
+    submitted = {}
+
+    def fake_run_chat_batch(client, requests, poll_seconds):
+        submitted.update({custom_id: body["rag"] for custom_id, body in requests})
+        return {custom_id: "explained" for custom_id, _ in requests}
+
+    monkeypatch.setattr(writer_core, "run_chat_batch", fake_run_chat_batch)
+
+    def make_rag_context(client, idx, chunks, emb_model, rule_sections_txt, k):
+        if rule_sections_txt["SPEC"] == "a.Down":
+            raise ConnectionError("embeddings endpoint down")
+        return f"paper context for {rule_sections_txt['SPEC']}"
+
+    class _Index:
+        index = object()
+
+    rules = [("A.crysl", "a.A"), ("B.crysl", "a.B"), ("Down.crysl", "a.Down")]
+    failures = writer_core.run_many_batch(
+        rules, "English", None, "m",
+        lambda model, rag_block, explanation_language, **inputs: {"model": model, "rag": rag_block},
+        tmp_path, rag_blocks={"a.A": "batched ctx"}, idx=_Index(), chunks=[], make_rag_context_fn=make_rag_context,
+    )
+
+    # a.Down is not submitted (and cached) without its paper context.
+    assert failures == 1
+    assert submitted == {"a.A": "batched ctx", "a.B": "paper context for a.B"}
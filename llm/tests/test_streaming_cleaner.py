@@ -0,0 +1,24 @@
+import random
+
+from utils.llm_utils import StreamingOutputCleaner, clean_llm_output
+
+
+def _stream(text, rng):
+    cleaner = StreamingOutputCleaner()
+    out, i = [], 0
+    while i < len(text):
+        step = rng.randint(1, 7)
+        out.append(cleaner.feed(text[i:i + step]))
+        i += step
+    out.append(cleaner.close())
+    return "".join(out)
+
+
+def test_streamed_cleaning_matches_clean_llm_output():
+    rng = random.Random(7)
+    pieces = ["```", "```java", "```md  ", "## Overview", "text", "", "  ", "\t", "x```", " ```", "a b"]
+    for _ in range(2000):
+        text = "\n".join(rng.choice(pieces) for _ in range(rng.randint(0, 8)))
+        if rng.random() < 0.3:
+            text = "\n" + text + "\n  "
+        assert _stream(text, rng) == clean_llm_output(text), repr(text)
@@ -0,0 +1,99 @@
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from utils.json_io import list_files, read_json
+
+
+# Marker the model is asked to emit before each per-rule answer in a batched reply.
+BATCH_OUTPUT_RE = re.compile(r"^[ \t]*###[ \t]*OUTPUT[ \t]+(\d+)[ \t]*$", re.MULTILINE)
+_UNSAFE_NAME_RE = re.compile(r"[^a-zA-Z0-9.\-]")
+
+
+def load_rule_payloads(source: Path) -> List[Dict]:
+    """
+    Load rule payloads for batch generation.
+
+    `source` may be a directory of JSON payloads (one rule per file, processed in
+    file-name order) or a single JSON file holding either one payload or a list.
+    Payloads without a `className` are skipped.
+    """
+    if source.is_dir():
+        raw = [read_json(path) for path in list_files(source, ".json")]
+    else:
+        data = read_json(source)
+        raw = data if isinstance(data, list) else [data]
+    return [item for item in raw if isinstance(item, dict) and item.get("className")]
+
+
+def chunked(items: List, size: int) -> List[List]:
+    """Split `items` into consecutive groups of at most `size` elements."""
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run_groups(groups: List[List], run_group: Callable[[List], int], workers: int = 1) -> int:
+    """
+    Run `run_group` over `groups` on up to `workers` threads and sum the failure counts it returns.
+
+    A group that raises is logged and counted as failed for all of its rules, so one bad
+    group (an unreadable rule file, a full disk) never aborts the groups still in flight.
+    """
+
+    def run_one(group: List) -> int:
+        try:
+            return run_group(group)
+        except Exception as exc:
+            print(f"[ERROR] Batch group of {len(group)} rules failed: {exc}", file=sys.stderr)
+            return len(group)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups) or 1))) as pool:
+        return sum(pool.map(run_one, groups))
+
+
+def rule_header(index: int, class_name: str) -> str:
+    """Delimiter line introducing rule `index` inside a batched prompt."""
+    return f"### RULE {index} / className={class_name}"
+
+
+def batch_output_instructions(count: int) -> str:
+    """Instructions telling the model how to delimit the per-rule answers."""
+    return (
+        f"Batch output format (mandatory):\n"
+        f"- There are {count} rules above, numbered 1..{count}.\n"
+        f"- For each rule i, emit a line containing exactly `### OUTPUT i` followed by that rule's code "
+        f"in one ```java fenced block.\n"
+        f"- Emit the outputs in order (`### OUTPUT 1` .. `### OUTPUT {count}`) and nothing else between them."
+    )
+
+
+def split_batch_output(text: str, count: int) -> List[Optional[str]]:
+    """
+    Split a batched model reply into per-rule outputs.
+
+    Returns a list of length `count`; entries the model did not produce (or produced
+    empty) are None so callers can fall back to single-rule generation.
+    """
+    outputs: List[Optional[str]] = [None] * count
+    text = text or ""
+    matches = list(BATCH_OUTPUT_RE.finditer(text))
+    for pos, match in enumerate(matches):
+        number = int(match.group(1))
+        if not 1 <= number <= count or outputs[number - 1] is not None:
+            continue
+        end = matches[pos + 1].start() if pos + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        outputs[number - 1] = body or None
+    return outputs
+
+
+def safe_class_name(class_name: str) -> str:
+    """File-name-safe class name, matching the Java pipeline's cache naming."""
+    return _UNSAFE_NAME_RE.sub("_", class_name)
+
+
+def example_output_path(out_dir: Path, class_name: str, label: str) -> Path:
+    """Return the code-cache file the Java pipeline reads for `class_name` (`<safe>_<label>.txt`)."""
+    return out_dir / f"{safe_class_name(class_name)}_{label}.txt"
@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from utils.response_cache import CACHE_DIR, cache_enabled
+
+
+EMBEDDINGS_DIR = CACHE_DIR / "embeddings"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Vectors this process has already loaded or computed, by cache path (a few KB each), so
+# repeated queries in one run skip the disk read. Callers must not mutate returned vectors.
+_memory: Dict[Path, np.ndarray] = {}
+
+
+def normalize_query(text: str) -> str:
+    """Strip and collapse whitespace so equivalent queries share one cache slot."""
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+def embedding_path(model: str, text: str, root: Optional[Path] = None) -> Path:
+    key = hashlib.sha256((model + "\0" + text).encode("utf-8")).hexdigest()
+    return (root or EMBEDDINGS_DIR) / f"{key}.npy"
+
+
+def _load(path: Path) -> Optional[np.ndarray]:
+    vec = _memory.get(path)
+    if vec is None:
+        vec = _read(path)
+        if vec is not None:
+            _memory[path] = vec
+    return vec
+
+
+def _read(path: Path) -> Optional[np.ndarray]:
+    try:
+        return np.load(path).astype("float32", copy=False)
+    except Exception:
+        return None
+
+
+def _save(path: Path, vec: np.ndarray) -> None:
+    vec = np.asarray(vec, dtype="float32")
+    _memory[path] = vec
+    _write(path, vec)
+
+
+def _write(path: Path, vec: np.ndarray) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and swap it in so concurrent runs never load a partial vector.
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                np.save(handle, vec)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    except OSError as exc:
+        print(f"[WARN] Could not write embedding cache entry {path.name}: {exc}", file=sys.stderr)
+
+
+def cached_embed(embed_fn: Callable[[str], np.ndarray], text: str, model: str) -> np.ndarray:
+    """
+    Return the float32 embedding of `text` for `model`, calling `embed_fn` only on a cache miss.
+
+    `text` is normalized first and `embed_fn` receives the normalized string.
+    Vectors live under rag_cache/embeddings/<sha256(model + NUL + text)>.npy and are also
+    kept in memory for the rest of the process.
+    """
+    text = normalize_query(text)
+    if not cache_enabled():
+        return embed_fn(text)
+    path = embedding_path(model, text)
+    vec = _load(path)
+    if vec is None:
+        vec = np.asarray(embed_fn(text), dtype="float32")
+        _save(path, vec)
+    return vec
+
+
+async def cached_embed_async(embed_fn: Callable[[str], Awaitable[np.ndarray]], text: str, model: str) -> np.ndarray:
+    """Async variant of cached_embed for AsyncOpenAI call sites."""
+    text = normalize_query(text)
+    if not cache_enabled():
+        return await embed_fn(text)
+    path = embedding_path(model, text)
+    vec = _load(path)
+    if vec is None:
+        vec = np.asarray(await embed_fn(text), dtype="float32")
+        _save(path, vec)
+    return vec
+
+
+async def cached_embed_many_async(
+    embed_many_fn: Callable[[List[str]], Awaitable[np.ndarray]],
+    texts: List[str],
+    model: str,
+) -> List[np.ndarray]:
+    """
+    Embed several texts, sending only the uncached ones to `embed_many_fn` in a single call.
+
+    `embed_many_fn` receives the distinct normalized misses and returns one row per input.
+    Results come back in the order of `texts` and are written to the same cache slots as
+    cached_embed, so later per-text lookups are served from disk.
+    """
+    normalized = [normalize_query(t) for t in texts]
+    if not cache_enabled():
+        return list(np.asarray(await embed_many_fn(normalized), dtype="float32")) if normalized else []
+    found = {}
+    for text in normalized:
+        if text not in found:
+            found[text] = _load(embedding_path(model, text))
+    misses = [text for text, vec in found.items() if vec is None]
+    if misses:
+        vectors = np.asarray(await embed_many_fn(misses), dtype="float32")
+        for text, vec in zip(misses, vectors):
+            found[text] = vec
+            _save(embedding_path(model, text), vec)
+    return [found[text] for text in normalized]
+
+
+def cached_embed_texts(
+    embed_texts_fn: Callable[[List[str]], np.ndarray],
+    texts: List[str],
+    model: str,
+    root: Path,
+) -> np.ndarray:
+    """
+    Embed document texts, sending only those without a stored vector to `embed_texts_fn` (one call).
+
+    Unlike the query helpers, texts are embedded verbatim (no whitespace normalization)
+    and vectors are not kept in memory, since they are read once to build an index.
+    Vectors live under `root` in the same <sha256(model + NUL + text)>.npy layout.
+    Returns an (N, d) float32 matrix in the order of `texts`.
+    """
+    if not cache_enabled():
+        return np.asarray(embed_texts_fn(texts), dtype="float32")
+    found: Dict[str, Optional[np.ndarray]] = {}
+    for text in texts:
+        if text not in found:
+            found[text] = _read(embedding_path(model, text, root))
+    misses = [text for text, vec in found.items() if vec is None]
+    if misses:
+        vectors = np.asarray(embed_texts_fn(misses), dtype="float32")
+        for text, vec in zip(misses, vectors):
+            found[text] = vec
+            _write(embedding_path(model, text, root), vec)
+    return np.vstack([found[text] for text in texts])
+
@@ -0,0 +1,232 @@
+"""
+Prompt templates for the secure and insecure Java example writers.
+
+Both writers import their prompt builders from here so shared text is defined once.
+"""
+from typing import Dict, List
+
+from utils.code_batch import batch_output_instructions, rule_header
+
+
+JAVA_ASSISTANT_ROLE = "You are a Java coding assistant."
+
+
+# Authority and compilation rules shared by the single-rule and batched secure prompts.
+_SECURE_AUTHORITY_AND_COMPILATION = """
+Authority rules (very important):
+- The **CrySL contract** below is the SOURCE OF TRUTH for required calls, order, constraints, and forbidden usage.
+- The **CrySL primer** is only to help you understand CrySL semantics. It MUST NOT override the contract.
+- If general best practices conflict with the CrySL contract, FOLLOW THE CONTRACT.
+
+Compilation contract (non-negotiable):
+- Target Java: 17+. Standard library only. No external dependencies.
+- Output MUST be a single file with NO package declaration.
+- The public class MUST be named SecureUsageExample (so it compiles as SecureUsageExample.java).
+- Exactly ONE top-level public type: `public class SecureUsageExample`. No other public classes/interfaces/enums/records.
+- Any helper code MUST be `private static` methods inside `SecureUsageExample` (no extra top-level types).
+- Every referenced non-java.lang type MUST be either:
+  (a) imported explicitly, or
+  (b) used via fully-qualified name in code.
+- If unsure about an import, use the fully-qualified name (compile correctness > style).
+""".strip()
+
+
+# Hard requirements, security guardrails and final self-check; items 1 and 6 vary per prompt shape.
+def _secure_requirements_block(order_rule: str, output_rule: str) -> str:
+    return f"""
+Hard requirements (must follow all):
+1) {order_rule} Use real JCA/JCE calls (no invented APIs).
+2) Enforce every CONSTRAINT (algorithms, key sizes, modes/paddings, provider requirements, parameter domains). If multiple are allowed, choose the strongest allowed option.
+3) Implement REQUIRES as concrete setup/preconditions (correct initialization, SecureRandom usage, IV/nonce generation, parameter generation, key generation/loading).
+4) Ensure FORBIDDEN calls/usages never occur anywhere in the code (not even in comments).
+5) No placeholders like TODO/null. Generate real keys/IVs/nonces, and handle exceptions properly.
+6) {output_rule}
+7) The code must be compilable (include imports + a minimal public class with a runnable `main`).
+8) Import pass (mandatory):
+    - No wildcard imports.
+    - Ensure every referenced non-java.lang type is imported OR fully-qualified.
+    - Remove unused imports.
+
+9) Do NOT declare `main` as `throws Exception` / `throws Throwable`. Handle errors inside `main` using try/catch and fail safely.
+
+General security guardrails (apply unless the CrySL contract explicitly implies otherwise):
+A) Never print, log, or expose secrets (passwords, keys, private key material, raw plaintext, nonces/IVs). Do not hex/Base64-print keys, IVs, nonces, ciphertext, or plaintext.
+B) Avoid converting secrets from `char[]` to `String`. If a secret is needed, keep it as `char[]` and clear it after use (`Arrays.fill(secret, '\\0')`).
+C) Secret input policy (no hardcoded secrets, ever):
+   - Prefer `System.console().readPassword()` when available (no echo).
+   - Else prefer reading from an environment variable (e.g., `APP_PASSWORD`).
+   - Else last resort: `Scanner` input (echoes; add a brief warning comment).
+   - If none are available, throw `IllegalStateException`.
+D) ABSOLUTE BAN — no secret literals:
+   - The code MUST NOT contain ANY hardcoded secret literal anywhere (even for “demo” or “fallback”).
+   - This bans: `new char[]{{...}}` for passwords, `'p','a','s'...`, `"password"`, `"secret"`, `"fallbackPassword"`, `"1234"`, or any literal credential/token/key material.
+   - If a secret is missing, do NOT fabricate one. Use Scanner or throw `IllegalStateException`.
+   - This ban applies ONLY to credentials/key material. Non-secret demo literals (e.g., plaintext "Example message") are allowed.
+
+E) Do not make false security/semantic claims in comments or output. Do NOT say “authenticated”, “verified”, “securely stored”, etc. unless the code truly performs that operation.
+F) Prefer no console output. If you print anything, it must be non-sensitive and strictly accurate (e.g., “Operation completed.”).
+G) Use `SecureRandom` for all randomness. Prefer `SecureRandom.getInstanceStrong()` when available; otherwise use `new SecureRandom()`.
+H) Prefer authenticated encryption (AEAD) like GCM if permitted by the contract constraints. If not permitted, follow the contract and still generate a correct IV/nonce.
+I) Always specify explicit charset when converting text to bytes. Prefer `StandardCharsets.UTF_8` over `"UTF-8"`.
+J) Use try-with-resources for streams/Closeables where relevant and close resources reliably.
+K) If comparing secret bytes is needed, use constant-time comparison (`MessageDigest.isEqual`) rather than `Arrays.equals`.
+L) Minimize secret lifetime:
+   - Do NOT store secrets in `static` fields or long-lived object fields.
+   - Keep secrets in local variables with the smallest scope possible.
+   - Clear secrets in a `finally` block or immediately after last use.
+M) Callback secrets rule (applies to any callback/lambda/handler that supplies credentials or other secrets):
+   - If the code uses any callback/handler/lambda that supplies credentials or other secrets, obtain the secret inside the callback on each invocation into local variables and clear them in a finally block; never store or reuse secrets from outer scope/fields.
+   - Never store secrets in fields (static or instance) of the callback/handler object.
+   - Obtain secrets inside the callback each time it is invoked (console/env/scanner as needed), store only in local variables, and clear them in a finally block.
+   - Do not clear a shared outer secret that might be reused on a later callback invocation.
+
+Final self-check before output (do this mentally, then output only code):
+- Compiles: no unresolved symbols; imports match all referenced types; no unused imports.
+- If `StandardCharsets` appears anywhere, confirm `import java.nio.charset.StandardCharsets;` is present.
+- No secret literals anywhere (no hardcoded fallback passwords, no `new char[]{{...}}` credentials, no `"password"`/`"secret"` literals).
+- No printing/logging/encoding of secrets/IVs/nonces/ciphertext/plaintext; if output exists, it is non-sensitive and strictly accurate.
+- No forbidden APIs; ORDER and constraints satisfied.
+- `main` does not throw; errors are handled with try/catch.
+""".strip()
+
+
+# Render the rule-specific contract + dependency context block.
+def _secure_rule_block(context: Dict[str, str]) -> str:
+    dep_ensures = context.get("dep_ensures_text") or "(no dependency guarantees)"
+    dep_constraints = context.get("dep_constraints_text") or "(no dependency constraints)"
+    return f"""
+CRYSL CONTRACT (AUTHORITATIVE — MUST FOLLOW EXACTLY):
+{context['crysl_summary']}
+
+SUPPORTING INFO (do not override the CrySL contract):
+- Dependency Guarantees:
+{dep_ensures}
+
+- Dependency Constraints:
+{dep_constraints}
+""".strip()
+
+
+# Build the secure-code prompt from the contract + primer + dependency context.
+def build_secure_prompt(context: Dict[str, str]) -> str:
+    requirements = _secure_requirements_block(
+        order_rule=f"Follow ORDER exactly as implied by the contract (`ORDER: {context['order_txt']}`).",
+        output_rule="Output **Java code only**, wrapped in a single ```java fenced block. No prose before/after.",
+    )
+    return f"""
+You are a senior Java security engineer specializing in JCA/JCE and secure API usage.
+
+Goal:
+Generate a single, self-contained, production-quality **secure** Java usage example for `{context['class_name']}`.
+
+{_SECURE_AUTHORITY_AND_COMPILATION}
+
+CRYSL PRIMER (GENERAL SEMANTICS — NOT AUTHORITATIVE):
+{context['crysl_primer']}
+
+{_secure_rule_block(context)}
+
+{requirements}
+
+
+Output rules:
+- Return exactly one Java file in one fenced block.
+- Put everything inside one public class.
+""".strip()
+
+
+# Build one prompt requesting a secure example per rule; the primer and guidance are sent once.
+def build_batch_secure_prompt(contexts: List[Dict[str, str]], crysl_primer: str) -> str:
+    rule_blocks = "\n\n".join(
+        f"{rule_header(i, ctx['class_name'])}\n{_secure_rule_block(ctx)}"
+        for i, ctx in enumerate(contexts, start=1)
+    )
+    requirements = _secure_requirements_block(
+        order_rule="For every rule, follow ORDER exactly as implied by that rule's contract.",
+        output_rule="Output **Java code only**: one ```java fenced block per rule. No prose before/after.",
+    )
+    return f"""
+You are a senior Java security engineer specializing in JCA/JCE and secure API usage.
+
+Goal:
+Generate one self-contained, production-quality **secure** Java usage example for EACH of the {len(contexts)} rules below.
+Each rule has its own CrySL contract; each example is a separate, independent Java file.
+
+{_SECURE_AUTHORITY_AND_COMPILATION}
+
+CRYSL PRIMER (GENERAL SEMANTICS — NOT AUTHORITATIVE):
+{crysl_primer}
+
+{rule_blocks}
+
+{requirements}
+
+{batch_output_instructions(len(contexts))}
+- Each file must put everything inside one public class named SecureUsageExample.
+""".strip()
+
+
+# Rule fields shown to the model for an insecure example.
+def _insecure_rule_fields(rule: Dict) -> str:
+    return f"""Objects: {rule['objects']}
+Events: {rule['events']}
+Order: {rule['order']}
+Constraints: {rule['constraints']}
+Requires: {rule['requires']}
+Ensures: {rule['ensures']}
+Forbidden Methods: {rule['forbidden']}"""
+
+
+# Guidelines and output style shared by the single-rule and batched insecure prompts.
+def _insecure_guidance(guidelines_heading: str, example_comment: bool) -> str:
+    comment_example = "\n  - Example: `// 2048-bit RSA is too weak for secure usage, even though valid Java`" if example_comment else ""
+    return f"""
+{guidelines_heading}
+- Use parameter values that are *not* listed as valid (e.g., for RSA key size, use 1024 or 2048 instead of 3072 or 4096).
+- Break the expected method call order (e.g., call `generateKeyPair()` before `initialize()`).
+- Use any forbidden methods mentioned, if applicable.
+- Do NOT satisfy the required conditions or methods in the rule.
+
+Output Style:
+- The code must be valid Java and look realistic.
+- Include inline comments using `//` to explain **why each choice is insecure**.{comment_example}
+- Output only the annotated Java code — no extra explanation or text.
+""".strip()
+
+
+# Build a prompt that instructs the LLM to violate the CrySL rule intentionally.
+def build_insecure_prompt(rule: Dict) -> str:
+    return f"""
+{JAVA_ASSISTANT_ROLE}
+
+Your task is to generate an **insecure** Java code example using the class `{rule['className']}`.
+
+The CrySL rule below defines correct and secure usage. However, your goal is to create a code snippet that violates this rule while still being syntactically valid:
+
+{_insecure_rule_fields(rule)}
+
+{_insecure_guidance("Guidelines:", example_comment=True)}
+
+Your goal is to help demonstrate **what insecure code might look like** to compare with a secure version.
+""".strip()
+
+
+# Build one prompt asking for an insecure example per rule, delimited by numbered markers.
+def build_batch_insecure_prompt(rules: List[Dict]) -> str:
+    rule_blocks = "\n\n".join(
+        f"{rule_header(i, rule['className'])}\n{_insecure_rule_fields(rule)}"
+        for i, rule in enumerate(rules, start=1)
+    )
+    return f"""
+{JAVA_ASSISTANT_ROLE}
+
+Your task is to generate one **insecure** Java code example for EACH of the {len(rules)} classes below.
+
+Each CrySL rule defines correct and secure usage. However, your goal is to create code snippets that violate these rules while still being syntactically valid.
+
+{rule_blocks}
+
+{_insecure_guidance("Guidelines (apply to every rule):", example_comment=False)}
+
+{batch_output_instructions(len(rules))}
+""".strip()
@@ -0,0 +1,122 @@
+import atexit
+import copy
+import functools
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from utils.response_cache import CACHE_DIR
+
+
+# Parsed sanitized-rule JSON, persisted across runs: str(path) -> (mtime_ns, parsed data).
+CACHE_FILE = CACHE_DIR / "sanitized_cache.pkl"
+
+_entries: Optional[Dict[str, Tuple[int, Any]]] = None
+_dirty = False
+_lock = threading.Lock()
+
+
+def _load_entries() -> Dict[str, Tuple[int, Any]]:
+    global _entries
+    if _entries is None:
+        try:
+            with CACHE_FILE.open("rb") as handle:
+                loaded = pickle.load(handle)
+            _entries = loaded if isinstance(loaded, dict) else {}
+        except Exception:
+            _entries = {}
+        atexit.register(flush)
+    return _entries
+
+
+def flush() -> None:
+    """Write the cache back to disk if it changed; failures are non-fatal."""
+    global _dirty
+    with _lock:
+        if not _dirty or _entries is None:
+            return
+        try:
+            CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file and swap it in so concurrent runs never read a partial pickle.
+            fd, tmp = tempfile.mkstemp(dir=str(CACHE_FILE.parent), suffix=".tmp")
+            with os.fdopen(fd, "wb") as handle:
+                pickle.dump(_entries, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, CACHE_FILE)
+            _dirty = False
+        except Exception as exc:
+            print(f"[WARN] Could not write {CACHE_FILE}: {exc}", file=sys.stderr)
+
+
+def mtime_cached(loader: Callable[[Path], Any]) -> Callable[[Path], Any]:
+    """
+    Memoize a JSON file loader by (path, st_mtime_ns), in memory and in CACHE_FILE.
+
+    Editing a file changes its mtime and therefore misses the cache. Missing files and
+    failed loads (None) are passed straight through and never cached. Hits are deep-copied
+    so callers cannot mutate the shared entry. `wrapper.load_at(path, mtime_ns)` skips the
+    stat for callers that already know the mtime (see mtime_memoized).
+    """
+
+    def load_at(path: Path, mtime_ns: int) -> Any:
+        global _dirty
+        key = str(path)
+        with _lock:
+            entry = _load_entries().get(key)
+        if entry is not None and entry[0] == mtime_ns:
+            return copy.deepcopy(entry[1])
+        data = loader(path)
+        if data is not None:
+            with _lock:
+                _load_entries()[key] = (mtime_ns, copy.deepcopy(data))
+                _dirty = True
+        return data
+
+    @functools.wraps(loader)
+    def wrapper(path: Path) -> Any:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return loader(path)
+        return load_at(path, mtime_ns)
+
+    wrapper.load_at = load_at
+    return wrapper
+
+
+def mtime_memoized(maxsize: int = 2048) -> Callable[[Callable[[Path], Any]], Callable[[Path], Any]]:
+    """
+    Memoize a file loader in memory by (path, st_mtime_ns), keeping at most `maxsize` entries.
+
+    Unlike a plain lru_cache on the path, an edited file is re-read by a long-lived process.
+    Missing files are cached under mtime -1, so a missing dependency warns once rather than
+    on every visit. Results are shared between callers and must not be mutated. The wrapper
+    exposes the LRU's cache_clear and cache_info. Stacked on mtime_cached, the mtime read
+    here is handed down, so each lookup costs one stat.
+    """
+
+    def decorate(loader: Callable[[Path], Any]) -> Callable[[Path], Any]:
+        load_at = getattr(loader, "load_at", None)
+
+        @functools.lru_cache(maxsize=maxsize)
+        def cached(path_str: str, mtime_ns: int) -> Any:
+            if load_at is not None and mtime_ns >= 0:
+                return load_at(Path(path_str), mtime_ns)
+            return loader(Path(path_str))
+
+        @functools.wraps(loader)
+        def wrapper(path: Path) -> Any:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime_ns = -1
+            return cached(str(path), mtime_ns)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+
+    return decorate
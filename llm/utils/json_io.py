@@ -0,0 +1,46 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, List, Union
+
+try:
+    # Optional speedup: orjson works on bytes directly and parses/serializes several times faster than json.
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads_bytes(data: Union[bytes, str]) -> Any:
+    """Parse UTF-8 JSON bytes (or text) with orjson when installed, else the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def read_json(path: Union[str, Path]) -> Any:
+    """Read and parse a JSON file in one pass (no separate text-decoding step)."""
+    return loads_bytes(Path(path).read_bytes())
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize `obj` to compact UTF-8 JSON bytes with orjson when installed, else the stdlib."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_json(path: Union[str, Path], obj: Any) -> None:
+    """Serialize `obj` and write it to `path` in one pass (no separate text-encoding step)."""
+    Path(path).write_bytes(dumps_bytes(obj))
+
+
+def list_files(directory: Union[str, Path], suffix: str) -> List[Path]:
+    """
+    Return the regular files in `directory` ending with `suffix`, sorted by name.
+
+    Uses os.scandir, whose entries carry the file type from the directory listing,
+    so no extra stat call is needed per entry.
+    """
+    with os.scandir(directory) as entries:
+        names = sorted(e.name for e in entries if e.name.endswith(suffix) and e.is_file())
+    return [Path(directory) / name for name in names]
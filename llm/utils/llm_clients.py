@@ -0,0 +1,113 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+
+_clients: Dict[Tuple[Optional[str], Optional[str]], "OpenAI"] = {}
+_clients_lock = threading.Lock()
+
+# Idle pooled connections survive this long (httpx's default is 5 s), so rules that sit out
+# a rate-limit backoff, or a secure example waiting on javac before its repair request, still
+# find a warm connection instead of paying a new TCP + TLS handshake.
+KEEPALIVE_SECONDS = 30.0
+
+# A reply cut off by max_tokens is re-requested once with this multiple of the budget.
+LENGTH_RETRY_FACTOR = 2
+
+
+class TruncatedReplyError(RuntimeError):
+    """A chat reply still hit max_tokens after the larger-budget retry."""
+
+
+def get_client(api_key: Optional[str], base_url: Optional[str] = None) -> "OpenAI":
+    """
+    Return the process-wide OpenAI client for (api_key, base_url), creating it on first use.
+
+    Reusing one client keeps its HTTP connection pool (and TLS sessions) alive across
+    the embedding and chat calls of every rule handled by the process; idle connections are
+    kept for KEEPALIVE_SECONDS. Async clients are bound to an event loop and are therefore
+    not shared here. openai is imported on the first call so scripts only pay for it once
+    they actually need a client.
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                from openai import DefaultHttpxClient, OpenAI
+
+                client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=DefaultHttpxClient(limits=_connection_limits(None)),
+                )
+                _clients[key] = client
+    return client
+
+
+def get_async_client(api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 10) -> "AsyncOpenAI":
+    """
+    Return a new AsyncOpenAI client whose pool keeps `max_connections` connections alive.
+
+    The multi-rule driver builds one per run and shares it across all of its tasks; sizing
+    the keep-alive pool to the request concurrency lets every task reuse a warm connection
+    instead of paying a new TCP + TLS handshake. Not cached like get_client: async clients
+    are bound to the event loop that uses them.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    limits = _connection_limits(max(1, max_connections))
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=DefaultAsyncHttpxClient(limits=limits))
+
+
+# openai's default pool sizes (max_connections / max_keepalive_connections), restated so the
+# limits are built with public httpx API instead of the SDK's private constants module.
+MAX_CONNECTIONS = 1000
+MAX_KEEPALIVE_CONNECTIONS = 100
+
+
+# openai's default pool limits with KEEPALIVE_SECONDS, keeping `keepalive` connections when given.
+def _connection_limits(keepalive: Optional[int]):
+    try:
+        from httpx import Limits
+    except ImportError:  # openai releases built on httpx2 no longer install httpx
+        from httpx2 import Limits
+
+    size = keepalive or MAX_KEEPALIVE_CONNECTIONS
+    return Limits(
+        max_connections=max(size, MAX_CONNECTIONS),
+        max_keepalive_connections=size,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+
+
+def embedding_rows(response: Any) -> List[List[float]]:
+    """
+    Return the vectors of an embeddings response in input order.
+
+    Each item carries the `index` of the input it embeds; sorting on it keeps rows aligned
+    with the request even if a server (e.g. an OpenAI-compatible gateway) reorders them.
+    """
+    data = sorted(response.data, key=lambda d: getattr(d, "index", 0) or 0)
+    return [d.embedding for d in data]
+
+
+def complete_chat_text(create: Callable[..., Any], request: Dict[str, Any]) -> str:
+    """
+    Run `create(**request)` (a chat.completions.create call) and return the reply text.
+
+    A reply whose finish_reason is "length" was cut off by max_tokens (for code, mid-class),
+    so it is requested again with LENGTH_RETRY_FACTOR times the budget; if that is cut off
+    too, TruncatedReplyError is raised. Raising (rather than returning the partial text)
+    keeps truncated replies out of the response cache.
+    """
+    choice = create(**request).choices[0]
+    if choice.finish_reason == "length" and request.get("max_tokens"):
+        budget = request["max_tokens"] * LENGTH_RETRY_FACTOR
+        choice = create(**dict(request, max_tokens=budget)).choices[0]
+    if choice.finish_reason == "length":
+        raise TruncatedReplyError(f"Reply was cut off at max_tokens={request.get('max_tokens')} (after one larger retry).")
+    return choice.message.content or ""
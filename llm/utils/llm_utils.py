@@ -1,8 +1,13 @@
-import json
+import functools
 import re
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.json_file_cache import mtime_cached, mtime_memoized
+from utils.json_io import read_json
 
 
 PROJECT_ROOT_DEFAULT = Path(__file__).resolve().parents[2]
@@ -10,8 +15,15 @@ SANITIZED_DIR_DEFAULT = PROJECT_ROOT_DEFAULT / "llm" / "sanitized_rules"
 FILENAME_TEMPLATE_DEFAULT = "sanitized_rule_{fqcn}_{lang}.json"
 SANITIZED_DIR_DEFAULT.mkdir(parents=True, exist_ok=True)
 
+CRYSL_SECTIONS = ("SPEC", "OBJECTS", "EVENTS", "ORDER", "CONSTRAINTS", "REQUIRES", "ENSURES", "FORBIDDEN")
+_SECTION_RE = re.compile(r"\b(" + "|".join(CRYSL_SECTIONS) + r")\b")
+_CODE_FENCE_RE = re.compile(r"^```(?:\w+)?\s*$", re.MULTILINE)
+_FENCE_LINE_RE = re.compile(r"```(?:\w+)?\s*")
+
 
 # Build the sanitized rule file path for a class/language pair.
+# Hit once per dependency visit, so paths are memoized and the default template skips str.format.
+@functools.lru_cache(maxsize=4096)
 def rule_path(
     fqcn: str,
     lang: str,
@@ -19,16 +31,20 @@ def rule_path(
     filename_template: str = FILENAME_TEMPLATE_DEFAULT,
 ) -> Path:
     """Return the sanitized-rule JSON path for a fully-qualified class and language."""
-    sanitized_name = sanitized_dir / filename_template.format(fqcn=fqcn, lang=lang)
-    return sanitized_name
+    if filename_template == FILENAME_TEMPLATE_DEFAULT:
+        return sanitized_dir / f"sanitized_rule_{fqcn}_{lang}.json"
+    return sanitized_dir / filename_template.format(fqcn=fqcn, lang=lang)
 
 
 # Read a JSON file with utf-8 and return dict or None.
+# Memoized per process by (path, mtime) (dependency rules are shared by many rules in a batch)
+# on top of the mtime-keyed disk cache; the returned object is shared, so callers must not mutate it.
+@mtime_memoized(maxsize=2048)
+@mtime_cached
 def load_json(path: Path):
     """Load JSON from disk and return None with stderr warnings on failure."""
     try:
-        with path.open(encoding="utf-8") as f:
-            return json.load(f)
+        return read_json(path)
     except FileNotFoundError:
         print(f"[WARN] Missing file: {path}", file=sys.stderr)
     except Exception as e:
@@ -36,11 +52,26 @@ def load_json(path: Path):
     return None
 
 
+# Warm load_json for several files at once so their reads and parses overlap.
+# Worthwhile on a cold cache over high-latency storage (NFS, CI runners); cheap otherwise.
+def prefetch_json(paths: Iterable[Path], max_workers: int = 8) -> None:
+    """Load `paths` concurrently into load_json's cache; results and warnings are as for load_json."""
+    unique = list(dict.fromkeys(paths))
+    if len(unique) < 2:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+        for _ in pool.map(load_json, unique):
+            pass
+
+
 # Normalize list items for display.
 def clean_item(s):
     """Normalize a scalar/list item into a trimmed display-friendly string."""
     if not isinstance(s, str):
         return str(s)
+    # Fast path: no surrounding whitespace and no leading comma means nothing to trim.
+    if s and s[0] != "," and not s[0].isspace() and not s[-1].isspace():
+        return s
     s2 = s.strip()
     if s2.startswith(","):
         s2 = s2.lstrip(",").strip()
@@ -53,56 +84,41 @@ def collect_dependency_constraints(
     language: str,
     sanitized_dir: Path = SANITIZED_DIR_DEFAULT,
     filename_template: str = FILENAME_TEMPLATE_DEFAULT,
+    primary: Optional[dict] = None,
 ) -> Tuple[List[str], Dict[str, List[str]]]:
     """
     Load direct dependency constraint lists for `target_fqcn`.
 
+    `primary` is the target's sanitized JSON when the caller has already loaded it.
+    Callers that also need ENSURES should use collect_dependency_info (one walk).
+
     Returns:
     - deps_order: stable dependency traversal order for prompt rendering.
     - dep_to_constraints: dependency fqcn -> normalized list of constraints.
     """
-    dep_to_constraints: Dict[str, List[str]] = {}
-    deps_order: List[str] = []
-
-    primary_path = rule_path(
+    deps_order, dep_to_constraints, _ = collect_dependency_info(
         target_fqcn,
         language,
+        depth=1,
         sanitized_dir=sanitized_dir,
         filename_template=filename_template,
+        primary=primary,
     )
-    primary = load_json(primary_path)
-    if not primary:
-        return deps_order, dep_to_constraints
-
-    deps = primary.get("dependency") or []
-    seen = set()
-    for dep in deps:
-        if dep == target_fqcn or dep in seen:
-            continue
-        seen.add(dep)
-        deps_order.append(dep)
-
-        dep_path = rule_path(
-            dep,
-            language,
-            sanitized_dir=sanitized_dir,
-            filename_template=filename_template,
-        )
-        dep_json = load_json(dep_path)
-        if not dep_json:
-            dep_to_constraints[dep] = []
-            continue
+    return deps_order, dep_to_constraints
 
-        constraints = dep_json.get("constraints")
-        if constraints is None:
-            constraints = dep_json.get("constraint")
-        if constraints is None:
-            constraints = []
-        if not isinstance(constraints, list):
-            constraints = [constraints]
-        dep_to_constraints[dep] = [clean_item(c) for c in constraints]
 
-    return deps_order, dep_to_constraints
+# Read a dependency rule's constraints (either key spelling) as display strings.
+def _dependency_constraints(data: Optional[dict]) -> List[str]:
+    if not data:
+        return []
+    constraints = data.get("constraints")
+    if constraints is None:
+        constraints = data.get("constraint")
+    if constraints is None:
+        constraints = []
+    if not isinstance(constraints, list):
+        constraints = [constraints]
+    return [clean_item(c) for c in constraints]
 
 
 # Render dependency constraints into a readable block for the prompt.
@@ -110,15 +126,18 @@ def format_dependency_constraints(deps_order: List[str], dep_to_constraints: Dic
     """Render dependency constraints into a deterministic prompt block."""
     if not deps_order:
         return "No dependency constraints supplied."
-    parts = []
+    # One flat list of finished lines (blank line between dependencies) and a single join.
+    lines: List[str] = []
     for dep in deps_order:
+        if lines:
+            lines.append("")
+        lines.append(f"Dependency: {dep}")
         constraints = dep_to_constraints.get(dep, []) or []
         if not constraints:
-            parts.append(f"Dependency: {dep}\n  - (no constraints)")
+            lines.append("  - (no constraints)")
         else:
-            lines = "\n".join(f"  - {c}" for c in constraints)
-            parts.append(f"Dependency: {dep}\n{lines}")
-    return "\n\n".join(parts)
+            lines.extend(f"  - {c}" for c in constraints)
+    return "\n".join(lines)
 
 
 # Normalize inputs that can be list-or-string into a list of strings.
@@ -127,7 +146,14 @@ def _normalize_listish(value) -> List[str]:
     if value is None:
         return []
     if isinstance(value, list):
-        return [clean_item(v) for v in value if str(v).strip()]
+        # One clean_item pass per entry; entries that clean to nothing (blank, comma-only) are dropped.
+        out: List[str] = []
+        append = out.append
+        for entry in value:
+            item = clean_item(entry)
+            if item:
+                append(item)
+        return out
     if isinstance(value, str):
         v = value.strip()
         return [v] if v else []
@@ -141,35 +167,75 @@ def collect_dependency_ensures(
     depth: int = 1,
     sanitized_dir: Path = SANITIZED_DIR_DEFAULT,
     filename_template: str = FILENAME_TEMPLATE_DEFAULT,
+    primary: Optional[dict] = None,
 ) -> Tuple[List[str], Dict[str, List[str]]]:
     """Return (deps_order, dep_to_ensures) where dep_to_ensures maps fqcn -> list[str].
-    depth=1 means direct dependencies only. Cycle-safe.
+    depth=1 means direct dependencies only. Cycle-safe. `primary` is the primary rule's
+    sanitized JSON when the caller has already loaded it.
+    """
+    deps_order, _, dep_to_ensures = collect_dependency_info(
+        primary_fqcn,
+        language,
+        depth=depth,
+        sanitized_dir=sanitized_dir,
+        filename_template=filename_template,
+        primary=primary,
+    )
+    return deps_order, dep_to_ensures
+
+
+# Collect dependency constraints and ENSURES in a single walk (depth-limited, cycle-safe).
+def collect_dependency_info(
+    primary_fqcn: str,
+    language: str,
+    depth: int = 1,
+    sanitized_dir: Path = SANITIZED_DIR_DEFAULT,
+    filename_template: str = FILENAME_TEMPLATE_DEFAULT,
+    primary: Optional[dict] = None,
+) -> Tuple[List[str], Dict[str, List[str]], Dict[str, List[str]]]:
+    """Return (deps_order, dep_to_constraints, dep_to_ensures) for the dependencies of `primary_fqcn`.
+    Each dependency rule is located and loaded once and both fields are read from it.
+    depth=1 means direct dependencies only. `primary` is the primary rule's sanitized
+    JSON when the caller has already loaded it.
     """
+    dep_to_constraints: Dict[str, List[str]] = {}
     dep_to_ensures: Dict[str, List[str]] = {}
     deps_order: List[str] = []
 
-    primary = load_json(
-        rule_path(
-            primary_fqcn,
-            language,
-            sanitized_dir=sanitized_dir,
-            filename_template=filename_template,
+    if primary is None:
+        primary = load_json(
+            rule_path(
+                primary_fqcn,
+                language,
+                sanitized_dir=sanitized_dir,
+                filename_template=filename_template,
+            )
         )
-    )
     if not primary:
-        return deps_order, dep_to_ensures
+        return deps_order, dep_to_constraints, dep_to_ensures
 
-    # Start from direct dependencies declared by the primary sanitized rule.
-    roots = primary.get("dependency") or []
+    # Depth-limited BFS from the direct dependencies of the primary rule; cycle-safe via `seen`.
+    # Rules are marked when queued: in FIFO order the first enqueue is also the shallowest,
+    # so shared dependencies (diamonds) are queued, prefetched and loaded exactly once.
     seen = {primary_fqcn}
+    queue: deque = deque()
+
+    def _enqueue(fqcns, level_depth: int) -> None:
+        level = []
+        for fqcn in fqcns:
+            if isinstance(fqcn, str) and fqcn and fqcn not in seen:
+                seen.add(fqcn)
+                level.append(fqcn)
+        prefetch_json(
+            rule_path(fqcn, language, sanitized_dir=sanitized_dir, filename_template=filename_template)
+            for fqcn in level
+        )
+        queue.extend((fqcn, level_depth) for fqcn in level)
 
-    def visit(fqcn: str, cur_depth: int):
-        """Depth-limited DFS that is cycle-safe via `seen`."""
-        if fqcn in seen:
-            return
-        seen.add(fqcn)
-        if fqcn not in deps_order:
-            deps_order.append(fqcn)
+    _enqueue(primary.get("dependency") or [], 1)
+    while queue:
+        fqcn, cur_depth = queue.popleft()
+        deps_order.append(fqcn)
 
         data = load_json(
             rule_path(
@@ -179,22 +245,14 @@ def collect_dependency_ensures(
                 filename_template=filename_template,
             )
         )
-        if not data:
-            dep_to_ensures[fqcn] = []
-            return
+        dep_to_constraints[fqcn] = _dependency_constraints(data)
+        dep_to_ensures[fqcn] = _normalize_listish(data.get("ensures")) if data else []
 
-        dep_to_ensures[fqcn] = _normalize_listish(data.get("ensures"))
+        # Expand the next level if requested
+        if data and cur_depth < depth:
+            _enqueue(_normalize_listish(data.get("dependency")), cur_depth + 1)
 
-        # Recurse if requested
-        if cur_depth < depth:
-            for sub in _normalize_listish(data.get("dependency")):
-                visit(sub, cur_depth + 1)
-
-    for dep in roots:
-        if isinstance(dep, str) and dep:
-            visit(dep, 1)
-
-    return deps_order, dep_to_ensures
+    return deps_order, dep_to_constraints, dep_to_ensures
 
 
 # Render dependency ENSURES in a readable, developer-friendly block.
@@ -216,43 +274,87 @@ def format_dependency_ensures(primary_fqcn: str, deps_order: List[str], dep_to_e
             lines.append(f"- **{fqcn}**: *(no ensures available or file missing)*")
             continue
         lines.append(f"- **{fqcn}**:")
-        lines.extend([f"  - {e}" for e in ensures])
+        lines.extend(f"  - {e}" for e in ensures)
     return "\n".join(lines)
 
 
 # Split raw CrySL text into a dict of section -> lines.
 def crysl_to_json_lines(crysl_text: str) -> Dict[str, List[str]]:
     """Split raw CrySL text into canonical section -> non-empty lines mapping."""
-    sections = [
-        "SPEC",
-        "OBJECTS",
-        "EVENTS",
-        "ORDER",
-        "CONSTRAINTS",
-        "REQUIRES",
-        "ENSURES",
-        "FORBIDDEN",
-    ]
-    pat = re.compile(r"\b(" + "|".join(sections) + r")\b")
-    matches = list(pat.finditer(crysl_text))
     out: Dict[str, List[str]] = {}
-    for i, m in enumerate(matches):
-        header = m.group(1)
-        start = m.end()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(crysl_text)
-        raw_lines = crysl_text[start:end].strip().splitlines()
-        lines = [line.strip() for line in raw_lines if line.strip()]
-        out[header] = lines
+    header = None
+    start = 0
+    # One pass over the header matches; each section body is sliced once and each line stripped once.
+    for m in _SECTION_RE.finditer(crysl_text):
+        if header is not None:
+            out[header] = _stripped_lines(crysl_text[start:m.start()])
+        header, start = m.group(1), m.end()
+    if header is not None:
+        out[header] = _stripped_lines(crysl_text[start:])
     return out
 
 
+def _stripped_lines(block: str) -> List[str]:
+    return list(filter(None, map(str.strip, block.splitlines())))
+
+
 # Remove stray code fences from LLM output while keeping markdown headings.
 def clean_llm_output(text: str) -> str:
     """Strip stray markdown code fences while preserving regular heading/content text."""
     # Keep Markdown headings; just strip stray code fences
-    text = re.sub(r"^```(?:\w+)?\s*$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"^```\s*$", "", text, flags=re.MULTILINE)
-    return text.strip()
+    # (one pass: the optional language tag also covers bare ``` lines)
+    return _CODE_FENCE_RE.sub("", text).strip()
+
+
+class StreamingOutputCleaner:
+    """
+    Incremental clean_llm_output for streamed replies.
+
+    feed() takes raw text deltas and returns the cleaned text that is safe to emit so
+    far; close() flushes the rest. The concatenated output equals clean_llm_output() of
+    the full reply: fence lines are blanked, whitespace-only lines directly after a fence
+    are dropped (_CODE_FENCE_RE's trailing whitespace match eats them), and
+    leading/trailing whitespace is held back until it is known not to be at either end.
+    """
+
+    def __init__(self) -> None:
+        self._line = ""
+        self._after_fence = False
+        self._started = False
+        self._pending_ws = ""
+
+    def feed(self, delta: str) -> str:
+        self._line += delta
+        if "\n" not in self._line:
+            return ""
+        *lines, self._line = self._line.split("\n")
+        out = []
+        for line in lines:
+            if not self._dropped(line):
+                out.append(self._clean_line(line) + "\n")
+        return self._emit("".join(out))
+
+    def close(self) -> str:
+        line, self._line = self._line, ""
+        return self._emit("" if self._dropped(line) else self._clean_line(line))
+
+    def _dropped(self, line: str) -> bool:
+        return self._after_fence and not line.strip()
+
+    def _clean_line(self, line: str) -> str:
+        self._after_fence = _FENCE_LINE_RE.fullmatch(line) is not None
+        return "" if self._after_fence else line
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._pending_ws + text
+        kept = text.rstrip()
+        self._pending_ws = text[len(kept):]
+        return kept
 
 
 # Convert a list-or-string section into displayable text.
@@ -289,21 +391,20 @@ def format_sanitized_rule_for_prompt(sanitized: dict) -> str:
     if not sanitized:
         return "No sanitized fields supplied."
     exclude = {"dependency"}
-    parts = []
+    # One flat list of finished lines (blank line between fields) and a single join.
+    lines: List[str] = []
     for key, val in sanitized.items():
-        if key in exclude or val is None:
+        if key in exclude or val is None or (isinstance(val, (list, dict)) and not val):
             continue
+        if lines:
+            lines.append("")
         k = str(key)
         if isinstance(val, list):
-            if not val:
-                continue
-            lines = "\n".join(f"- {clean_item(it)}" for it in val)
-            parts.append(f"{k}:\n{lines}")
+            lines.append(f"{k}:")
+            lines.extend(f"- {clean_item(it)}" for it in val)
         elif isinstance(val, dict):
-            if not val:
-                continue
-            lines = "\n".join(f"- {ik}: {clean_item(iv)}" for ik, iv in val.items())
-            parts.append(f"{k}:\n{lines}")
+            lines.append(f"{k}:")
+            lines.extend(f"- {ik}: {clean_item(iv)}" for ik, iv in val.items())
         else:
-            parts.append(f"{k}: {clean_item(val)}")
-    return "\n\n".join(parts) if parts else "No sanitized fields supplied."
+            lines.append(f"{k}: {clean_item(val)}")
+    return "\n".join(lines) if lines else "No sanitized fields supplied."
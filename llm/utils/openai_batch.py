@@ -0,0 +1,74 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from utils.json_io import dumps_bytes, loads_bytes
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request_line(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap chat-completion arguments as one line of a Batch API input file."""
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_batch_output(jsonl_text: str) -> Dict[str, str]:
+    """Map custom_id -> assistant message text for every successful, complete line of a batch output file."""
+    results: Dict[str, str] = {}
+    for line in (jsonl_text or "").splitlines():
+        if not line.strip():
+            continue
+        item = loads_bytes(line)
+        custom_id = item.get("custom_id")
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            print(f"[WARN] Batch request {custom_id} failed: {item.get('error') or response}", file=sys.stderr)
+            continue
+        choices = (response.get("body") or {}).get("choices") or []
+        if choices and choices[0].get("finish_reason") == "length":
+            # Cut off by max_tokens: leave it missing so callers neither use nor cache it.
+            print(f"[WARN] Batch request {custom_id} was cut off at max_tokens.", file=sys.stderr)
+            continue
+        if custom_id and choices:
+            results[custom_id] = (choices[0].get("message") or {}).get("content") or ""
+    return results
+
+
+def run_chat_batch(client: Any, requests: List[Tuple[str, Dict[str, Any]]], poll_seconds: float = 30.0) -> Dict[str, str]:
+    """
+    Submit chat completions through the OpenAI Batch API and wait for the results.
+
+    `requests` is a list of (custom_id, chat-completion kwargs). The requests are
+    uploaded as one JSONL file, the batch is polled until it reaches a terminal
+    status, and the output file is parsed into custom_id -> reply text. Requests
+    that failed inside the batch are missing from the returned mapping.
+    """
+    if not requests:
+        return {}
+    with tempfile.TemporaryDirectory() as td:
+        input_path = Path(td) / "batch_input.jsonl"
+        input_path.write_bytes(b"".join(dumps_bytes(batch_request_line(cid, body)) + b"\n" for cid, body in requests))
+        with input_path.open("rb") as handle:
+            uploaded = client.files.create(file=handle, purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    print(f"[INFO] Submitted batch {batch.id} with {len(requests)} requests.", file=sys.stderr)
+    while batch.status not in TERMINAL_STATUSES:
+        time.sleep(poll_seconds)
+        batch = client.batches.retrieve(batch.id)
+        print(f"[INFO] Batch {batch.id} status: {batch.status}", file=sys.stderr)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'.")
+    if not batch.output_file_id:
+        return {}
+    return parse_batch_output(client.files.content(batch.output_file_id).text)
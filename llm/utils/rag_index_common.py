@@ -1,13 +1,79 @@
 import hashlib
-import json
+import os
 import re
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple
 
-import faiss
 import numpy as np
-from pypdf import PdfReader
+
+from utils.embedding_cache import cached_embed_texts
+from utils.json_io import read_json, write_json
+
+if TYPE_CHECKING:
+    import faiss
+
+# faiss and the PDF libraries are imported where they are needed: a warm run over a cached
+# single-paper index searches with NumPy and never extracts text, so it skips ~75 ms of imports.
+
+
+# Texts per embeddings request when indexing; the API caps inputs (and tokens) per call.
+EMBED_BATCH_SIZE = 256
+
+# Corpora at least this large get an HNSW graph (sublinear, approximate search) whose
+# vectors are stored as 8-bit scalar codes, a quarter of the float32 bytes per search;
+# smaller ones keep an exact NumPy flat index, which is already microseconds for a single paper.
+HNSW_MIN_VECTORS = 4096
+HNSW_NEIGHBORS = 32
+HNSW_EF_CONSTRUCTION = 80
+# Graph file stored next to vectors.npy so cache reloads skip graph construction.
+HNSW_INDEX_FILE = "hnsw.faiss"
+
+# pypdf extraction is pure Python (~35 ms per page). PDFs with at least this many pages per
+# extra core are split into page ranges extracted in worker processes; below that, starting a
+# process and re-parsing the PDF there costs more than it saves.
+PDF_PAGES_PER_WORKER = 8
+
+# Bump when _chunk_text changes so cached chunk lists and index buckets are rebuilt.
+CHUNKING_VERSION = "v2"
+
+_UNSAFE_LABEL_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def _normalize_rows(x: np.ndarray) -> None:
+    """L2-normalize the rows of a float32 matrix in place (zero rows stay zero), like faiss.normalize_L2."""
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    np.divide(x, norms, out=x, where=norms > 0)
+
+
+class FlatIPIndex:
+    """
+    Exact inner-product index over a float32 matrix, NumPy-backed.
+
+    Mirrors the faiss.IndexFlatIP surface used in this project (`d`, `ntotal` and
+    `search(queries, k) -> (D, I)` with -1 padding), so callers that hold `.index` work
+    with either kind. Below HNSW_MIN_VECTORS one matrix product is as fast as FAISS.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = np.asarray(queries, dtype="float32") @ self.vectors.T
+        n = min(k, self.ntotal)
+        if n < self.ntotal:
+            top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        else:
+            top = np.tile(np.arange(self.ntotal), (scores.shape[0], 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        D = np.take_along_axis(top_scores, order, axis=1)
+        I = np.take_along_axis(top, order, axis=1)
+        if k > n:
+            D = np.pad(D, ((0, 0), (0, k - n)), constant_values=-np.finfo("float32").max)
+            I = np.pad(I, ((0, 0), (0, k - n)), constant_values=-1)
+        return D, I
 
 
 @dataclass
@@ -21,19 +87,24 @@ class DocChunk:
 
 
 class EmbeddingIndex:
-    """FAISS-backed cosine-similarity index over chunk embeddings."""
+    """Cosine-similarity index over chunk embeddings (NumPy flat, or FAISS HNSW for large corpora)."""
 
     def __init__(self):
         """Initialize an empty in-memory index and aligned id/vector storage."""
         # Parallel arrays of IDs and FAISS vectors
         self.ids: List[str] = []
         self.index = None
-        self.vectors = None  # np.ndarray float32
+        # float32 rows behind a flat index; None for HNSW, whose 8-bit codes are the only resident copy
+        self.vectors = None
 
-    def build(self, embeddings: np.ndarray, ids: List[str]):
+    def build(self, embeddings: np.ndarray, ids: List[str], index: Optional["faiss.Index"] = None):
         """
         Build a cosine-similarity FAISS index from embeddings and IDs.
 
+        Corpora with at least HNSW_MIN_VECTORS rows get an 8-bit quantized HNSW graph,
+        smaller ones an exact FlatIPIndex. A previously saved `index` over the same rows is reused as is
+        (`embeddings` is then only checked for shape, so it may be a read-only memory map).
+
         Invariants enforced here:
         - embeddings is 2D float32 with one row per chunk id.
         - ids length matches row count.
@@ -51,81 +122,240 @@ class EmbeddingIndex:
             return
         if embeddings.shape[1] == 0:
             raise ValueError("Embedding dimension must be greater than 0.")
-        # Normalize for cosine similarity using inner product index
-        faiss.normalize_L2(embeddings)
         dim = embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dim)
-        self.index.add(embeddings)
-        self.vectors = embeddings
         self.ids = list(ids)
+        if index is not None and index.ntotal == embeddings.shape[0] and index.d == dim:
+            self.index = index
+            self.vectors = None
+            return
+        if not embeddings.flags.writeable:
+            embeddings = np.array(embeddings)
+        # Normalize for cosine similarity using inner product index
+        _normalize_rows(embeddings)
+        if embeddings.shape[0] >= HNSW_MIN_VECTORS:
+            import faiss
+
+            self.index = faiss.IndexHNSWSQ(
+                dim, faiss.ScalarQuantizer.QT_8bit, HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT
+            )
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            self.index.train(embeddings)
+            self.index.add(embeddings)
+            self.vectors = None
+        else:
+            self.index = FlatIPIndex(embeddings)
+            self.vectors = embeddings
 
     def search(self, vec: np.ndarray, k: int) -> List[Tuple[str, float]]:
         """
         Return top-k (id, score) pairs for a query embedding.
 
-        Accepts 1D or 2D query vectors and validates dimension compatibility with
-        the built index before searching.
+        Accepts 1D or 2D query vectors (only the first row of a 2D query is used).
         """
-        if self.index is None or not self.ids or k <= 0:
-            return []
         q = np.asarray(vec, dtype="float32")
         if q.ndim == 1:
             q = q.reshape(1, -1)
-        elif q.ndim != 2:
+        hits = self.search_many(q[:1], k)
+        return hits[0] if hits else []
+
+    @property
+    def is_hnsw(self) -> bool:
+        """True when the index is a FAISS HNSW graph (and so is persisted as HNSW_INDEX_FILE)."""
+        return hasattr(self.index, "hnsw")
+
+    def search_many(self, vecs: np.ndarray, k: int) -> List[List[Tuple[str, float]]]:
+        """
+        Return top-k (id, score) pairs for each row of an (N, d) query matrix.
+
+        All rows are searched with a single index call; the query dimension is
+        validated against the built index first.
+        """
+        if self.index is None or not self.ids or k <= 0:
+            return []
+        q = np.asarray(vecs, dtype="float32")
+        if q.ndim != 2:
             raise ValueError("Query vector must be 1D or 2D.")
         if q.shape[1] != self.index.d:
             raise ValueError(f"Query dimension {q.shape[1]} does not match index dimension {self.index.d}.")
-        faiss.normalize_L2(q)
+        q = np.ascontiguousarray(q)
         top_k = min(k, len(self.ids))
+        if self.is_hnsw:
+            # Wider beam than k keeps HNSW recall close to exact search.
+            self.index.hnsw.efSearch = max(top_k * 4, 32)
         D, I = self.index.search(q, top_k)
+        # Inner products scale with the query norm, so searching the raw queries ranks exactly
+        # like normalized ones; dividing the k scores per row then yields cosine similarities
+        # without copying (or mutating) the caller's possibly cached vectors.
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        np.divide(D, norms, out=D, where=norms > 0)
         return [
-            (self.ids[i], float(D[0][j]))
-            for j, i in enumerate(I[0])
-            if i != -1 and i < len(self.ids)
+            [(self.ids[i], float(D[row][j])) for j, i in enumerate(I[row]) if i != -1 and i < len(self.ids)]
+            for row in range(q.shape[0])
         ]
 
 
 # Extract text from all pages of a PDF (best effort).
-def _extract_pdf_text(pdf_path: str) -> str:
-    """Best-effort text extraction for all pages in a PDF."""
+def _extract_pdf_text(pdf_path: str, workers: Optional[int] = None) -> str:
+    """
+    Best-effort text extraction for all pages in a PDF (PDFium when installed, else pypdf).
+
+    pypdf runs on up to `workers` processes (default: one per CPU) for long PDFs.
+    """
+    try:
+        # Optional speedup: PDFium (C++) extracts text many times faster than pure-Python pypdf.
+        import pypdfium2
+    except ImportError:
+        pypdfium2 = None
+    if pypdfium2 is not None:
+        try:
+            return _extract_pdf_text_pdfium(pypdfium2, pdf_path)
+        except Exception:
+            pass
+    from pypdf import PdfReader
+
     reader = PdfReader(pdf_path)
-    pages = []
-    for p in reader.pages:
+    page_count = len(reader.pages)
+    workers = min(workers or os.cpu_count() or 1, page_count // PDF_PAGES_PER_WORKER)
+    if workers > 1:
+        step = -(-page_count // workers)
+        ranges = [(pdf_path, start, min(start + step, page_count)) for start in range(0, page_count, step)]
         try:
-            pages.append(p.extract_text() or "")
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn, not fork: the caller may already run threads (HTTP clients, RAG prefetch).
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as pool:
+                return "\n".join(text for part in pool.map(_extract_page_range, ranges) for text in part)
         except Exception:
-            pages.append("")
-    return "\n".join(pages)
-
-
-# Chunk text by paragraph with overlap to preserve context.
-def _chunk_text(text: str, max_chars=1800, overlap=300) -> List[str]:
-    """Split text into paragraph chunks and add tail overlap for retrieval continuity."""
-    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    chunks, buf = [], ""
-    for para in paragraphs:
-        if len(buf) + len(para) + 1 <= max_chars:
-            buf = (buf + "\n" + para).strip()
-        else:
-            if buf:
-                chunks.append(buf)
-            buf = para
+            pass  # no worker processes available here; extract in this process instead
+    return "\n".join(_page_text(p) for p in reader.pages)
+
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+# Worker-process entry point: the text of pages [start, stop) of one PDF, in order.
+def _extract_page_range(task: Tuple[str, int, int]) -> List[str]:
+    from pypdf import PdfReader
+
+    pdf_path, start, stop = task
+    reader = PdfReader(pdf_path)
+    return [_page_text(reader.pages[i]) for i in range(start, stop)]
+
+
+def _extract_pdf_text_pdfium(pypdfium2, pdf_path: str) -> str:
+    # Pages are read in order on one thread: PDFium itself is not thread-safe.
+    doc = pypdfium2.PdfDocument(pdf_path)
+    try:
+        pages = []
+        for i in range(len(doc)):
+            page = doc[i]
+            textpage = page.get_textpage()
+            try:
+                pages.append(textpage.get_text_range() or "")
+            finally:
+                textpage.close()
+                page.close()
+        return "\n".join(pages)
+    finally:
+        doc.close()
+
+
+def extract_pdf_chunks(pdf_path: str, cache_dir: str) -> List[str]:
+    """
+    Return the retrieval chunks of a PDF, cached by the SHA-256 of its bytes.
+
+    The chunk list lives in `<cache_dir>/pdf_text/<sha256>_<CHUNKING_VERSION>.json`, shared
+    by every provider/model index bucket, so text extraction runs once per distinct PDF.
+    """
+    digest = hashlib.sha256(Path(pdf_path).read_bytes()).hexdigest()
+    cache_p = Path(cache_dir) / "pdf_text" / f"{digest}_{CHUNKING_VERSION}.json"
+    try:
+        cached = read_json(cache_p)
+        if isinstance(cached, list) and all(isinstance(c, str) for c in cached):
+            return cached
+    except Exception:
+        pass
+    chunks = _chunk_text(_extract_pdf_text(pdf_path))
+    try:
+        cache_p.parent.mkdir(parents=True, exist_ok=True)
+        write_json(cache_p, chunks)
+    except OSError:
+        pass
+    return chunks
+
+
+# Pack consecutive paragraphs into non-overlapping chunks of at most max_chars.
+# (The former tail overlap was cut back to max_chars, dropping each chunk's own last ~300
+# characters from the index; without it every character is embedded exactly once.)
+def _chunk_text(text: str, max_chars=1800) -> List[str]:
+    """Split text into paragraph chunks of up to `max_chars` characters (longer paragraphs stay whole)."""
+    chunks: List[str] = []
+    buf: List[str] = []
+    size = -1
+    for line in text.split("\n"):
+        para = line.strip()
+        if not para:
+            continue
+        if buf and size + 1 + len(para) > max_chars:
+            chunks.append("\n".join(buf))
+            buf, size = [], -1
+        buf.append(para)
+        size += 1 + len(para)
     if buf:
-        chunks.append(buf)
-    merged = []
-    # Add overlap from previous chunk to improve retrieval continuity.
-    for c in chunks:
-        if not merged:
-            merged.append(c)
-        else:
-            tail = merged[-1][-overlap:]
-            merged.append((tail + "\n" + c)[:max_chars])
-    return merged
+        chunks.append("\n".join(buf))
+    return chunks
+
+
+def embed_in_batches(
+    embed_batch: Callable[[List[str]], Sequence[Sequence[float]]],
+    texts: List[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Embed `texts` with one `embed_batch` call per `batch_size` texts.
+
+    Rows are written into a single float32 matrix allocated once the first batch
+    reveals the embedding dimension. Returns an empty (0, 0) matrix for no texts.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype="float32")
+    size = max(1, batch_size)
+    out: Optional[np.ndarray] = None
+    for start in range(0, len(texts), size):
+        vectors = np.asarray(embed_batch(texts[start:start + size]), dtype="float32")
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype="float32")
+        out[start:start + len(vectors)] = vectors
+    return out
+
+
+def embed_chunks(
+    embed_texts: Callable[[List[str]], np.ndarray],
+    chunks: List[DocChunk],
+    cache_dir: str,
+    provider: str,
+    emb_model: str,
+) -> np.ndarray:
+    """
+    Embed chunk texts, reusing the vector of any chunk this provider/model embedded before.
+
+    Vectors are stored per chunk text under `<cache_dir>/chunk_embeddings/<provider>/`, outside
+    the index buckets, so an edited (or merely touched) PDF, which gets a new bucket, only
+    sends its new or changed chunks to `embed_texts`.
+    """
+    root = Path(cache_dir) / "chunk_embeddings" / _safe_cache_label(provider, "provider")
+    return cached_embed_texts(embed_texts, [c.text for c in chunks], emb_model, root)
 
 
 def _safe_cache_label(value: str, fallback: str) -> str:
     """Sanitize a cache-label component so it is filesystem-safe and readable."""
-    label = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)).strip("._-")
+    label = _UNSAFE_LABEL_RE.sub("_", str(value)).strip("._-")
     return label or fallback
 
 
@@ -136,7 +366,8 @@ def get_cache_paths(cache_dir: str, pdf_path: str, provider: str, emb_model: str
     The derived bucket includes:
     - provider name
     - embedding model
-    - stable hash over provider/model/pdf absolute path and PDF size/mtime signature
+    - stable hash over provider/model/pdf absolute path, PDF size/mtime signature and
+      CHUNKING_VERSION
     """
     cache_root = Path(cache_dir)
     cache_root.mkdir(parents=True, exist_ok=True)
@@ -150,7 +381,7 @@ def get_cache_paths(cache_dir: str, pdf_path: str, provider: str, emb_model: str
     except OSError:
         pdf_sig = "missing"
 
-    key_material = f"{provider}|{emb_model}|{pdf_abs}|{pdf_sig}"
+    key_material = f"{provider}|{emb_model}|{pdf_abs}|{pdf_sig}|{CHUNKING_VERSION}"
     key = hashlib.sha256(key_material.encode("utf-8")).hexdigest()[:16]
     provider_tag = _safe_cache_label(provider, "provider")
     model_tag = _safe_cache_label(emb_model, "model")[:48]
@@ -172,10 +403,12 @@ def load_cached_index(vec_p: Path, ids_p: Path, chunks_p: Path) -> Optional[Tupl
     """
     if not (vec_p.exists() and ids_p.exists() and chunks_p.exists()):
         return None
+    graph_p = vec_p.with_name(HNSW_INDEX_FILE)
     try:
-        vectors = np.load(vec_p)
-        ids = json.loads(ids_p.read_text(encoding="utf-8"))
-        raw_chunks = json.loads(chunks_p.read_text(encoding="utf-8"))
+        # With a saved graph the float32 rows are only shape-checked, so map them instead of reading them.
+        vectors = np.load(vec_p, mmap_mode="r" if graph_p.exists() else None)
+        ids = read_json(ids_p)
+        raw_chunks = read_json(chunks_p)
         if not isinstance(ids, list) or not isinstance(raw_chunks, list):
             return None
         if vectors.ndim != 2:
@@ -187,15 +420,35 @@ def load_cached_index(vec_p: Path, ids_p: Path, chunks_p: Path) -> Optional[Tupl
             if not isinstance(item, dict) or "id" not in item or "text" not in item:
                 return None
             chunks.append(DocChunk(**item))
+        graph = None
+        if graph_p.exists():
+            import faiss
+
+            graph = faiss.read_index(str(graph_p))
         idx = EmbeddingIndex()
-        idx.build(vectors, ids)
+        idx.build(vectors, ids, index=graph)
         return idx, chunks
     except Exception:
         return None
 
 
-def save_cached_index(vec_p: Path, ids_p: Path, chunks_p: Path, embeddings: np.ndarray, chunks: List[DocChunk]) -> None:
-    """Persist vectors, chunk ids, and chunk payloads as the canonical cache triplet."""
+def save_cached_index(
+    vec_p: Path,
+    ids_p: Path,
+    chunks_p: Path,
+    embeddings: np.ndarray,
+    chunks: List[DocChunk],
+    idx: Optional[EmbeddingIndex] = None,
+) -> None:
+    """
+    Persist vectors, chunk ids, and chunk payloads as the canonical cache triplet.
+
+    When `idx` holds an HNSW graph it is written next to the vectors as well.
+    """
     np.save(vec_p, embeddings)
-    ids_p.write_text(json.dumps([c.id for c in chunks]), encoding="utf-8")
-    chunks_p.write_text(json.dumps([c.__dict__ for c in chunks]), encoding="utf-8")
+    if idx is not None and idx.is_hnsw:
+        import faiss
+
+        faiss.write_index(idx.index, str(vec_p.with_name(HNSW_INDEX_FILE)))
+    write_json(ids_p, [c.id for c in chunks])
+    write_json(chunks_p, [c.__dict__ for c in chunks])
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.json_io import read_json
+
+
+# Bump whenever prompt templates change so cached replies for old prompts are no longer hit.
+PROMPT_VERSION = "v2"
+
+CACHE_DIR = Path(__file__).resolve().parents[2] / "rag_cache"
+RESPONSES_DIR = CACHE_DIR / "responses"
+DEFAULT_TTL_SECONDS = 7 * 86400
+
+# Set LLM_RESPONSE_CACHE=off (or 0/false/no) to always call the API.
+_DISABLED_VALUES = {"0", "off", "false", "no"}
+
+
+def cache_enabled() -> bool:
+    return os.getenv("LLM_RESPONSE_CACHE", "on").strip().lower() not in _DISABLED_VALUES
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    Content address of a chat-completion request.
+
+    Hashes the full request arguments (model, system + user messages, sampling
+    settings) together with PROMPT_VERSION.
+    """
+    payload = json.dumps({"v": PROMPT_VERSION, **request}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _paths(key: str, root: Optional[Path]) -> tuple[Path, Path]:
+    folder = (root or RESPONSES_DIR) / key[:2]
+    return folder / f"{key}.txt", folder / f"{key}.meta.json"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # Write to a temp file and swap it in so concurrent runs never read a partial entry.
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as handle:
+            handle.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def get(key: str, root: Optional[Path] = None) -> Optional[str]:
+    """Return the cached reply for `key`, or None when missing, unreadable or expired."""
+    text_path, meta_path = _paths(key, root)
+    try:
+        meta = read_json(meta_path)
+        if time.time() - float(meta["created_at"]) > float(meta.get("ttl", DEFAULT_TTL_SECONDS)):
+            return None
+        return text_path.read_text(encoding="utf-8")
+    except Exception:
+        return None
+
+
+def put(
+    key: str,
+    text: str,
+    ttl: int = DEFAULT_TTL_SECONDS,
+    model: Optional[str] = None,
+    root: Optional[Path] = None,
+) -> None:
+    """Store `text` under `key` with a sidecar .meta.json; cache write failures are non-fatal."""
+    text_path, meta_path = _paths(key, root)
+    meta = {"created_at": time.time(), "ttl": ttl, "model": model, "prompt_version": PROMPT_VERSION}
+    try:
+        text_path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(text_path, text)
+        # Meta is written last: get() treats a reply without meta as a miss.
+        _write_atomic(meta_path, json.dumps(meta))
+    except OSError as exc:
+        print(f"[WARN] Could not write response cache entry {key[:12]}: {exc}", file=sys.stderr)
+
+
+def cached_completion(request: Dict[str, Any], call: Callable[[], str]) -> str:
+    """Return the cached reply for `request`, or run `call()` and cache its non-empty result."""
+    if not cache_enabled():
+        return call()
+    key = request_key(request)
+    hit = get(key)
+    if hit is not None:
+        return hit
+    text = call()
+    if text:
+        put(key, text, model=request.get("model"))
+    return text
+
+
+async def cached_completion_async(request: Dict[str, Any], call: Callable[[], Awaitable[str]]) -> str:
+    """Async variant of cached_completion for AsyncOpenAI call sites."""
+    if not cache_enabled():
+        return await call()
+    key = request_key(request)
+    hit = get(key)
+    if hit is not None:
+        return hit
+    text = await call()
+    if text:
+        put(key, text, model=request.get("model"))
+    return text
+
+
+def cached_batch_completions(
+    requests: Dict[str, Dict[str, Any]],
+    call_batch: Callable[[List[Tuple[str, Dict[str, Any]]]], Dict[str, str]],
+) -> Dict[str, str]:
+    """
+    Batch variant of cached_completion: id -> request in, id -> reply out.
+
+    Only the requests missing from the cache are passed to `call_batch` (as
+    (id, request) pairs); its non-empty replies are cached. Ids without a reply
+    are absent from the result.
+    """
+    if not cache_enabled():
+        return call_batch(list(requests.items())) if requests else {}
+    replies: Dict[str, str] = {}
+    pending = []
+    for custom_id, request in requests.items():
+        hit = get(request_key(request))
+        if hit is not None:
+            replies[custom_id] = hit
+        else:
+            pending.append((custom_id, request))
+    if pending:
+        for custom_id, text in call_batch(pending).items():
+            request = requests.get(custom_id)
+            if request is None:
+                continue
+            replies[custom_id] = text
+            if text:
+                put(request_key(request), text, model=request.get("model"))
+    return replies
+
+
+def cached_streamed_completion(
+    request: Dict[str, Any],
+    stream: Callable[[], Iterable[str]],
+    write: Callable[[str], None],
+    cacheable: Optional[Callable[[], bool]] = None,
+) -> str:
+    """
+    Streaming variant of cached_completion: pass each text delta to `write` as it arrives.
+
+    `stream()` yields the reply in pieces; the joined reply is cached and returned.
+    A cache hit is written in one piece. `cacheable()`, checked once the stream is
+    exhausted, can veto caching (e.g. a reply cut off by max_tokens).
+    """
+    key = request_key(request) if cache_enabled() else None
+    hit = get(key) if key else None
+    if hit is not None:
+        write(hit)
+        return hit
+    parts = []
+    for delta in stream():
+        if delta:
+            write(delta)
+            parts.append(delta)
+    text = "".join(parts)
+    if key and text and (cacheable is None or cacheable()):
+        put(key, text, model=request.get("model"))
+    return text
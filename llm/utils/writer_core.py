@@ -1,16 +1,26 @@
 import argparse
+import asyncio
+import logging
 import os
+import random
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 from dotenv import load_dotenv
 
+from utils.code_batch import example_output_path, safe_class_name
+from utils.embedding_cache import cached_embed_many_async
+from utils.json_io import list_files, read_json, write_json
+from utils.openai_batch import run_chat_batch
+from utils.response_cache import CACHE_DIR, cached_batch_completions
+
 from utils.llm_utils import (
     clean_llm_output,
-    collect_dependency_constraints,
-    collect_dependency_ensures,
+    collect_dependency_info,
     crysl_to_json_lines,
     format_dependency_constraints,
     format_dependency_ensures,
@@ -18,9 +28,12 @@ from utils.llm_utils import (
     lines_to_text,
     load_json,
     rule_path,
+    StreamingOutputCleaner,
     validate_and_fill,
 )
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(frozen=True)
 class WriterCLIConfig:
@@ -37,6 +50,111 @@ class WriterCLIConfig:
     k_default: int = 6
 
 
+# Per-rule prompt inputs written ahead of time by llm/precompute.py (read with --use-prebuilt).
+PREBUILT_DIR = CACHE_DIR / "prebuilt"
+
+# Network timeout for writer LLM calls, so a stalled connection is abandoned and retried instead
+# of holding up the run. httpx applies it to each connect and read, and explanations are always
+# streamed, so it bounds silence between tokens rather than generation time: a long explanation
+# that keeps producing tokens never hits it.
+DEFAULT_REQUEST_TIMEOUT = 45.0
+
+# Errors worth retrying with backoff in the multi-rule driver; anything else fails the rule at once.
+# Resolved on first use so importing this module does not load openai.
+def retryable_llm_errors() -> Tuple[type, ...]:
+    from openai import APIConnectionError, APITimeoutError, RateLimitError
+
+    return (RateLimitError, APITimeoutError, APIConnectionError)
+
+# Retrieval bias toward CrySL grammar/semantics (so explanations get the SYNTAX right).
+RAG_SYNTAX_BOOST = """
+CRYSL language syntax and semantics:
+- Sections: SPEC, OBJECTS, EVENTS, ORDER, CONSTRAINTS, REQUIRES, ENSURES, FORBIDDEN
+- Typestate / usage protocols: ORDER as a regex over EVENTS; use of aggregates
+- Predicates: REQUIRES / ENSURES; NEGATES; 'after' placement for predicate generation
+- Helper functions: alg(), mode(), padding(), length(), neverTypeOf(), callTo(), noCallTo()
+- Examples to retrieve: KeyGenerator (Fig. 2), Cipher (Fig. 3), PBEKeySpec (Fig. 4)
+- EBNF grammar and formal semantics
+""".strip()
+
+
+def build_rag_query(rule_sections_txt: Dict[str, str]) -> str:
+    """Build the retrieval query from the syntax boost and this rule's actual sections."""
+    return "\n".join(
+        [
+            RAG_SYNTAX_BOOST,
+            "THIS RULE:",
+            "SPEC: " + (rule_sections_txt.get("SPEC") or ""),
+            "OBJECTS: " + (rule_sections_txt.get("OBJECTS") or ""),
+            "EVENTS: " + (rule_sections_txt.get("EVENTS") or ""),
+            "ORDER: " + (rule_sections_txt.get("ORDER") or ""),
+            "CONSTRAINTS: " + (rule_sections_txt.get("CONSTRAINTS") or ""),
+            "REQUIRES: " + (rule_sections_txt.get("REQUIRES") or ""),
+            "ENSURES: " + (rule_sections_txt.get("ENSURES") or ""),
+        ]
+    ).strip()
+
+
+# Rules whose sections besides SPEC carry fewer real characters than this skip retrieval:
+# their query is little more than RAG_SYNTAX_BOOST and returns the same generic chunks.
+RAG_MIN_SIGNAL_CHARS = 40
+
+
+def rag_query_has_signal(rule_sections_txt: Dict[str, str]) -> bool:
+    """Return True if the rule's non-SPEC sections hold enough non-placeholder text to retrieve for."""
+    signal = sum(
+        len(value)
+        for name, value in rule_sections_txt.items()
+        if name != "SPEC" and value and value != "_no entries_"
+    )
+    if signal >= RAG_MIN_SIGNAL_CHARS:
+        return True
+    # Debug only: Java merges stderr into the explanation it publishes, so a normal run stays silent.
+    logger.debug("Skipping RAG for %s: rule sections are empty.", rule_sections_txt.get("SPEC"))
+    return False
+
+
+def _normalize_pdf_text(s: str) -> str:
+    """Normalize common PDF ligatures and soft hyphens for cleaner markdown output."""
+    return s.replace("\ufb01", "fi").replace("\ufb02", "fl").replace("\u00ad", "").strip()
+
+
+# id -> chunk map of the last chunk list formatted. A run retrieves against one paper
+# index, so the map is built once per run instead of once per query.
+_chunk_map_cache: Tuple[Any, int, Dict[Any, Any]] = (None, 0, {})
+
+
+def _chunks_by_id(chunks: Any) -> Dict[Any, Any]:
+    global _chunk_map_cache
+    cached_chunks, size, mapping = _chunk_map_cache
+    if cached_chunks is not chunks or size != len(chunks):
+        mapping = {getattr(c, "id", None): c for c in chunks}
+        _chunk_map_cache = (chunks, len(chunks), mapping)
+    return mapping
+
+
+def format_rag_snippets(hits: List[Tuple[Any, float]], chunks: Any, per_chunk_max: int = 900) -> str:
+    """
+    Turn ordered `(chunk_id, score)` hits into snippets tagged [C1], [C2], ...
+
+    Hit ids are resolved through a dictionary rather than positional indexing so the
+    mapping stays stable by chunk id regardless of list order.
+    """
+    chunk_by_id = _chunks_by_id(chunks)
+    rag_snippets: List[str] = []
+
+    for rank, (hid, _score) in enumerate(hits, start=1):
+        c = chunk_by_id.get(hid)
+        if not c:
+            continue
+        text = _normalize_pdf_text(getattr(c, "text", ""))
+        if per_chunk_max and len(text) > per_chunk_max:
+            text = text[:per_chunk_max].rsplit(" ", 1)[0] + " ..."
+        rag_snippets.append(f"[C{rank}] {text}")
+
+    return "\n\n".join(rag_snippets) if rag_snippets else ""
+
+
 def build_explanation_prompt(
     class_name: str,
     objects: str,
@@ -67,8 +185,12 @@ Make sure that the response is in **utf-8** charset only."""
         else fr"""Respond in **{explanation_language}** and be as precise as possible."""
     )
 
+    # The structured sections above already carry the parsed rule; the raw text is opt-in (--include-raw).
+    raw_crysl_line = f"- Original CrySL: {raw_crysl_text}\n" if raw_crysl_text else ""
+
     # Keep prompt body centralized here so both OpenAI and gateway wrappers share
-    # identical task framing and section requirements.
+    # identical task framing and section requirements. A single f-string compiles to one
+    # BUILD_STRING (one allocation for the whole prompt), so it is not split into joined parts.
     prompt = fr"""
 You are a cryptography expert who explains complex CrySL rules to Java developers in clear, natural language.
 
@@ -86,8 +208,7 @@ Raw CrySL Data:
 - Dependency Guarantees (ENSURES):
 {dep_ensures_text}
 - Additional context: {sanitized_summary}
-- Original CrySL: {raw_crysl_text}
-
+{raw_crysl_line}
 Your Task: Create a developer-friendly guide that explains how to correctly use this cryptographic class WITHOUT using technical CrySL notation, event labels, or abstract parameter names.
 
 CRITICAL RULES:
@@ -143,14 +264,10 @@ Translate all REQUIRES/ENSURES predicates into plain English requirements that d
 - Explain what security guarantees the class provides after operations
 - Describe any dependencies on other cryptographic operations
 
-**Also incorporate the Dependency Guarantees below:** connect each related class's guarantees to the steps where they matter for `{class_name}`.
+**Also incorporate the Dependency Guarantees given above:** connect each related class's guarantees to the steps where they matter for `{class_name}`.
 
 ## Related Components & Their Guarantees
-Use this section to list and explain guarantees from related classes, and explicitly tie them to `{class_name}` usage decisions. Start by summarizing the list below, then expand with plain-English implications for initialization, parameter selection, and error handling.
-
----
-{dep_ensures_text}
----
+Use this section to list and explain guarantees from related classes, and explicitly tie them to `{class_name}` usage decisions. Start by summarizing the Dependency Guarantees (ENSURES) list from the Raw CrySL Data above, then expand with plain-English implications for initialization, parameter selection, and error handling.
 
 ## Common Mistakes to Avoid
 Convert all FORBIDDEN items and constraint violations into practical warnings:
@@ -223,26 +340,21 @@ def build_system_messages(rag_block: str) -> list[dict[str, str]]:
     return sys_msgs
 
 
-def process_rule_core(
-    crysl_path: str,
-    language: str,
-    client: Any,
-    model: str,
-    target_fqcn: str,
-    make_rag_context_fn: Callable[..., str],
-    generate_explanation_fn: Callable[..., str],
-    idx: Any = None,
-    chunks: Any = None,
-    k: int = 6,
-    emb_model: str = "text-embedding-3-small",
-) -> Optional[str]:
+def load_rule_inputs(crysl_path: str, language: str, target_fqcn: str) -> Optional[Dict[str, str]]:
     """
-    Shared single-rule processing pipeline used by both backend wrappers.
+    Load one CrySL rule and derive every text field the explanation prompt needs.
 
-    Backend-specific behavior is injected through:
-    - make_rag_context_fn
-    - generate_explanation_fn
+    The returned keys match the keyword arguments of the backend
+    `generate_explanation` adapters (minus client/model/language/rag_block).
     """
+    sections = _load_rule_sections(crysl_path, language, target_fqcn)
+    if sections is None:
+        return None
+    return {**sections, **_load_dependency_fields(target_fqcn, language)}
+
+
+def _load_rule_sections(crysl_path: str, language: str, target_fqcn: str) -> Optional[Dict[str, str]]:
+    """The prompt fields that come from the CrySL file itself (enough to build the RAG query)."""
     # Load raw CrySL text from disk and normalize into sectioned data.
     try:
         with open(crysl_path, "r", encoding="utf-8") as f:
@@ -261,70 +373,466 @@ def process_rule_core(
     else:
         class_name = rule["SPEC"] or target_fqcn
 
-    # Prepare human-readable blocks for prompt assembly.
-    objects_txt = lines_to_text(rule["OBJECTS"])
-    events_txt = lines_to_text(rule["EVENTS"])
-    order_txt = lines_to_text(rule["ORDER"])
-    constraints_txt = lines_to_text(rule["CONSTRAINTS"])
-    requires_txt = lines_to_text(rule["REQUIRES"])
-    ensures_txt = lines_to_text(rule["ENSURES"])
-    forbidden_txt = lines_to_text(rule.get("FORBIDDEN", "N/A"))
-
-    # Dependency constraints (reference context for explanations).
-    deps_order_c, dep_to_constraints = collect_dependency_constraints(target_fqcn, language)
-    dep_constraints_text = format_dependency_constraints(deps_order_c, dep_to_constraints)
+    return {
+        "class_name": class_name,
+        "objects": lines_to_text(rule["OBJECTS"]),
+        "events": lines_to_text(rule["EVENTS"]),
+        "order": lines_to_text(rule["ORDER"]),
+        "constraints": lines_to_text(rule["CONSTRAINTS"]),
+        "requires": lines_to_text(rule["REQUIRES"]),
+        "ensures": lines_to_text(rule["ENSURES"]),
+        "forbidden": lines_to_text(rule.get("FORBIDDEN", "N/A")),
+        "raw_crysl_text": content,
+    }
 
-    # Dependency ENSURES (core cross-rule security context).
-    deps_order_e, dep_to_ensures = collect_dependency_ensures(target_fqcn, language, depth=1)
-    dep_ensures_text = format_dependency_ensures(target_fqcn, deps_order_e, dep_to_ensures)
 
-    # Load primary sanitized rule and format its human-friendly fields.
+def _load_dependency_fields(target_fqcn: str, language: str) -> Dict[str, str]:
+    """The prompt fields that come from the sanitized rule and its dependencies."""
+    # Load the primary sanitized rule once; the dependency walk reuses it.
     primary_sanitized = load_json(rule_path(target_fqcn, language))
+
+    # One walk yields dependency constraints (reference context for explanations)
+    # and dependency ENSURES (core cross-rule security context).
+    deps_order, dep_to_constraints, dep_to_ensures = collect_dependency_info(
+        target_fqcn, language, depth=1, primary=primary_sanitized
+    )
+    dep_constraints_text = format_dependency_constraints(deps_order, dep_to_constraints)
+    dep_ensures_text = format_dependency_ensures(target_fqcn, deps_order, dep_to_ensures)
+
+    # Format the primary rule's human-friendly fields.
     sanitized_summary = (
         format_sanitized_rule_for_prompt(primary_sanitized) if primary_sanitized else "No sanitized fields supplied."
     )
 
+    return {
+        "dep_constraints_text": dep_constraints_text,
+        "dep_ensures_text": dep_ensures_text,
+        "sanitized_summary": sanitized_summary,
+    }
+
+
+def prebuilt_inputs_path(target_fqcn: str, language: str, prebuilt_dir: Optional[Path] = None) -> Path:
+    return (prebuilt_dir or PREBUILT_DIR) / f"{safe_class_name(target_fqcn)}_{language}.json"
+
+
+def save_prebuilt_inputs(
+    crysl_path: str, language: str, target_fqcn: str, prebuilt_dir: Optional[Path] = None
+) -> Optional[Path]:
+    """Compute load_rule_inputs once and store it (with the CrySL file's mtime) for later runs."""
+    inputs = load_rule_inputs(crysl_path, language, target_fqcn)
+    if inputs is None:
+        return None
+    target = prebuilt_inputs_path(target_fqcn, language, prebuilt_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"crysl_mtime_ns": os.stat(crysl_path).st_mtime_ns, "inputs": inputs}
+    write_json(target, payload)
+    return target
+
+
+def load_prebuilt_inputs(
+    crysl_path: str, language: str, target_fqcn: str, prebuilt_dir: Optional[Path] = None
+) -> Optional[Dict[str, str]]:
+    """Return prebuilt prompt inputs, or None when missing or older than the CrySL file."""
+    try:
+        payload = read_json(prebuilt_inputs_path(target_fqcn, language, prebuilt_dir))
+        if payload.get("crysl_mtime_ns") != os.stat(crysl_path).st_mtime_ns:
+            return None
+        return payload["inputs"]
+    except Exception:
+        return None
+
+
+def _resolve_rule_inputs(
+    crysl_path: str, language: str, target_fqcn: str, use_prebuilt: bool, include_raw: bool = False
+) -> Optional[Dict[str, str]]:
+    inputs = load_prebuilt_inputs(crysl_path, language, target_fqcn) if use_prebuilt else None
+    if use_prebuilt and inputs is None:
+        print(f"[INFO] No current prebuilt inputs for {target_fqcn} / {language}; computing them.", file=sys.stderr)
+    if inputs is None:
+        inputs = load_rule_inputs(crysl_path, language, target_fqcn)
+    return _drop_raw_unless(inputs, include_raw)
+
+
+def _drop_raw_unless(inputs: Optional[Dict[str, str]], include_raw: bool) -> Optional[Dict[str, str]]:
+    if inputs is not None and not include_raw:
+        # Every section of the raw rule is already in the prompt in parsed form.
+        inputs = {**inputs, "raw_crysl_text": ""}
+    return inputs
+
+
+def _rag_sections(inputs: Dict[str, str]) -> Dict[str, str]:
+    """Select the rule sections used to build the retrieval query."""
+    return {
+        "SPEC": inputs["class_name"],
+        "OBJECTS": inputs["objects"],
+        "EVENTS": inputs["events"],
+        "ORDER": inputs["order"],
+        "CONSTRAINTS": inputs["constraints"],
+        "REQUIRES": inputs["requires"],
+        "ENSURES": inputs["ensures"],
+    }
+
+
+def _rag_enabled(idx: Any, chunks: Any) -> bool:
+    return idx is not None and chunks is not None and hasattr(idx, "index")
+
+
+def process_rule_core(
+    crysl_path: str,
+    language: str,
+    client: Any,
+    model: str,
+    target_fqcn: str,
+    make_rag_context_fn: Callable[..., str],
+    generate_explanation_fn: Callable[..., str],
+    idx: Any = None,
+    chunks: Any = None,
+    k: int = 6,
+    emb_model: str = "text-embedding-3-small",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
+) -> Optional[str]:
+    """
+    Shared single-rule processing pipeline used by both backend wrappers.
+
+    Backend-specific behavior is injected through:
+    - make_rag_context_fn
+    - generate_explanation_fn (called with on_delta, which streams the reply to stdout)
+
+    With use_prebuilt, prompt inputs written by llm/precompute.py are reused when current.
+    The raw CrySL text is only added to the prompt with include_raw. When inputs are computed
+    here, RAG retrieval starts in a worker thread as soon as the rule's own sections are
+    parsed, so its embeddings round trip overlaps loading the dependency rules.
+    """
+    rag_future = None
+    if _rag_enabled(idx, chunks) and not use_prebuilt:
+        sections = _load_rule_sections(crysl_path, language, target_fqcn)
+        if sections is None:
+            return None
+        executor = ThreadPoolExecutor(max_workers=1)
+        rag_future = executor.submit(
+            make_rag_context_fn, client, idx, chunks, emb_model=emb_model, rule_sections_txt=_rag_sections(sections), k=k
+        )
+        executor.shutdown(wait=False)
+        inputs = _drop_raw_unless({**sections, **_load_dependency_fields(target_fqcn, language)}, include_raw)
+    else:
+        inputs = _resolve_rule_inputs(crysl_path, language, target_fqcn, use_prebuilt, include_raw)
+    if inputs is None:
+        return None
+
     # Optional RAG context from the CrySL paper (if index/chunks are available).
     rag_block = ""
-    if idx is not None and chunks is not None and hasattr(idx, "index"):
-        sect: Dict[str, str] = {
-            "SPEC": class_name,
-            "OBJECTS": objects_txt,
-            "EVENTS": events_txt,
-            "ORDER": order_txt,
-            "CONSTRAINTS": constraints_txt,
-            "REQUIRES": requires_txt,
-            "ENSURES": ensures_txt,
-        }
-        rag_block = make_rag_context_fn(client, idx, chunks, emb_model=emb_model, rule_sections_txt=sect, k=k)
+    if rag_future is not None:
+        rag_block = rag_future.result()
+    elif _rag_enabled(idx, chunks):
+        rag_block = make_rag_context_fn(
+            client, idx, chunks, emb_model=emb_model, rule_sections_txt=_rag_sections(inputs), k=k
+        )
+
+    # Call backend LLM adapter, streaming cleaned text to stdout as it is generated.
+    cleaner = StreamingOutputCleaner()
+    emitted = False
+
+    def _write(delta: str) -> None:
+        nonlocal emitted
+        text = cleaner.feed(delta)
+        if text:
+            emitted = True
+            sys.stdout.write(text)
+            sys.stdout.flush()
 
-    # Call backend LLM adapter and return cleaned text for downstream rendering.
     try:
         raw_out = generate_explanation_fn(
             client=client,
             model=model,
-            class_name=class_name,
-            objects=objects_txt,
-            events=events_txt,
-            order=order_txt,
-            constraints=constraints_txt,
-            requires=requires_txt,
-            ensures=ensures_txt,
-            forbidden=forbidden_txt,
-            dep_constraints_text=dep_constraints_text,
-            dep_ensures_text=dep_ensures_text,
-            sanitized_summary=sanitized_summary,
-            raw_crysl_text=content,
             explanation_language=language,
             rag_block=rag_block,
+            on_delta=_write,
+            **inputs,
         )
     except Exception as e:
-        print(f"LLM explanation error for {class_name}: {e}", file=sys.stderr)
+        tail = cleaner.close()
+        if emitted or tail:
+            print(tail)
+        print(f"LLM explanation error for {inputs['class_name']}: {e}", file=sys.stderr)
         return None
 
-    cleaned = clean_llm_output(raw_out)
-    print(cleaned)
-    return cleaned
+    # The streamed text equals clean_llm_output(raw_out); finish it with print's newline.
+    print(cleaner.close())
+    return clean_llm_output(raw_out)
+
+
+async def process_rule_core_async(
+    crysl_path: str,
+    language: str,
+    client: Any,
+    model: str,
+    target_fqcn: str,
+    make_rag_context_fn: Callable[..., Awaitable[str]],
+    generate_explanation_fn: Callable[..., Awaitable[str]],
+    idx: Any = None,
+    chunks: Any = None,
+    k: int = 6,
+    emb_model: str = "text-embedding-3-small",
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
+    rag_block: Optional[str] = None,
+    inputs: Optional[Dict[str, str]] = None,
+) -> Optional[str]:
+    """
+    Async twin of process_rule_core used by the multi-rule driver.
+
+    The adapters await an AsyncOpenAI-style client. LLM errors propagate (instead of
+    being logged) so run_many can retry them; the cleaned text is returned, not printed.
+    A precomputed `rag_block` and prompt `inputs` (both from prepare_rag_blocks) skip the
+    per-rule retrieval and rule loading. Otherwise rule files are loaded in a worker thread
+    so concurrent rules overlap their disk reads.
+    """
+    if inputs is None:
+        inputs = await asyncio.to_thread(
+            _resolve_rule_inputs, crysl_path, language, target_fqcn, use_prebuilt, include_raw
+        )
+    if inputs is None:
+        return None
+
+    if rag_block is None:
+        rag_block = ""
+        if _rag_enabled(idx, chunks):
+            rag_block = await make_rag_context_fn(
+                client, idx, chunks, emb_model=emb_model, rule_sections_txt=_rag_sections(inputs), k=k
+            )
+
+    raw_out = await generate_explanation_fn(
+        client=client,
+        model=model,
+        explanation_language=language,
+        rag_block=rag_block,
+        **inputs,
+    )
+    return clean_llm_output(raw_out)
+
+
+def retry_delay(error: BaseException, attempt: int) -> float:
+    """
+    Seconds to wait before retry `attempt + 1`: the server's Retry-After when given,
+    else exponential backoff (1s, 2s, 4s, ...) plus up to 1s of jitter so concurrent
+    rules that hit the rate limit together do not all retry in the same instant.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return 2 ** attempt + random.uniform(0, 1)
+
+
+async def prepare_rag_blocks(
+    rule_paths: List[Tuple[str, str]],
+    language: str,
+    client: Any,
+    embed_texts_async_fn: Callable[..., Awaitable[Any]],
+    idx: Any,
+    chunks: Any,
+    k: int,
+    emb_model: str,
+    use_prebuilt: bool = False,
+    include_raw: bool = False,
+    inputs_out: Optional[Dict[str, Dict[str, str]]] = None,
+) -> Dict[str, str]:
+    """
+    Build the RAG block of every rule with one embeddings request and one index search.
+
+    Only queries missing from the embedding cache are sent to the API; all query
+    vectors are then searched together via idx.search_many. Returns fqcn -> rag_block.
+    Failures are non-fatal: an empty mapping makes each rule retrieve its own context.
+    The prompt inputs loaded along the way are stored in `inputs_out` (fqcn -> inputs)
+    when given, so the caller does not load each rule a second time.
+    """
+    fqcns: List[str] = []
+    queries: List[str] = []
+
+    # Load every rule's inputs in worker threads so their file reads overlap.
+    all_inputs = await asyncio.gather(
+        *(
+            asyncio.to_thread(_resolve_rule_inputs, path, language, fqcn, use_prebuilt, include_raw)
+            for path, fqcn in rule_paths
+        )
+    )
+    skipped: Dict[str, str] = {}
+    for (_, fqcn), inputs in zip(rule_paths, all_inputs):
+        if inputs is not None:
+            if inputs_out is not None:
+                inputs_out[fqcn] = inputs
+            rule_sections = _rag_sections(inputs)
+            if not rag_query_has_signal(rule_sections):
+                skipped[fqcn] = ""
+                continue
+            fqcns.append(fqcn)
+            queries.append(build_rag_query(rule_sections))
+    if not queries:
+        return skipped
+    try:
+        vectors = await cached_embed_many_async(
+            lambda texts: embed_texts_async_fn(client, texts, model=emb_model), queries, emb_model
+        )
+        hits = idx.search_many(np.vstack(vectors), k)
+    except Exception as e:
+        print(f"[WARN] Batched RAG retrieval failed; retrieving per rule instead: {e}", file=sys.stderr)
+        return {}
+    blocks = {fqcn: format_rag_snippets(rule_hits, chunks) for fqcn, rule_hits in zip(fqcns, hits)}
+    blocks.update(skipped)
+    return blocks
+
+
+async def run_many(
+    rule_paths: List[Tuple[str, str]],
+    language: str,
+    client: Any,
+    model: str,
+    process_rule_async_fn: Callable[..., Awaitable[Optional[str]]],
+    out_dir: Path,
+    concurrency: int = 10,
+    max_attempts: int = 3,
+    idx: Any = None,
+    chunks: Any = None,
+    k: int = 6,
+    emb_model: str = "text-embedding-3-small",
+    use_prebuilt: bool = False,
+    embed_texts_async_fn: Optional[Callable[..., Awaitable[Any]]] = None,
+    include_raw: bool = False,
+) -> int:
+    """
+    Explain many rules concurrently and write `<className>_<language>.txt` files to `out_dir`.
+
+    `rule_paths` holds (crysl_path, fqcn) pairs. At most `concurrency` rules are in
+    flight at once; rate-limit, timeout and connection errors are retried with
+    jittered exponential backoff (see retry_delay) outside the semaphore. Returns the number of
+    rules that produced no explanation. With `embed_texts_async_fn`, all RAG contexts
+    are retrieved up front in one batch (see prepare_rag_blocks).
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    retryable = retryable_llm_errors()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rag_blocks: Dict[str, str] = {}
+    rule_inputs: Dict[str, Dict[str, str]] = {}
+    if embed_texts_async_fn is not None and _rag_enabled(idx, chunks):
+        rag_blocks = await prepare_rag_blocks(
+            rule_paths, language, client, embed_texts_async_fn, idx, chunks, k, emb_model, use_prebuilt,
+            include_raw, inputs_out=rule_inputs,
+        )
+
+    async def _one(crysl_path: str, fqcn: str) -> bool:
+        text: Optional[str] = None
+        for attempt in range(max_attempts):
+            try:
+                async with sem:
+                    text = await process_rule_async_fn(
+                        crysl_path,
+                        language,
+                        client,
+                        model,
+                        fqcn,
+                        idx=idx,
+                        chunks=chunks,
+                        k=k,
+                        emb_model=emb_model,
+                        use_prebuilt=use_prebuilt,
+                        include_raw=include_raw,
+                        rag_block=rag_blocks.get(fqcn),
+                        inputs=rule_inputs.get(fqcn),
+                    )
+                break
+            except retryable as e:
+                if attempt + 1 >= max_attempts:
+                    print(f"LLM explanation error for {fqcn}: {e}", file=sys.stderr)
+                    return False
+                delay = retry_delay(e, attempt)
+                print(f"[WARN] {type(e).__name__} for {fqcn}; retrying in {delay:.1f}s.", file=sys.stderr)
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(f"LLM explanation error for {fqcn}: {e}", file=sys.stderr)
+                return False
+        if not text:
+            return False
+        target = example_output_path(out_dir, fqcn, language)
+        target.write_text(text, encoding="utf-8")
+        print(f"{target.name} written.", file=sys.stderr)
+        return True
+
+    results = await asyncio.gather(*(_one(path, fqcn) for path, fqcn in rule_paths))
+    return sum(1 for ok in results if not ok)
+
+
+def run_many_batch(
+    rule_paths: List[Tuple[str, str]],
+    language: str,
+    client: Any,
+    model: str,
+    explanation_request_fn: Callable[..., Dict[str, Any]],
+    out_dir: Path,
+    rag_blocks: Optional[Dict[str, str]] = None,
+    use_prebuilt: bool = False,
+    poll_seconds: float = 30.0,
+    include_raw: bool = False,
+    rule_inputs: Optional[Dict[str, Dict[str, str]]] = None,
+    idx: Any = None,
+    chunks: Any = None,
+    k: int = 6,
+    emb_model: str = "text-embedding-3-small",
+    make_rag_context_fn: Optional[Callable[..., str]] = None,
+) -> int:
+    """
+    Offline twin of run_many: explain every rule through one OpenAI Batch API job.
+
+    `explanation_request_fn(model, rag_block, **prompt_fields)` returns the chat-completion
+    arguments the writer would send for one rule, so the batch uses the same prompts and
+    its replies land in the response cache (cached rules are not resubmitted). RAG blocks
+    come from prepare_rag_blocks; with RAG enabled, rules missing there retrieve their own
+    block through the sync `make_rag_context_fn(client, idx, chunks, emb_model, sections, k)`,
+    and a rule whose retrieval fails is counted as failed rather than submitted (and cached)
+    without paper context. `rule_inputs` (prepare_rag_blocks' inputs_out) saves loading rules
+    again. Returns the number of rules that produced no explanation.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rag_blocks = rag_blocks or {}
+    rule_inputs = rule_inputs or {}
+    requests: Dict[str, Dict[str, Any]] = {}
+    failures = 0
+    for crysl_path, fqcn in rule_paths:
+        inputs = rule_inputs.get(fqcn) or _resolve_rule_inputs(crysl_path, language, fqcn, use_prebuilt, include_raw)
+        if inputs is None:
+            failures += 1
+            continue
+        rag_block = rag_blocks.get(fqcn)
+        if rag_block is None and make_rag_context_fn is not None and _rag_enabled(idx, chunks):
+            try:
+                rag_block = make_rag_context_fn(client, idx, chunks, emb_model, _rag_sections(inputs), k)
+            except Exception as e:
+                print(f"LLM explanation error for {fqcn}: RAG retrieval failed: {e}", file=sys.stderr)
+                failures += 1
+                continue
+        requests[fqcn] = explanation_request_fn(
+            model, rag_block or "", explanation_language=language, **inputs
+        )
+
+    replies = cached_batch_completions(
+        requests, lambda pending: run_chat_batch(client, pending, poll_seconds=poll_seconds)
+    )
+    for fqcn in requests:
+        text = clean_llm_output(replies.get(fqcn) or "")
+        if not text:
+            print(f"LLM explanation error for {fqcn}: Batch API returned no explanation.", file=sys.stderr)
+            failures += 1
+            continue
+        target = example_output_path(out_dir, fqcn, language)
+        target.write_text(text, encoding="utf-8")
+        print(f"{target.name} written.", file=sys.stderr)
+    return failures
+
+
+def spec_fqcn(crysl_path: Path) -> str:
+    """Fully qualified class name from a rule's SPEC line (file stem when missing)."""
+    spec = crysl_to_json_lines(crysl_path.read_text(encoding="utf-8")).get("SPEC") or []
+    return spec[0] if spec else crysl_path.stem
 
 
 def run_writer_main(
@@ -333,6 +841,11 @@ def run_writer_main(
     init_client_fn: Callable[[], Any],
     build_pdf_index_fn: Callable[..., Tuple[Any, Any]],
     process_rule_fn: Callable[..., Optional[str]],
+    init_async_client_fn: Optional[Callable[[int], Any]] = None,
+    process_rule_async_fn: Optional[Callable[..., Awaitable[Optional[str]]]] = None,
+    embed_texts_async_fn: Optional[Callable[..., Awaitable[Any]]] = None,
+    explanation_request_fn: Optional[Callable[..., Dict[str, Any]]] = None,
+    make_rag_context_fn: Optional[Callable[..., str]] = None,
 ) -> None:
     """
     Shared CLI orchestration for OpenAI/gateway writer entrypoints.
@@ -341,7 +854,13 @@ def run_writer_main(
     - environment loading and CLI default resolution
     - CrySL file lookup
     - optional RAG index build/load
-    - delegation into provider-specific process_rule wrapper
+    - delegation into provider-specific process_rule wrapper, or into run_many
+      (async client) when several class names are given, or into run_many_batch
+      with --async-batch (backends that pass explanation_request_fn)
+
+    `init_async_client_fn(max_connections)` builds the one async client a multi-rule run shares.
+    `make_rag_context_fn` (the sync make_rag_context) lets run_many_batch retrieve per rule when
+    the batched retrieval fails.
     """
     # Load .env before constructing CLI defaults (some wrappers compute defaults from env).
     load_dotenv()
@@ -362,7 +881,11 @@ def run_writer_main(
     parser = argparse.ArgumentParser(description=cli_config.description)
     parser.add_argument(
         "class_name_full",
-        help="Fully qualified class name of the CrySL rule (e.g., java.security.AlgorithmParameters)",
+        nargs="*",
+        help=(
+            "Fully qualified class name of the CrySL rule (e.g., java.security.AlgorithmParameters). "
+            "Several names are explained concurrently and written to --out-dir."
+        ),
     )
     parser.add_argument("language", help="Explanation language (e.g., English)")
     parser.add_argument("--model", "-m", default=model_default, help=cli_config.model_help)
@@ -382,22 +905,90 @@ def run_writer_main(
         default=emb_model_default,
         help=cli_config.emb_model_help,
     )
+    parser.add_argument(
+        "--out-dir",
+        default=None,
+        help="Directory receiving <className>_<language>.txt files when several class names are given (e.g. the llm_cache).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="Maximum concurrent LLM requests when several class names are given (default: 10).",
+    )
+    parser.add_argument(
+        "--use-prebuilt",
+        action="store_true",
+        help="Reuse per-rule prompt inputs written by llm/precompute.py (recomputed when missing or stale).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_REQUEST_TIMEOUT,
+        help=f"Seconds before a single LLM/embedding request is abandoned and retried (default: {DEFAULT_REQUEST_TIMEOUT:g}).",
+    )
+    parser.add_argument(
+        "--include-raw",
+        action="store_true",
+        help="Also send the raw CrySL text (its sections are already included in parsed form).",
+    )
+    parser.add_argument(
+        "--all-rules",
+        action="store_true",
+        help="Explain every .crysl rule in the rules directory (concurrently, into --out-dir).",
+    )
+    parser.add_argument(
+        "--async-batch",
+        action="store_true",
+        help=(
+            "With several class names: submit one request per rule through the OpenAI Batch API instead of "
+            "chat completions (half price, separate rate limits, results may take up to 24h)."
+        ),
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between Batch API status checks for --async-batch (default: 30).",
+    )
     args = parser.parse_args()
 
-    class_name_full = args.class_name_full
+    if args.all_rules:
+        if args.class_name_full:
+            parser.error("--all-rules takes no class names")
+        args.class_name_full = [spec_fqcn(path) for path in list_files(rules_dir, ".crysl")]
+    elif not args.class_name_full:
+        parser.error("pass at least one class name, or --all-rules")
+
+    many = args.all_rules or len(args.class_name_full) > 1
+    if many and not args.out_dir:
+        parser.error("--out-dir is required when several class names are given")
+    if many and (init_async_client_fn is None or process_rule_async_fn is None):
+        parser.error("this backend does not support several class names per run")
+    if args.async_batch and not many:
+        parser.error("--async-batch requires several class names or --all-rules")
+    if args.async_batch and explanation_request_fn is None:
+        parser.error("this backend does not support --async-batch")
+
     language = args.language
 
     # Java side provides FQCN; rules are stored by simple class name.
-    simple_name = class_name_full.rsplit(".", 1)[-1]
-    crysl_filename = f"{simple_name}.crysl"
-    crysl_full_path = rules_dir / crysl_filename
+    rule_paths: List[Tuple[str, str]] = []
+    missing = 0
+    for class_name_full in args.class_name_full:
+        crysl_filename = f"{class_name_full.rsplit('.', 1)[-1]}.crysl"
+        crysl_full_path = rules_dir / crysl_filename
+        if not crysl_full_path.is_file():
+            print(f"{crysl_filename} not found in {rules_dir}.", file=sys.stderr)
+            missing += 1
+            continue
+        rule_paths.append((str(crysl_full_path), class_name_full))
 
-    if not crysl_full_path.is_file():
-        print(f"{crysl_filename} not found in {rules_dir}.", file=sys.stderr)
+    if not rule_paths:
+        if many:
+            sys.exit(1)
         return
 
-    # Create provider client before rule processing; RAG remains optional.
-    client = init_client_fn()
     idx = None
     chunks = None
     try:
@@ -409,8 +1000,74 @@ def run_writer_main(
     except Exception as e:
         print(f"[WARN] RAG disabled (index build/load failed): {e}", file=sys.stderr)
 
+    if many and args.async_batch:
+        async def _prepare_rag_async() -> Dict[str, str]:
+            async_client = init_async_client_fn(args.concurrency).with_options(timeout=args.timeout)
+            try:
+                return await prepare_rag_blocks(
+                    rule_paths, language, async_client, embed_texts_async_fn, idx, chunks, args.k,
+                    args.emb_model, args.use_prebuilt, args.include_raw, inputs_out=rule_inputs,
+                )
+            finally:
+                await async_client.close()
+
+        rag_blocks: Dict[str, str] = {}
+        rule_inputs: Dict[str, Dict[str, str]] = {}
+        if embed_texts_async_fn is not None and _rag_enabled(idx, chunks):
+            rag_blocks = asyncio.run(_prepare_rag_async())
+        failures = run_many_batch(
+            rule_paths,
+            language,
+            init_client_fn().with_options(timeout=args.timeout),
+            args.model,
+            explanation_request_fn,
+            Path(args.out_dir),
+            rag_blocks=rag_blocks,
+            use_prebuilt=args.use_prebuilt,
+            poll_seconds=args.poll_interval,
+            include_raw=args.include_raw,
+            rule_inputs=rule_inputs,
+            idx=idx,
+            chunks=chunks,
+            k=args.k,
+            emb_model=args.emb_model,
+            make_rag_context_fn=make_rag_context_fn,
+        ) + missing
+        sys.exit(1 if failures else 0)
+
+    if many:
+        async def _main_async() -> int:
+            # run_many retries timeouts itself, so the SDK's own retries are disabled here.
+            # One client (and connection pool sized to --concurrency) shared by every rule's requests.
+            async_client = init_async_client_fn(args.concurrency).with_options(timeout=args.timeout, max_retries=0)
+            try:
+                return await run_many(
+                    rule_paths,
+                    language,
+                    async_client,
+                    args.model,
+                    process_rule_async_fn,
+                    Path(args.out_dir),
+                    concurrency=args.concurrency,
+                    idx=idx,
+                    chunks=chunks,
+                    k=args.k,
+                    emb_model=args.emb_model,
+                    use_prebuilt=args.use_prebuilt,
+                    embed_texts_async_fn=embed_texts_async_fn,
+                    include_raw=args.include_raw,
+                )
+            finally:
+                await async_client.close()
+
+        failures = asyncio.run(_main_async()) + missing
+        sys.exit(1 if failures else 0)
+
+    # Create provider client before rule processing; RAG remains optional.
+    client = init_client_fn().with_options(timeout=args.timeout, max_retries=1)
+    crysl_full_path, class_name_full = rule_paths[0]
     process_rule_fn(
-        str(crysl_full_path),
+        crysl_full_path,
         language,
         client,
         args.model,
@@ -419,4 +1076,6 @@ def run_writer_main(
         chunks=chunks,
         k=args.k,
         emb_model=args.emb_model,
+        use_prebuilt=args.use_prebuilt,
+        include_raw=args.include_raw,
     )